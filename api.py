@@ -0,0 +1,352 @@
+"""
+Local HTTP/JSON service over the student database, for tools that should neither open the database file themselves
+nor drive the GUI.
+
+It is built on asyncio and the standard library only. One event loop parses the HTTP/1.1 requests, keeping
+connections alive between them, and answers with JSON. Reads run on READ_WORKERS threads, each with a read-only
+connection of its own (PRAGMA query_only), so a slow read never holds up the loop and a read can never write. Writes
+are handed to a single StudentWriter, whose thread commits the writes that arrive within a few milliseconds of each
+other in one transaction, and the loop awaits them without blocking. sqlite runs in WAL mode, so reads never wait for
+the writer, and a write is only answered once it is committed, so the next read sees it.
+
+The service listens on 127.0.0.1 by default and has no authentication, it is meant for tools on the same machine.
+
+Endpoints, students are {"id", "name", "course", "mobile"} objects:
+
+    GET    /students?after=0&limit=100   a page of students in id order, with next, the after of the next page.
+                                         name, course and mobile parameters keep only the students with that value
+    GET    /students/search?match=jan%20do&limit=20   the students with name words starting with the given words
+    GET    /students/ID
+    POST   /students                     {"name", "course", "mobile"}, or a list of them, answers with the new students
+    PATCH  /students/ID                  any of name, course and mobile, the others are kept as stored, answers with
+                                         the changed student
+    DELETE /students/ID
+    GET    /courses                      {"id", "name", "retired"} objects
+
+Errors are answered with {"error": message} and a 4xx or 5xx status.
+
+Usage:
+    python api.py [--host 127.0.0.1] [--port 8765] [--database database.db]
+    curl 'http://127.0.0.1:8765/students?limit=2'
+    curl -X POST -d '{"name": "Jane Doe", "course": "Math", "mobile": "555 123 4567"}' http://127.0.0.1:8765/students
+"""
+import argparse
+import asyncio
+import json
+import signal
+import sqlite3
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, suppress
+from functools import partial
+from http import HTTPStatus
+from typing import Any, Iterator, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from database import DatabaseConnection
+from importer import MAX_NAME_LENGTH, parse_phone
+from repository import Student, StudentRepository
+from writer import StudentWriter
+
+API_HOST: str = "127.0.0.1"
+API_PORT: int = 8765
+READ_WORKERS: int = 4
+PAGE_SIZE: int = 100
+MAX_PAGE_SIZE: int = 1000
+MAX_HEADER: int = 16384  # bytes
+MAX_BODY: int = 1 << 20  # 1 MB
+MAX_UPDATE_ATTEMPTS: int = 3
+BACKLOG: int = 1024
+
+
+class ApiError(Exception):
+    """
+    Raised while handling a request that cannot be served, answered with its status and message.
+    """
+
+    def __init__(self, status: HTTPStatus, message: Optional[str] = None) -> None:
+        super().__init__(message or status.phrase)
+        self.status: HTTPStatus = status
+
+
+class _ReadOnly:
+    """
+    Stands in for a DatabaseConnection on the read threads: a StudentRepository on top of it reads through a
+    read-only connection that belongs to the calling thread and is opened the first time the thread reads.
+    """
+
+    def __init__(self, database: DatabaseConnection) -> None:
+        self.database: DatabaseConnection = database
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        connection: Optional[sqlite3.Connection] = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self.database.open()
+            connection.execute("PRAGMA query_only=ON")
+            with self._lock:
+                self._connections.append(connection)
+        try:
+            yield connection
+        finally:
+            if connection.in_transaction:
+                connection.rollback()
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+
+
+class StudentApi:
+    """
+    The HTTP/JSON service: routes the requests of every connection to the read threads or the writer.
+
+    Attributes:
+    database (DatabaseConnection): The database the students are kept in.
+    reader (StudentRepository): Reads on the read-only connections of the read threads.
+    writer (StudentWriter): Applies every write, in batches on its own thread.
+    server (Optional[asyncio.Server]): The listening server once started.
+
+    Methods:
+    start(self, host, port) -> asyncio.Server: Starts listening, port 0 picks a free port.
+    handle(self, method, target, body) -> tuple[HTTPStatus, Any]: Answers one request with a status and a JSON value.
+    close(self) -> None: Commits the queued writes and closes the connections, once the server stopped.
+    """
+
+    def __init__(self, database: Optional[DatabaseConnection] = None, read_workers: int = READ_WORKERS) -> None:
+        self.database: DatabaseConnection = database or DatabaseConnection()
+        self._read_only = _ReadOnly(self.database)
+        self.reader: StudentRepository = StudentRepository(self._read_only)
+        self.writer: StudentWriter = StudentWriter(self.database)
+        self.server: Optional[asyncio.Server] = None
+        self._readers = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix="api-read")
+
+    async def start(self, host: str = API_HOST, port: int = API_PORT) -> asyncio.Server:
+        self.server = await asyncio.start_server(self._serve, host, port, limit=MAX_HEADER, backlog=BACKLOG)
+        return self.server
+
+    def close(self) -> None:
+        self.writer.close()
+        self._readers.shutdown()
+        self._read_only.close()
+
+    async def handle(self, method: str, target: str, body: bytes) -> tuple[HTTPStatus, Any]:
+        """
+        This function answers one request with a status and the JSON value to send, None for no body. Errors of the
+        request are answered with a 4xx status, database errors with 500.
+        """
+        url = urlsplit(target)
+        path: list[str] = [part for part in url.path.split("/") if part]
+        query: dict[str, str] = dict(parse_qsl(url.query))
+        try:
+            if path == ["students"]:
+                if method == "GET":
+                    return HTTPStatus.OK, await self._list(query)
+                if method == "POST":
+                    return HTTPStatus.CREATED, await self._insert(self._json(body))
+                raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED)
+            if path == ["students", "search"]:
+                if method != "GET":
+                    raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED)
+                students = await self._read(self.reader.match_name, query.get("match", ""),
+                                            self._number(query, "limit", PAGE_SIZE, MAX_PAGE_SIZE))
+                return HTTPStatus.OK, {"students": [student._asdict() for student in students]}
+            if len(path) == 2 and path[0] == "students":
+                student_id: int = self._id(path[1])
+                if method == "GET":
+                    found = await self._read(self.reader.get, [student_id])
+                    if not found:
+                        raise ApiError(HTTPStatus.NOT_FOUND, f"no student {student_id}")
+                    return HTTPStatus.OK, found[0]._asdict()
+                if method == "PATCH":
+                    return HTTPStatus.OK, await self._update(student_id, self._json(body))
+                if method == "DELETE":
+                    if not await asyncio.wrap_future(self.writer.delete([student_id])):
+                        raise ApiError(HTTPStatus.NOT_FOUND, f"no student {student_id}")
+                    return HTTPStatus.OK, {"deleted": student_id}
+                raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED)
+            if path == ["courses"] and method == "GET":
+                return HTTPStatus.OK, [course._asdict() for course in await self._read(self.reader.courses)]
+            raise ApiError(HTTPStatus.NOT_FOUND, f"no such endpoint {method} {url.path}")
+        except ApiError as e:
+            return e.status, {"error": str(e)}
+        except (ValueError, TypeError) as e:  # invalid fields, unknown courses and RowError
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except sqlite3.Error as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"database error: {e}"}
+
+    async def _read(self, function, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._readers, partial(function, *args))
+
+    async def _list(self, query: dict[str, str]) -> dict:
+        mobile: Optional[str] = query.get("mobile")
+        limit: int = self._number(query, "limit", PAGE_SIZE, MAX_PAGE_SIZE)
+        students: list[Student] = await self._read(self.reader.page, self._number(query, "after", 0), limit,
+                                                   query.get("name"), query.get("course"),
+                                                   parse_phone(mobile) if mobile is not None else None)
+        return {"students": [student._asdict() for student in students],
+                "next": students[-1].id if len(students) == limit else None}
+
+    async def _insert(self, body: Any) -> Any:
+        rows: list[tuple[str, Optional[str], Optional[int]]] = [
+            self._fields(item) for item in (body if isinstance(body, list) else [body])]
+        if not rows:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "no students to add")
+        added: list[Student] = await asyncio.wrap_future(self.writer.add(rows))
+        students: list[dict] = [student._asdict() for student in added]
+        return students if isinstance(body, list) else students[0]
+
+    async def _update(self, student_id: int, body: Any) -> dict:
+        if not isinstance(body, dict) or not body.keys() & {"name", "course", "mobile"}:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "expected an object with name, course or mobile")
+        # Optimistic like the edit dialog: the change is only written if nobody changed the student in between
+        for _ in range(MAX_UPDATE_ATTEMPTS):
+            found = await self._read(self.reader.get_versioned, student_id)
+            if found is None:
+                raise ApiError(HTTPStatus.NOT_FOUND, f"no student {student_id}")
+            student, version = found
+            changed = Student(student.id, *self._fields(body, student))
+            if await asyncio.wrap_future(self.writer.update_versioned(changed, version)):
+                return changed._asdict()
+        raise ApiError(HTTPStatus.CONFLICT, f"student {student_id} keeps changing, try again")
+
+    @staticmethod
+    def _json(body: bytes) -> Any:
+        try:
+            return json.loads(body)
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"invalid JSON: {e}")
+
+    @staticmethod
+    def _fields(item: Any, stored: Optional[Student] = None) -> tuple[str, Optional[str], Optional[int]]:
+        # Checked like the rows of an import, the course is checked by the database. A change of a stored student only
+        # checks the fields it sets, the others are kept as stored even if they were saved before these checks existed
+        if not isinstance(item, dict):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "expected a student object")
+        name, course, mobile = item.get("name"), item.get("course"), item.get("mobile")
+        if stored is not None and "name" not in item:
+            name = stored.name
+        elif not isinstance(name, str) or not name.strip() or len(name) > MAX_NAME_LENGTH:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"name must be 1 to {MAX_NAME_LENGTH} characters")
+        else:
+            name = name.strip()
+        if stored is not None and "course" not in item:
+            course = stored.course
+        elif course is not None and not isinstance(course, str):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "course must be a string or null")
+        if stored is not None and "mobile" not in item:
+            mobile = stored.mobile
+        elif mobile is None or isinstance(mobile, bool):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "mobile is missing")
+        else:
+            mobile = parse_phone(mobile)
+        return name, course, mobile
+
+    @staticmethod
+    def _id(text: str) -> int:
+        if not text.isdigit():
+            raise ApiError(HTTPStatus.NOT_FOUND, f"no student {text}")
+        return int(text)
+
+    @staticmethod
+    def _number(query: dict[str, str], name: str, default: int, maximum: Optional[int] = None) -> int:
+        text: Optional[str] = query.get(name)
+        if text is None:
+            return default
+        if not text.isdigit():
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"{name} must be a whole number")
+        return min(int(text), maximum) if maximum is not None else int(text)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        This function answers the requests of one connection in turn until the client closes it or asks to.
+        """
+        try:
+            while True:
+                try:
+                    head: bytes = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    self._respond(writer, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, None, False)
+                    break
+
+                lines: list[str] = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                    headers: dict[str, str] = {name.strip().lower(): value.strip()
+                                               for name, value in (line.split(":", 1) for line in lines[1:] if line)}
+                    length: int = int(headers.get("content-length", "0"))
+                except ValueError:
+                    self._respond(writer, HTTPStatus.BAD_REQUEST, {"error": "malformed request"}, False)
+                    break
+                if length < 0:
+                    self._respond(writer, HTTPStatus.BAD_REQUEST, {"error": "negative Content-Length"}, False)
+                    break
+                if "chunked" in headers.get("transfer-encoding", ""):
+                    self._respond(writer, HTTPStatus.LENGTH_REQUIRED, {"error": "send a Content-Length"}, False)
+                    break
+                if length > MAX_BODY:
+                    self._respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "body too large"}, False)
+                    break
+                body: bytes = await reader.readexactly(length) if length else b""
+
+                connection: str = headers.get("connection", "").lower()
+                keep_alive: bool = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                status, payload = await self.handle(method, target, body)
+                self._respond(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            with suppress(ConnectionError):
+                await writer.wait_closed()
+
+    @staticmethod
+    def _respond(writer: asyncio.StreamWriter, status: HTTPStatus, payload: Any, keep_alive: bool) -> None:
+        body: bytes = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode() \
+            if payload is not None else b""
+        writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                     f"Content-Type: application/json; charset=utf-8\r\n"
+                     f"Content-Length: {len(body)}\r\n"
+                     f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + body)
+
+
+async def serve(host: str = API_HOST, port: int = API_PORT, database: Optional[DatabaseConnection] = None) -> None:
+    """
+    This function runs the service until the process gets SIGINT or SIGTERM, then commits what is queued and closes
+    the database. It prints the address it listens on, with the port that was picked for port 0.
+    """
+    api = StudentApi(database)
+    server = await api.start(host, port)
+    bound_host, bound_port = server.sockets[0].getsockname()[:2]
+    print(f"listening on http://{bound_host}:{bound_port}", file=sys.stderr, flush=True)
+
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, stopped.set)
+    try:
+        async with server:
+            await stopped.wait()
+    finally:
+        api.close()
+        DatabaseConnection.close_all()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the student database as a local HTTP/JSON API.")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT, help="0 picks a free port")
+    parser.add_argument("--database", help="database file, overrides STUDENTS_DATABASE and config.ini")
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, DatabaseConnection(args.database)))
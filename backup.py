@@ -0,0 +1,231 @@
+"""
+Online backups of the student database through the sqlite backup API, and restores from them.
+
+A backup copies the live database with sqlite3.Connection.backup, PAGES_PER_STEP pages at a time with a short sleep in
+between, on the thread that calls it; the GUI runs it on its QueryExecutor. sqlite releases the GIL while it copies,
+so the window keeps painting. The pages are read inside one read transaction of a dedicated connection, which in WAL
+mode makes the copy a consistent snapshot: writers carry on meanwhile, and the backup never starts over because one of
+them committed. The copy is checked with PRAGMA integrity_check, compressed with gzip into the backup directory as
+students-YYYYMMDD-HHMMSS.db.gz, and all but the newest keep backups are removed.
+
+A restore decompresses a backup next to the database, checks it and copies it into the live database with the backup
+API again. Connections that are open stay valid and see the restored students.
+
+Settings, from the [backup] section of config.ini:
+
+    [backup]
+    directory = ~/students/backups  # default: a backups directory next to the database
+    keep = 7
+    interval_hours = 24  # how often the GUI backs up on its own, 0 turns it off
+
+Usage:
+    python cli.py backup [--directory DIRECTORY] [--keep N]
+    python cli.py restore backups/students-20240101-120000.db.gz
+"""
+import configparser
+import gzip
+import os
+import shutil
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from database import CONFIG_FILE, DatabaseConnection
+from schema import ensure_schema
+
+PAGES_PER_STEP: int = 1024  # 4 MB with the default page size
+STEP_SLEEP: float = 0.002  # seconds between steps, so other connections get the disk in between
+COPY_SIZE: int = 1 << 20  # 1 MB
+COMPRESS_LEVEL: int = 6
+BACKUP_KEEP: int = 7
+BACKUP_INTERVAL_HOURS: float = 24
+BACKUP_PREFIX: str = "students-"
+BACKUP_SUFFIX: str = ".db.gz"
+
+
+class BackupError(sqlite3.DatabaseError):
+    """
+    Raised when a copy of the database fails its integrity check. It is a DatabaseError, like the error sqlite raises
+    for a file that is not a database at all.
+    """
+
+
+@dataclass
+class BackupSettings:
+    """
+    Where backups go, how many are kept and how often the GUI makes one.
+    """
+    directory: str
+    keep: int = BACKUP_KEEP
+    interval_hours: float = BACKUP_INTERVAL_HOURS
+
+
+@dataclass
+class BackupProgress:
+    """
+    Progress of a running backup or restore, passed to the progress callback after every step.
+    """
+    stage: str  # copying, checking, compressing or restoring
+    fraction: float  # share of the stage done so far, 0.0 to 1.0
+
+
+@dataclass
+class BackupResult:
+    """
+    Outcome of a backup. removed holds the old backups deleted to keep only the newest ones.
+    """
+    path: str = ""
+    pages: int = 0
+    size: int = 0  # bytes of the compressed file
+    removed: list[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+
+@dataclass
+class RestoreResult:
+    """
+    Outcome of a restore.
+    """
+    students: int = 0
+    seconds: float = 0.0
+
+
+def backup_settings(database: Optional[DatabaseConnection] = None) -> BackupSettings:
+    """
+    This function returns the backup settings from the config file, with a backups directory next to the database
+    file by default.
+    """
+    database = database or DatabaseConnection()
+    settings = BackupSettings(os.path.join(os.path.dirname(os.path.abspath(database.database_file)), "backups"))
+    config = configparser.ConfigParser()
+    if config.read(CONFIG_FILE) and config.has_section("backup"):
+        settings.directory = os.path.expanduser(config.get("backup", "directory", fallback=settings.directory))
+        settings.keep = config.getint("backup", "keep", fallback=settings.keep)
+        settings.interval_hours = config.getfloat("backup", "interval_hours", fallback=settings.interval_hours)
+    return settings
+
+
+def list_backups(directory: str) -> list[str]:
+    """
+    This function returns the paths of the backups in directory, newest first. The timestamp in the name sorts them.
+    """
+    if not os.path.isdir(directory):
+        return []
+    names = [name for name in os.listdir(directory) if name.startswith(BACKUP_PREFIX) and name.endswith(BACKUP_SUFFIX)]
+    return [os.path.join(directory, name) for name in sorted(names, reverse=True)]
+
+
+def check_integrity(connection: sqlite3.Connection) -> None:
+    """
+    This function runs PRAGMA integrity_check and raises BackupError with the first problems it reports.
+    """
+    problems: list[str] = [row[0] for row in connection.execute("PRAGMA integrity_check(10)")]
+    if problems != ["ok"]:
+        raise BackupError("integrity check failed: " + "; ".join(problems))
+
+
+def backup_database(database: Optional[DatabaseConnection] = None, directory: Optional[str] = None,
+                    keep: Optional[int] = None,
+                    progress: Optional[Callable[[BackupProgress], None]] = None) -> BackupResult:
+    """
+    This function backs the database up into directory, the configured one by default, and returns how it went. The
+    files are written under temporary names and only renamed once complete and checked, so a failed backup never
+    leaves a file that looks like a backup.
+    """
+    database = database or DatabaseConnection()
+    settings = backup_settings(database)
+    directory = directory or settings.directory
+    keep = settings.keep if keep is None else keep
+    result = BackupResult()
+    start = time.perf_counter()
+
+    os.makedirs(directory, exist_ok=True)
+    result.path = os.path.join(directory, f"{BACKUP_PREFIX}{time.strftime('%Y%m%d-%H%M%S')}{BACKUP_SUFFIX}")
+    copy_path = f"{result.path}.db.part"
+    partial_path = f"{result.path}.part"
+
+    def report(stage: str) -> Callable[[int, int, int], None]:
+        return lambda status, remaining, total: progress(BackupProgress(stage, 1 - remaining / max(total, 1)))
+
+    try:
+        source = database.open()
+        target = sqlite3.connect(copy_path)
+        try:
+            # One read transaction for the whole copy, so it is a snapshot that commits of others cannot invalidate
+            source.execute("BEGIN")
+            source.execute("SELECT count(*) FROM sqlite_master").fetchone()
+            source.backup(target, pages=PAGES_PER_STEP, sleep=STEP_SLEEP,
+                          progress=report("copying") if progress is not None else None)
+            source.rollback()
+
+            if progress is not None:
+                progress(BackupProgress("checking", 0.0))
+            check_integrity(target)
+            # A single file, no -wal next to it once restored or opened on its own
+            target.execute("PRAGMA journal_mode=DELETE")
+            result.pages = target.execute("PRAGMA page_count").fetchone()[0]
+        finally:
+            target.close()
+            source.close()
+
+        total: int = os.path.getsize(copy_path)
+        with open(copy_path, "rb") as file, gzip.open(partial_path, "wb", compresslevel=COMPRESS_LEVEL) as compressed:
+            while chunk := file.read(COPY_SIZE):
+                compressed.write(chunk)
+                if progress is not None:
+                    progress(BackupProgress("compressing", file.tell() / max(total, 1)))
+        os.replace(partial_path, result.path)
+    finally:
+        for path in (copy_path, partial_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    for old in list_backups(directory)[max(keep, 1):]:
+        os.remove(old)
+        result.removed.append(old)
+    result.size = os.path.getsize(result.path)
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def restore_database(path: str, database: Optional[DatabaseConnection] = None,
+                     progress: Optional[Callable[[BackupProgress], None]] = None) -> RestoreResult:
+    """
+    This function replaces every table of the database with the content of the backup at path and returns how many
+    students it holds. The backup is checked before anything is touched, and the copy into the live database is a
+    single transaction, so a failed restore leaves the database as it was.
+    """
+    database = database or DatabaseConnection()
+    result = RestoreResult()
+    start = time.perf_counter()
+    restored_path = f"{database.database_file}.restore"
+
+    try:
+        with gzip.open(path, "rb") as compressed, open(restored_path, "wb") as file:
+            shutil.copyfileobj(compressed, file, COPY_SIZE)
+        source = sqlite3.connect(restored_path)
+        try:
+            if progress is not None:
+                progress(BackupProgress("checking", 0.0))
+            check_integrity(source)
+            target = database.open()
+            try:
+                source.backup(target, pages=PAGES_PER_STEP, sleep=STEP_SLEEP,
+                              progress=(lambda status, remaining, total: progress(
+                                  BackupProgress("restoring", 1 - remaining / max(total, 1))))
+                              if progress is not None else None)
+                # The copy took the journal mode of the backup, and the backup may predate newer columns or tables
+                target.execute("PRAGMA journal_mode=WAL")
+                ensure_schema(target)
+                result.students = target.execute("SELECT coalesce(sum(students), 0) FROM course_counts").fetchone()[0]
+            finally:
+                target.close()
+        finally:
+            source.close()
+    finally:
+        if os.path.exists(restored_path):
+            os.remove(restored_path)
+
+    result.seconds = time.perf_counter() - start
+    return result
@@ -0,0 +1,163 @@
+"""
+Load test of the HTTP/JSON API: many concurrent clients on keep-alive connections against a server on localhost.
+
+A roster of the given size is generated and api.py is started on it in a process of its own. CLIENT_PROCESSES
+processes then open CONNECTIONS connections between them and send requests for DURATION seconds, each connection one
+request after the other, in the MIX of reads and writes below. Writes delete only students the same connection added,
+so every request is expected to succeed. The script prints the requests per second and the latency percentiles of
+every kind of request, and exits with an error if any request failed or fewer than MIN_RPS were answered per second,
+so it can run as a regression check.
+
+Usage:
+    python benchmarks/bench_api.py [rows] [--connections N] [--duration SECONDS] [--clients PROCESSES]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from roster import FIRST_NAMES, create_database  # noqa: E402
+
+ROWS: int = 100_000
+CONNECTIONS: int = 200
+DURATION: float = 10.0  # seconds
+CLIENT_PROCESSES: int = 2
+MIN_RPS: int = 1000
+# Kind of request -> share of all requests
+MIX: dict[str, float] = {"get": 0.45, "page": 0.2, "search": 0.1, "insert": 0.1, "update": 0.1, "delete": 0.05}
+API_SCRIPT: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "api.py")
+
+
+async def request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, method: str, path: str,
+                  body: object = None) -> tuple[int, object]:
+    """
+    This function sends one request on a keep-alive connection and returns the status and the decoded JSON answer.
+    """
+    data: bytes = json.dumps(body).encode() if body is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data)
+    head: bytes = await reader.readuntil(b"\r\n\r\n")
+    lines: list[str] = head.decode("latin-1").split("\r\n")
+    length: int = next(int(line.split(":", 1)[1]) for line in lines if line.lower().startswith("content-length:"))
+    answer: bytes = await reader.readexactly(length)
+    return int(lines[0].split(" ", 2)[1]), json.loads(answer) if answer else None
+
+
+async def client(port: int, rows: int, deadline: float, seed: int, latencies: dict[str, list[float]],
+                 failures: list[str]) -> None:
+    """
+    This function sends requests on one connection until the deadline and records how long each took.
+    """
+    rng = random.Random(seed)
+    kinds, weights = list(MIX), list(MIX.values())
+    added: list[int] = []
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        while time.perf_counter() < deadline:
+            kind: str = rng.choices(kinds, weights)[0]
+            if kind == "delete" and not added:
+                kind = "insert"
+            if kind == "get":
+                call = ("GET", f"/students/{rng.randint(1, rows)}", None)
+            elif kind == "page":
+                call = ("GET", f"/students?after={rng.randint(0, rows)}&limit=50", None)
+            elif kind == "search":
+                call = ("GET", f"/students/search?match={rng.choice(FIRST_NAMES)[:3]}&limit=20", None)
+            elif kind == "insert":
+                call = ("POST", "/students", {"name": f"Load Test {seed}", "course": "Math",
+                                              "mobile": f"+1 555 {rng.randrange(10 ** 7):07d}"})
+            elif kind == "update":
+                call = ("PATCH", f"/students/{rng.randint(1, rows)}", {"course": rng.choice(["Math", "Physics"])})
+            else:
+                call = ("DELETE", f"/students/{added.pop()}", None)
+
+            start: float = time.perf_counter()
+            status, answer = await request(reader, writer, *call)
+            latencies[kind].append(time.perf_counter() - start)
+            if status >= 400:
+                failures.append(f"{call[0]} {call[1]}: {status} {answer}")
+            elif kind == "insert":
+                added.append(answer["id"])
+    finally:
+        writer.close()
+
+
+def run_clients(port: int, rows: int, connections: int, duration: float, seed: int, results) -> None:
+    """
+    This function runs connections clients in one process and puts their latencies and failures on results.
+    """
+    latencies: dict[str, list[float]] = {kind: [] for kind in MIX}
+    failures: list[str] = []
+
+    async def run_all() -> None:
+        deadline: float = time.perf_counter() + duration
+        await asyncio.gather(*(client(port, rows, deadline, seed * 100_000 + i, latencies, failures)
+                               for i in range(connections)))
+
+    asyncio.run(run_all())
+    results.put((latencies, failures))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the HTTP/JSON API on localhost.")
+    parser.add_argument("rows", type=int, nargs="?", default=ROWS)
+    parser.add_argument("--connections", type=int, default=CONNECTIONS)
+    parser.add_argument("--duration", type=float, default=DURATION)
+    parser.add_argument("--clients", type=int, default=CLIENT_PROCESSES, help="client processes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "database.db")
+        create_database(path, args.rows)
+        server = subprocess.Popen([sys.executable, API_SCRIPT, "--port", "0", "--database", path],
+                                  stderr=subprocess.PIPE, text=True)
+        try:
+            port = int(server.stderr.readline().rsplit(":", 1)[1])
+            results = multiprocessing.Queue()
+            processes = [multiprocessing.Process(target=run_clients, args=(
+                port, args.rows, args.connections // args.clients, args.duration, seed, results))
+                for seed in range(args.clients)]
+            for process in processes:
+                process.start()
+            outcomes = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+        finally:
+            server.terminate()
+            server.wait()
+
+    latencies: dict[str, list[float]] = {kind: [] for kind in MIX}
+    failures: list[str] = []
+    for process_latencies, process_failures in outcomes:
+        for kind, values in process_latencies.items():
+            latencies[kind].extend(values)
+        failures.extend(process_failures)
+    total: int = sum(len(values) for values in latencies.values())
+    rps: float = total / args.duration
+
+    print(f"{'request':>8} {'count':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  "
+          f"({args.rows} rows, {args.connections} connections, {args.clients} client processes)")
+    for kind, values in latencies.items():
+        if len(values) > 1:
+            percentiles = statistics.quantiles(values, n=100)
+            print(f"{kind:>8} {len(values):>8} {statistics.median(values) * 1000:>8.2f} "
+                  f"{percentiles[94] * 1000:>8.2f} {percentiles[98] * 1000:>8.2f}")
+    print(f"{'total':>8} {total:>8}  {rps:.0f} requests/s, {len(failures)} failed")
+    for failure in failures[:10]:
+        print(failure)
+
+    failed = False
+    if failures:
+        failed = True
+    if rps < MIN_RPS:
+        print(f"{rps:.0f} requests/s is below {MIN_RPS}")
+        failed = True
+    sys.exit(1 if failed else 0)
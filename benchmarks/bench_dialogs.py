@@ -0,0 +1,111 @@
+"""
+Measures how long it takes from clicking a student in the table until a dialog is on screen, and whether that time
+or the number of widgets grows as the window is used.
+
+The window is opened on a roster of the given size under the offscreen Qt platform. Each interaction clicks a random
+visible row, opens one of the Edit, Delete, Set Course, Add and Search dialogs in turn, and closes it again without
+submitting. The time from the click until the dialog is visible is recorded. The medians of the first and the last
+WINDOW interactions are printed with the number of live widgets before and after, and the script exits with an error
+if the latency grew by more than ALLOWED_GROWTH or widgets piled up, so it can run as a regression check.
+
+Usage:
+    python benchmarks/bench_dialogs.py [interactions] [rows]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtCore import Qt, QTimer  # noqa: E402
+from PyQt6.QtTest import QTest  # noqa: E402
+from PyQt6.QtWidgets import QApplication, QDialog  # noqa: E402
+
+from roster import create_database  # noqa: E402
+
+INTERACTIONS: int = 2000
+ROWS: int = 10_000
+WINDOW: int = 200  # interactions compared at the start and the end
+ALLOWED_GROWTH: float = 1.5  # last median over first median
+ACTIONS: list[str] = ["edit_record", "delete_record", "set_course", "insert", "search"]
+
+
+def interact(window, rng: random.Random, action: str) -> float:
+    """
+    This function clicks a random visible row, opens the dialog of action and closes it once it is visible. It returns
+    the milliseconds from the click until the dialog was shown.
+    """
+    table = window.table
+    rows: int = min(table.model().rowCount(), max(table.rowAt(table.viewport().height() - 1), 1))
+    rect = table.visualRect(table.model().index(rng.randrange(rows), 1))
+    shown: list[float] = []
+
+    def close() -> None:
+        # Runs inside the event loop of the modal dialog, so the dialog is already visible
+        dialog = QApplication.activeModalWidget()
+        if isinstance(dialog, QDialog) and dialog.isVisible():
+            shown.append(time.perf_counter())
+            dialog.close()
+        else:
+            QTimer.singleShot(0, close)
+
+    start: float = time.perf_counter()
+    QTest.mouseClick(table.viewport(), Qt.MouseButton.LeftButton, Qt.KeyboardModifier.NoModifier, rect.center())
+    QTimer.singleShot(0, close)
+    getattr(window, action)()
+    return (shown[0] - start) * 1000
+
+
+if __name__ == "__main__":
+    interactions = int(sys.argv[1]) if len(sys.argv) > 1 else INTERACTIONS
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else ROWS
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "database.db")
+        create_database(path, size)
+        os.environ["STUDENTS_DATABASE"] = path
+
+        import main
+
+        app = QApplication(sys.argv)
+        window = main.main_window = main.MainWindow()
+        window.change_timer.stop()
+        window.show()
+        window.load_data()
+        while window.student_model.rowCount() == 0:
+            app.processEvents()
+
+        rng = random.Random(0)
+        # One round first, so dialogs built on first use count as widgets from the start
+        for action in ACTIONS:
+            interact(window, rng, action)
+        app.processEvents()
+        widgets_before: int = len(QApplication.allWidgets())
+
+        latencies: list[float] = [interact(window, rng, ACTIONS[i % len(ACTIONS)]) for i in range(interactions)]
+        app.processEvents()
+        widgets_after: int = len(QApplication.allWidgets())
+
+        window.writer.close()
+        window.executor.shutdown()
+        window.change_feed.close()
+        main.DatabaseConnection.close_all()
+
+    first = statistics.median(latencies[:WINDOW])
+    last = statistics.median(latencies[-WINDOW:])
+    print(f"{'interactions':>14} {'first ms':>9} {'last ms':>9} {'p95 ms':>9} {'widgets':>15}  ({size} rows)")
+    print(f"{interactions:>14} {first:>9.3f} {last:>9.3f} {statistics.quantiles(latencies, n=20)[-1]:>9.3f} "
+          f"{widgets_before:>7} -> {widgets_after:<6}")
+
+    failed = False
+    if last > first * ALLOWED_GROWTH:
+        print(f"click-to-dialog latency grew from {first:.3f} ms to {last:.3f} ms")
+        failed = True
+    if widgets_after > widgets_before:
+        print(f"{widgets_after - widgets_before} widgets were left behind")
+        failed = True
+    sys.exit(1 if failed else 0)
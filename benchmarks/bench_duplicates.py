@@ -0,0 +1,95 @@
+"""
+Measures a full-table duplicate search and checks that it finds the duplicates it is meant to find.
+
+A roster of the given size is generated, then INJECTED students are added again with a changed spelling: the name
+upper case and last name first with the country code before the phone number, a middle initial, a dropped letter, one
+wrong digit or two neighbouring digits swapped. find_duplicates runs over the whole table and the script prints the
+time, the candidate pairs it compared and the groups it found. It exits with an error if the search took longer than
+BUDGET seconds or any injected duplicate was not grouped with its original, so it can run as a regression check.
+
+Usage:
+    python benchmarks/bench_duplicates.py [rows]
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from database import DatabaseConnection  # noqa: E402
+from duplicates import find_duplicates  # noqa: E402
+from roster import create_database  # noqa: E402
+from schema import insert_students  # noqa: E402
+
+ROWS: int = 1_000_000
+INJECTED: int = 1000
+BUDGET: float = 60.0  # seconds
+
+
+def misspell(rng: random.Random, name: str, mobile: int) -> tuple[str, int]:
+    """
+    This function returns the name and phone number of a student as they might be entered a second time.
+    """
+    first, last = name.split(" ", 1)
+    phone = str(mobile)
+    kind = rng.randrange(5)
+    if kind == 0:
+        return f"{last.upper()}, {first.upper()}", int("1" + phone)
+    if kind == 1:
+        return f"{first} {rng.choice('ABCDEFGH')}. {last}", mobile
+    if kind == 2:
+        at = rng.randrange(1, len(last))
+        return f"{first} {last[:at]}{last[at + 1:]}", mobile
+    if kind == 3:
+        at = rng.randrange(len(phone))
+        # Never a leading zero, the mobile column is a number and could not keep it
+        return name, int(phone[:at] + rng.choice([d for d in "0123456789"[at == 0:] if d != phone[at]]) +
+                         phone[at + 1:])
+    at = rng.choice([i for i in range(len(phone) - 1) if phone[i] != phone[i + 1] and (i or phone[1] != "0")])
+    return name, int(phone[:at] + phone[at + 1] + phone[at] + phone[at + 2:])
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "database.db")
+        create_database(path, size)
+
+        rng = random.Random(0)
+        connection = sqlite3.connect(path)
+        originals = [connection.execute("SELECT id, name, mobile FROM students WHERE id=?", (student_id,)).fetchone()
+                     for student_id in rng.sample(range(1, size + 1), INJECTED)]
+        first_copy: int = connection.execute("SELECT max(id) FROM students").fetchone()[0] + 1
+        copies = [misspell(rng, name, mobile) for _, name, mobile in originals]
+        insert_students(connection, [(name, None, mobile) for name, mobile in copies])
+        connection.commit()
+        connection.close()
+
+        result = find_duplicates(DatabaseConnection(path))
+        DatabaseConnection.close_all()
+
+    group_of: dict[int, int] = {duplicate.student.id: number
+                                for number, group in enumerate(result.groups) for duplicate in group}
+    missed = [(original, copy)
+              for original, copy, copy_id in zip(originals, copies, range(first_copy, first_copy + INJECTED))
+              if original[0] not in group_of or group_of.get(copy_id) != group_of[original[0]]]
+    grouped: int = sum(len(group) for group in result.groups)
+
+    print(f"{'students':>10} {'seconds':>8} {'compared':>9} {'groups':>7} {'grouped':>8} {'missed':>7} "
+          f"{'skipped blocks':>15}")
+    print(f"{result.students:>10} {result.seconds:>8.1f} {result.compared:>9} {len(result.groups):>7} {grouped:>8} "
+          f"{len(missed):>7} {result.skipped_blocks:>15}")
+    for original, copy in missed[:10]:
+        print(f"missed {original} -> {copy}")
+
+    failed = False
+    if result.seconds > BUDGET:
+        print(f"the search took {result.seconds:.1f} s, more than {BUDGET:.0f} s")
+        failed = True
+    if missed:
+        print(f"{len(missed)} of {INJECTED} injected duplicates were not found")
+        failed = True
+    sys.exit(1 if failed else 0)
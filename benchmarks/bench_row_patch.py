@@ -0,0 +1,110 @@
+"""
+Measures the cost of applying a single insert, edit and delete to the student table model.
+
+For every table size the model is scrolled to the end (the worst case for the row offsets it keeps) and each operation
+is committed to the database and patched into the model, the same way MainWindow does it after a dialog succeeds.
+The commit and the patch are timed apart. Patching the model should cost about the same from 1k to 1M rows, the page
+offsets it shifts are a Fenwick tree, while a full reload grows with the table. The commit is sqlite's part, a plain
+connection without WAL here, and grows with the size of the indexes it writes to.
+
+Usage:
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_row_patch.py [sizes...]
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtWidgets import QApplication  # noqa: E402
+
+from main import DatabaseConnection, StudentTableModel  # noqa: E402
+from schema import ensure_schema, insert_students  # noqa: E402
+
+COURSES: list[str] = ['Math', 'Physics', 'Chemistry', 'Biology', 'History', 'Science']
+SIZES: list[int] = [1_000, 10_000, 100_000, 1_000_000]
+REPEATS: int = 200
+
+
+def create_database(path: str, size: int) -> None:
+    """
+    This function creates a students table with the given number of rows.
+    """
+    connection = sqlite3.connect(path)
+    ensure_schema(connection)
+    insert_students(connection, ((f"Student {i}", COURSES[i % len(COURSES)], 5550000000 + i) for i in range(size)))
+    connection.commit()
+    connection.close()
+
+
+def measure(size: int) -> dict[str, float]:
+    """
+    This function returns the average milliseconds per insert, edit and delete, spent patching the model and
+    committing apart, and the milliseconds of a full reload for a table of the given size.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "database.db")
+        create_database(path, size)
+
+        model = StudentTableModel(database=DatabaseConnection(path))
+        model.reload()
+        while model.canFetchMore():
+            model.fetchMore()
+
+        connection = sqlite3.connect(path)
+        ids = random.Random(size).sample(range(1, size + 1), REPEATS)
+        results: dict[str, float] = dict.fromkeys(
+            ("insert", "edit", "delete", "insert commit", "edit commit", "delete commit"), 0.0)
+
+        def timed_ms(name: str, function, *args):
+            start = time.perf_counter()
+            result = function(*args)
+            results[name] += (time.perf_counter() - start) * 1000 / REPEATS
+            return result
+
+        def commit(sql: str, params: tuple) -> sqlite3.Cursor:
+            cursor = connection.execute(sql, params)
+            connection.commit()
+            return cursor
+
+        for i in range(REPEATS):
+            cursor = timed_ms("insert commit", commit, "INSERT INTO students (name, course_id, mobile) "
+                              "VALUES (?, (SELECT id FROM courses WHERE name = ?), ?)", (f"New {i}", "Math", i))
+            timed_ms("insert", model.insert_record, (cursor.lastrowid, f"New {i}", "Math", i))
+
+        for student_id in ids:
+            timed_ms("edit commit", commit, "UPDATE students SET name=?, course_id=(SELECT id FROM courses "
+                     "WHERE name = ?), mobile=? WHERE id=?", ("Edited", "Physics", 1, student_id))
+            timed_ms("edit", model.update_record, (student_id, "Edited", "Physics", 1))
+
+        for student_id in ids:
+            timed_ms("delete commit", commit, "DELETE FROM students WHERE id=?", (student_id,))
+            timed_ms("delete", model.remove_record, student_id)
+
+        start = time.perf_counter()
+        model.reload()
+        while model.canFetchMore():
+            model.fetchMore()
+        results["full reload"] = (time.perf_counter() - start) * 1000
+
+        assert model.rowCount() == size, "patched model drifted from the database"
+        connection.close()
+        return results
+
+
+if __name__ == "__main__":
+    app = QApplication(sys.argv)
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+
+    print(f"{'':>10} {'model patch per edit':^32} {'commit per edit':^32}")
+    print(f"{'rows':>10} {'insert ms':>10} {'edit ms':>10} {'delete ms':>10} {'insert ms':>10} {'edit ms':>10} "
+          f"{'delete ms':>10} {'full reload ms':>15}")
+    for size in sizes:
+        result = measure(size)
+        print(f"{size:>10} " + " ".join(f"{result[name]:>10.3f}" for name in (
+            "insert", "edit", "delete", "insert commit", "edit commit", "delete commit")) +
+            f" {result['full reload']:>15.1f}")
@@ -0,0 +1,77 @@
+"""
+Checks that every search the search dialog can produce is served by an index and measures its latency.
+
+The plan of every combination of name, course and mobile is checked with EXPLAIN QUERY PLAN first, the script exits
+with an error if any of them scans the whole table. Then each kind of search is timed against a table of the given size.
+
+Usage:
+    python benchmarks/bench_search.py [rows]
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from schema import ensure_schema, insert_students, search_query, unindexed_searches  # noqa: E402
+
+COURSES: list[str] = ['Math', 'Physics', 'Chemistry', 'Biology', 'History', 'Science']
+FIRST_NAMES: list[str] = ['Ann', 'Ben', 'Carla', 'Dmitri', 'Elena', 'Farid', 'Grace', 'Hiro', 'Ines', 'Jamal']
+ROWS: int = 5_000_000
+REPEATS: int = 1000
+
+
+def name_of(i: int) -> str:
+    return f"{FIRST_NAMES[i % len(FIRST_NAMES)]} Student{i // len(FIRST_NAMES)}"
+
+
+def create_database(path: str, size: int) -> None:
+    connection = sqlite3.connect(path)
+    ensure_schema(connection)
+    insert_students(connection, ((name_of(i), COURSES[i % len(COURSES)], 5550000000 + i) for i in range(size)))
+    connection.commit()
+    # Statistics are gathered once the rows are in, like on a database that has been in use for a while
+    connection.execute("ANALYZE")
+    connection.commit()
+    connection.close()
+
+
+def timed(connection: sqlite3.Connection, queries: list[tuple[str, tuple]]) -> float:
+    """
+    This function returns the average milliseconds per query, fetching the first 100 rows like a result page.
+    """
+    start = time.perf_counter()
+    for sql, params in queries:
+        connection.execute(sql, params).fetchmany(100)
+    return (time.perf_counter() - start) * 1000 / len(queries)
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    picks = random.Random(0).sample(range(size), min(REPEATS, size))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "database.db")
+        create_database(path, size)
+        connection = sqlite3.connect(path)
+
+        scans = unindexed_searches(connection)
+        for fields, plan in scans.items():
+            print(f"full scan for {' + '.join(fields)}: {plan}")
+        if scans:
+            sys.exit(1)
+        print(f"all {2 ** 3 - 1} search combinations use an index")
+
+        searches: dict[str, list[tuple[str, tuple]]] = {
+            "name": [search_query(name=name_of(i)) for i in picks],
+            "course": [search_query(course=COURSES[i % len(COURSES)]) for i in picks],
+            "mobile": [search_query(mobile=5550000000 + i) for i in picks],
+            "course + name": [search_query(name=name_of(i), course=COURSES[i % len(COURSES)]) for i in picks],
+        }
+        print(f"{'search':>15} {'ms / query':>12}  ({size} rows)")
+        for label, queries in searches.items():
+            print(f"{label:>15} {timed(connection, queries):>12.3f}")
+        connection.close()
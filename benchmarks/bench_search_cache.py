@@ -0,0 +1,138 @@
+"""
+Measures repeated searches through the search cache and checks that it never returns rows a write changed.
+
+A roster of the given size is generated and SEARCHES searches by name, course, phone number and combinations of them
+are run once and cached. The script then times cached lookups against running the query, and makes WRITES random
+writes from another connection, each one an insert, edit, course change or delete aimed at the results of a cached
+search. After every write each search is looked up again and a cached result is compared with what its query returns
+now. It prints the lookup percentiles and how many searches a write dropped on average, and exits with an error if
+any cached result was stale or the median lookup took longer than MAX_HIT_US microseconds, so it can run as a
+regression check.
+
+Usage:
+    python benchmarks/bench_search_cache.py [rows]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from database import DatabaseConnection  # noqa: E402
+from repository import StudentRepository  # noqa: E402
+from roster import create_database  # noqa: E402
+from schema import DEFAULT_COURSES, search_query  # noqa: E402
+from search_cache import SearchCache, SearchKey  # noqa: E402
+
+ROWS: int = 100_000
+SEARCHES: int = 40
+WRITES: int = 100
+LOOKUPS: int = 10_000
+MAX_HIT_US: float = 50.0
+
+
+def searches(rng: random.Random, database: DatabaseConnection) -> list[SearchKey]:
+    """
+    This function picks the criteria of SEARCHES searches from students of the roster, each with one to three fields.
+    """
+    with database.connect() as connection:
+        students = connection.execute(
+            "SELECT name, course, mobile FROM student_rows ORDER BY random() LIMIT ?", (SEARCHES,)).fetchall()
+    keys: set[SearchKey] = set()
+    for index, (name, course, mobile) in enumerate(students):
+        fields = [(name, None, None), (None, course, None), (None, None, mobile), (name, course, None),
+                  (name, None, mobile), (name, course, mobile)][index % 6]
+        keys.add(SearchKey(*fields))
+    return list(keys)
+
+
+def run_query(database: DatabaseConnection, key: SearchKey) -> list[tuple]:
+    with database.connect() as connection:
+        return connection.execute(*search_query(*key)).fetchall()
+
+
+def write(rng: random.Random, repository: StudentRepository, key: SearchKey, rows: list[tuple], size: int) -> None:
+    """
+    This function makes one random write that changes the results of the search key.
+    """
+    kind = rng.randrange(5)
+    name = key.name or f"Cache Test {rng.randrange(10 ** 6)}"
+    course = key.course or rng.choice(DEFAULT_COURSES)
+    mobile = key.mobile or 5550000000 + rng.randrange(10 ** 6)
+    if kind == 0 or not rows:
+        repository.add([(name, course, mobile)])
+    elif kind == 1:
+        repository.update([(rng.choice(rows)[0], f"Renamed {rng.randrange(10 ** 6)}", course, mobile)])
+    elif kind == 2:
+        repository.set_course([rng.choice(rows)[0]], rng.choice(DEFAULT_COURSES))
+    elif kind == 3:
+        # Somebody else becomes a result of the search
+        other = repository.get([rng.randrange(1, size + 1)])
+        if other:
+            repository.update([(other[0].id, name, course, mobile)])
+    else:
+        repository.delete([rng.choice(rows)[0]])
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "database.db")
+        create_database(path, size)
+        database = DatabaseConnection(path)
+        repository = StudentRepository(database)
+        rng = random.Random(0)
+        keys = searches(rng, database)
+
+        cache = SearchCache(database)
+        for key in keys:
+            if cache.get(key) is None:
+                cache.put(key, run_query(database, key), cache.position)
+
+        hit_times: list[float] = []
+        for _ in range(LOOKUPS):
+            key = rng.choice(keys)
+            start = time.perf_counter()
+            cache.get(key)
+            hit_times.append(time.perf_counter() - start)
+        query_times: list[float] = []
+        for key in keys:
+            start = time.perf_counter()
+            run_query(database, key)
+            query_times.append(time.perf_counter() - start)
+
+        stale: list[tuple[SearchKey, str]] = []
+        kept: list[int] = []
+        for number in range(WRITES):
+            key = rng.choice(keys)
+            write(rng, repository, key, run_query(database, key), size)
+            dropped = cache.invalidated
+            for key in keys:
+                rows = cache.get(key)
+                if rows is None:
+                    cache.put(key, run_query(database, key), cache.position)
+                elif sorted(rows) != sorted(run_query(database, key)):
+                    stale.append((key, f"after write {number}"))
+            kept.append(len(keys) - (cache.invalidated - dropped))
+        cache.close()
+        DatabaseConnection.close_all()
+
+    hit_percentiles = statistics.quantiles(hit_times, n=100)
+    print(f"{size} rows, {len(keys)} searches, {cache.hits} hits, {cache.misses} misses")
+    print(f"cached lookup  p50 {statistics.median(hit_times) * 1e6:8.1f} us  p99 {hit_percentiles[98] * 1e6:8.1f} us")
+    print(f"query          p50 {statistics.median(query_times) * 1e6:8.1f} us  max {max(query_times) * 1e6:8.1f} us")
+    print(f"{WRITES} writes, {len(keys) - statistics.mean(kept):.2f} searches dropped per write, {len(stale)} stale")
+    for key, when in stale[:10]:
+        print(f"stale {key} {when}")
+
+    failed = False
+    if stale:
+        failed = True
+    if statistics.median(hit_times) * 1e6 > MAX_HIT_US:
+        print(f"the median cached lookup took more than {MAX_HIT_US:.0f} us")
+        failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,73 @@
+"""
+Measures how long the GUI takes to start and fails when it gets slower than the budgets below.
+
+main.py is started RUNS times with --startup-probe under the offscreen Qt platform, against a table of the given size.
+Each run reports when the window was first painted, when the first row arrived and when the window became
+interactive; the time from launching the process until main.py finished its imports is added to each. The medians
+are printed, and the script exits with an error if any median is over its budget, so it can run as a regression check.
+
+With --snapshot the snapshot of the first rows is written before the runs, so the first rows are read from it instead
+of the database, see snapshot.py. They should then arrive by the first paint whatever the number of rows.
+
+Usage:
+    python benchmarks/bench_startup.py [rows] [--snapshot]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+from database import DatabaseConnection  # noqa: E402
+from roster import create_database  # noqa: E402
+from snapshot import write_snapshot  # noqa: E402
+
+ROWS: int = 100_000
+RUNS: int = 7
+# Seconds from launching the process. Generous on purpose, the point is to catch a stage that starts to wait for
+# something it should not, such as reading the whole table before the window is shown.
+BUDGETS: dict[str, float] = {"window": 1.5, "first_row": 2.0, "interactive": 2.0}
+
+
+def probe(path: str) -> dict[str, float]:
+    """
+    This function starts the GUI once and returns the seconds from launch to each stage.
+    """
+    environment = dict(os.environ, QT_QPA_PLATFORM="offscreen", STUDENTS_DATABASE=path)
+    launched = time.time()
+    output = subprocess.run([sys.executable, os.path.join(ROOT, "main.py"), "--startup-probe"], env=environment,
+                            capture_output=True, text=True, timeout=60, check=True).stdout
+    marks = json.loads(output.strip().splitlines()[-1])
+    imports = marks.pop("started_at") - launched
+    return {"imports": imports, **{stage: imports + seconds for stage, seconds in marks.items()}}
+
+
+if __name__ == "__main__":
+    arguments = [argument for argument in sys.argv[1:] if argument != "--snapshot"]
+    size = int(arguments[0]) if arguments else ROWS
+    snapshot: bool = "--snapshot" in sys.argv
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "database.db")
+        create_database(path, size)
+        if snapshot:
+            write_snapshot(DatabaseConnection(path))
+            DatabaseConnection.close_all()
+        probe(path)  # warms the file cache and writes the byte code
+        runs = [probe(path) for _ in range(RUNS)]
+
+    failed = False
+    print(f"{'stage':>12} {'median ms':>10} {'budget ms':>10}  "
+          f"({size} rows, {RUNS} runs{', snapshot' if snapshot else ''})")
+    for stage in ("imports", *BUDGETS):
+        median = statistics.median(run[stage] for run in runs)
+        budget = BUDGETS.get(stage)
+        over = budget is not None and median > budget
+        failed = failed or over
+        print(f"{stage:>12} {median * 1000:>10.1f} {budget * 1000 if budget else '':>10}{'  OVER BUDGET' if over else ''}")
+    sys.exit(1 if failed else 0)
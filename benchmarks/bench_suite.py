@@ -0,0 +1,331 @@
+"""
+Times every create, read, update and delete path against synthetic rosters and compares the results to a baseline.
+
+For each size a fresh roster database is generated (see roster.py) and every case is repeated, the median, 95th
+percentile and fastest time in milliseconds go to a JSON file. The headless cases go through StudentRepository, the
+GUI cases drive MainWindow and the dialogs under the offscreen Qt platform, the way a user would. Given a baseline
+file, every case whose median got slower by more than the threshold is flagged and the script exits with an error.
+
+Usage:
+    python benchmarks/bench_suite.py [--sizes 1000 100000] [--output results.json] [--baseline baseline.json]
+    python benchmarks/bench_suite.py --results results.json --baseline baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from database import DatabaseConnection  # noqa: E402
+from repository import StudentRepository  # noqa: E402
+from roster import FIRST_MOBILE, cached_database, roster  # noqa: E402
+from schema import TableQuery  # noqa: E402
+from writer import StudentWriter  # noqa: E402
+
+SIZES: list[int] = [1_000, 10_000, 100_000]
+REPEATS: int = 200
+BULK_ROWS: int = 10_000
+BULK_REPEATS: int = 3
+PAGE_ROWS: int = 256  # rows of a page of the main table
+THRESHOLD: float = 0.25
+# Differences below this are noise whatever the ratio, a 20 us query that takes 30 us is not a regression
+NOISE_MS: float = 0.05
+
+Results = dict[str, dict[str, dict[str, float]]]  # size -> case -> statistic -> value
+
+
+def summary(times: list[float]) -> dict[str, float]:
+    times = sorted(times)
+    return {
+        "median_ms": statistics.median(times) * 1000,
+        "p95_ms": times[min(len(times) - 1, int(len(times) * 0.95))] * 1000,
+        "min_ms": times[0] * 1000,
+        "runs": len(times),
+    }
+
+
+def measure(function: Callable[[int], object], repeats: int) -> dict[str, float]:
+    """
+    This function calls function(0), function(1), ... repeats times and summarizes how long each call took.
+    """
+    times: list[float] = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        function(i)
+        times.append(time.perf_counter() - start)
+    return summary(times)
+
+
+def samples(path: str, size: int, count: int, seed: int) -> list[tuple]:
+    """
+    This function returns count existing rows picked at random, the same ones for the same seed.
+    """
+    ids = random.Random(seed).sample(range(1, size + 1), min(count, size))
+    connection = sqlite3.connect(path)
+    try:
+        rows = {row[0]: row for row in connection.execute(
+            f"SELECT id, name, course, mobile FROM student_rows WHERE id IN ({','.join(map(str, ids))})")}
+    finally:
+        connection.close()
+    return [rows[i] for i in ids]
+
+
+def headless_cases(path: str, size: int, repeats: int, seed: int) -> dict[str, dict[str, float]]:
+    repository = StudentRepository(DatabaseConnection(path))
+    picked = samples(path, size, repeats, seed)
+    new_rows = list(roster(repeats, seed + 1))
+    results: dict[str, dict[str, float]] = {}
+
+    results["search.name"] = measure(lambda i: repository.search(name=picked[i % len(picked)][1]), repeats)
+    results["search.course"] = measure(lambda i: repository.search(course=picked[i % len(picked)][2], limit=100),
+                                       repeats)
+    results["search.mobile"] = measure(lambda i: repository.search(mobile=picked[i % len(picked)][3]), repeats)
+    results["search.course_name"] = measure(
+        lambda i: repository.search(name=picked[i % len(picked)][1], course=picked[i % len(picked)][2]), repeats)
+    results["search.name_prefix"] = measure(lambda i: repository.match_name(picked[i % len(picked)][1][:3]), repeats)
+
+    # The main table sorted by name, the page 90% of the way down has to cost the same as the first one
+    connection = sqlite3.connect(path)
+    try:
+        sorted_by_name = TableQuery(column=1)
+        first_sql, first_params = sorted_by_name.select(limit=1)
+        deep_row = connection.execute(first_sql + " OFFSET ?", (*first_params, size * 9 // 10)).fetchone()
+        for case, after in (("page.first", None), ("page.deep", deep_row)):
+            sql, params = sorted_by_name.select(after, PAGE_ROWS)
+            results[case] = measure(lambda i: connection.execute(sql, params).fetchall(), repeats)
+    finally:
+        connection.close()
+
+    added: list[int] = []
+    results["insert.single"] = measure(lambda i: added.extend(s.id for s in repository.add([new_rows[i]])), repeats)
+    results["edit.single"] = measure(
+        lambda i: repository.update([(added[i], new_rows[i][0] + " Jr", new_rows[i][1], new_rows[i][2])]), repeats)
+    results["delete.single"] = measure(lambda i: repository.delete([added[i]]), repeats)
+
+    bulk: list[tuple] = [(name, course, FIRST_MOBILE + size + i) for i, (name, course, _) in
+                         enumerate(roster(BULK_ROWS, seed + 2))]
+    bulk_ids: list[list[int]] = []
+    results["insert.bulk"] = measure(lambda i: bulk_ids.append([s.id for s in repository.add(bulk)]), BULK_REPEATS)
+    results["edit.bulk"] = measure(
+        lambda i: repository.update((student_id, name + " Jr", course, mobile)
+                                    for student_id, (name, course, mobile) in zip(bulk_ids[i], bulk)), BULK_REPEATS)
+    results["course.bulk"] = measure(lambda i: repository.set_course(bulk_ids[i], "History"), BULK_REPEATS)
+    results["delete.bulk"] = measure(lambda i: repository.delete(bulk_ids[i]), BULK_REPEATS)
+
+    # Sustained data entry: BULK_ROWS single row inserts queued back to back on the write-behind writer, which commits
+    # them in batches. The times are per insert, so the case compares directly to insert.single.
+    writer = StudentWriter(DatabaseConnection(path))
+    writer.flush()
+
+    def writer_burst(i: int) -> None:
+        writes = [writer.add([row]) for row in bulk]
+        writer.flush()
+        for write in writes:
+            write.result()
+
+    burst = measure(writer_burst, BULK_REPEATS)
+    results["insert.writer"] = {case: value / len(bulk) if case.endswith("_ms") else value
+                                for case, value in burst.items()}
+    writer.close()
+    return results
+
+
+def gui_cases(path: str, size: int, repeats: int, seed: int) -> dict[str, dict[str, float]]:
+    from PyQt6.QtWidgets import QApplication
+
+    import main
+
+    app = QApplication.instance() or QApplication([])
+    window = main.MainWindow()
+    main.main_window = window  # the edit and delete dialogs read the selected row through it
+    window.show()
+    picked = samples(path, size, repeats, seed)
+    new_rows = list(roster(repeats, seed + 1))
+    results: dict[str, dict[str, float]] = {}
+
+    def wait(done: Callable[[], bool]) -> None:
+        while not done():
+            app.processEvents()
+
+    dialogs: dict[type, Any] = {}
+
+    def opened(dialog_class: type) -> Any:
+        # Like the window, each dialog is built once and reset for every later use
+        dialog = dialogs.get(dialog_class)
+        if dialog is None:
+            dialog = dialogs[dialog_class] = dialog_class()
+        else:
+            dialog.reset()
+        return dialog
+
+    def load_data(i: int) -> None:
+        fetched: list[int] = []
+        window.student_model.page_fetched.connect(fetched.append)
+        window.load_data()
+        wait(lambda: bool(fetched))
+        window.student_model.page_fetched.disconnect(fetched.append)
+
+    def search_dialog(i: int) -> None:
+        dialog = opened(main.SearchDialog)
+        dialog.input_name.setText(picked[i % len(picked)][1])
+        dialog.submit()
+        idle: list[bool] = []
+        # Connected before the query starts, its end could otherwise be missed
+        window.executor.busy.connect(idle.append)
+        window.show_results(dialog.sql, dialog.params)
+        wait(lambda: idle and not idle[-1])
+        window.executor.busy.disconnect(idle.append)
+
+    added: list[tuple] = []
+
+    def insert_dialog(i: int) -> None:
+        dialog = opened(main.InsertDialog)
+        # The generated rows can look like students already on the roster, there is nobody to answer the question
+        dialog.confirm_duplicates = lambda matches: True
+        dialog.input_name.setText(new_rows[i][0])
+        dialog.course_name.setCurrentText(new_rows[i][1])
+        dialog.input_phone.setText(str(new_rows[i][2]))
+        dialog.submit()
+        # The duplicate check runs on the executor, the insert is queued once it answered
+        wait(lambda: bool(dialog.writes))
+        # The insert is done once committed and patched into the table
+        window.writer.flush()
+        app.processEvents()
+        added.extend(dialog.writes[0].result())
+
+    def select(student_id: int) -> None:
+        window.table.setModel(window.search_model)
+        window.search_model.set_rows(StudentRepository(DatabaseConnection(path)).get([student_id]))
+        window.table.setCurrentIndex(window.search_model.index(0, 0))
+
+    def edit_dialog(i: int) -> None:
+        dialog = opened(main.EditDialog)
+        dialog.input_name.setText(added[i][1] + " Jr")
+        dialog.submit()
+        # The update is committed and patched into the table once the dialog has its answer
+        window.writer.flush()
+        wait(lambda: dialog.pending is None)
+
+    def delete_dialog(i: int) -> None:
+        dialog = opened(main.DeleteDialog)
+        # The confirmation would wait for a click
+        dialog.confirm_deleted = lambda count: None
+        dialog.delete()
+        window.writer.flush()
+        wait(lambda: dialog.pending is None)
+
+    results["gui.load_data"] = measure(load_data, repeats)
+    results["gui.search_dialog"] = measure(search_dialog, repeats)
+    window.show_all()
+    results["gui.insert_dialog"] = measure(insert_dialog, repeats)
+    # Selecting the row is what the user does before opening the dialog, it is not part of the timing
+    edit_times: list[float] = []
+    delete_times: list[float] = []
+    for i in range(repeats):
+        select(added[i][0])
+        start = time.perf_counter()
+        edit_dialog(i)
+        edit_times.append(time.perf_counter() - start)
+        select(added[i][0])
+        start = time.perf_counter()
+        delete_dialog(i)
+        delete_times.append(time.perf_counter() - start)
+    results["gui.edit_dialog"] = summary(edit_times)
+    results["gui.delete_dialog"] = summary(delete_times)
+
+    window.executor.shutdown()
+    window.writer.close()
+    window.close()
+    window.deleteLater()
+    app.processEvents()
+    return results
+
+
+def compare(results: Results, baseline: Results, threshold: float) -> list[str]:
+    """
+    This function prints every case measured in both results and returns the ones whose median got slower than the
+    baseline by more than threshold.
+    """
+    regressions: list[str] = []
+    print(f"{'size':>10} {'case':<22} {'baseline ms':>12} {'now ms':>10} {'change':>8}")
+    for size, cases in results.items():
+        for case, now in cases.items():
+            before = baseline.get(size, {}).get(case)
+            if before is None:
+                continue
+            change = now["median_ms"] / before["median_ms"] - 1 if before["median_ms"] else 0.0
+            slower = change > threshold and now["median_ms"] - before["median_ms"] > NOISE_MS
+            if slower:
+                regressions.append(f"{size}/{case}")
+            print(f"{size:>10} {case:<22} {before['median_ms']:>12.3f} {now['median_ms']:>10.3f} {change:>+8.0%}"
+                  f"{'  REGRESSION' if slower else ''}")
+    return regressions
+
+
+def run(sizes: list[int], repeats: int, seed: int, headless: bool, cache: Optional[str]) -> dict:
+    results: Results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            path = cached_database(directory, size, seed, cache)
+            results[str(size)] = headless_cases(path, size, repeats, seed)
+            DatabaseConnection.close_all()
+            if not headless:
+                os.environ["STUDENTS_DATABASE"] = path
+                results[str(size)].update(gui_cases(path, size, repeats, seed))
+                DatabaseConnection.close_all()
+            for case, stats in results[str(size)].items():
+                print(f"{size:>10} {case:<22} {stats['median_ms']:>10.3f} ms  p95 {stats['p95_ms']:>10.3f} ms",
+                      file=sys.stderr)
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "machine": platform.platform(),
+            "repeats": repeats,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every CRUD path of the student management system.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="roster sizes, from 1000 to 10000000")
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--headless", action="store_true", help="skip the cases that need Qt")
+    parser.add_argument("--cache", help="keep generated rosters in this directory and reuse them")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--results", help="compare this results file instead of running the benchmarks")
+    parser.add_argument("--baseline", help="compare against this results file and fail on regressions")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="allowed slowdown, 0.25 is 25%%")
+    args = parser.parse_args()
+
+    if args.results:
+        with open(args.results) as file:
+            report = json.load(file)
+    else:
+        report = run(args.sizes, args.repeats, args.seed, args.headless, args.cache)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(report["results"], json.load(file)["results"], args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regressions: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+    elif not args.output:
+        json.dump(report, sys.stdout, indent=2)
+    sys.exit(0)
@@ -0,0 +1,103 @@
+"""
+Deterministic synthetic rosters for the students(id, name, course, mobile) table.
+
+The same size and seed always give the same rows, so benchmark results of different runs and machines compare the
+same data. Names are drawn from a mix of common first and last names, which gives realistic duplicates and prefix
+matches for the name searches, every mobile number is unique.
+
+Usage:
+    python benchmarks/roster.py database.db 1000000 [--seed 0]
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import time
+from typing import Iterator, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from schema import (DEFAULT_COURSES, create_indexes, drop_indexes, ensure_schema, insert_students,  # noqa: E402
+                    prune_changes)
+
+FIRST_NAMES: list[str] = [
+    'James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'William', 'Elizabeth', 'David',
+    'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Charles', 'Karen', 'Wei', 'Li', 'Ahmed',
+    'Fatima', 'Olga', 'Ivan', 'Yuki', 'Hiro', 'Priya', 'Raj', 'Carlos', 'Maria', 'Jose', 'Ana', 'Kwame', 'Amara',
+]
+LAST_NAMES: list[str] = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+    'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Taylor', 'Moore', 'Jackson', 'Martin', 'Lee', 'Chen',
+    'Wang', 'Kim', 'Patel', 'Singh', 'Ivanov', 'Sato', 'Muller', 'Rossi', 'Silva', 'Mensah', 'Okafor',
+]
+SUFFIXES: list[str] = ['', '', '', 'son', 'ova', 'ez', 'er', 'ski', 'berg', 'feld']
+FIRST_MOBILE: int = 5550000000
+BATCH_SIZE: int = 50_000
+
+
+def roster(size: int, seed: int = 0) -> Iterator[tuple[str, str, int]]:
+    """
+    This function yields size (name, course, mobile) rows, the same ones for the same seed.
+    """
+    pick = random.Random(seed).choice
+    for i in range(size):
+        yield f"{pick(FIRST_NAMES)} {pick(LAST_NAMES)}{pick(SUFFIXES)}", pick(DEFAULT_COURSES), FIRST_MOBILE + i
+
+
+def create_database(path: str, size: int, seed: int = 0) -> None:
+    """
+    This function writes a fresh database with a roster of size rows to path. The indexes are built once at the end,
+    like a large import does, and statistics are gathered so the planner sees a database that has been in use.
+    """
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    connection = sqlite3.connect(path)
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")
+        ensure_schema(connection)
+        drop_indexes(connection)
+        rows = roster(size, seed)
+        while batch := [row for _, row in zip(range(BATCH_SIZE), rows)]:
+            insert_students(connection, batch)
+            connection.commit()
+        create_indexes(connection)
+        connection.execute("ANALYZE")
+        connection.commit()
+        prune_changes(connection)
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        connection.close()
+
+
+def cached_database(directory: str, size: int, seed: int = 0, cache: Optional[str] = None) -> str:
+    """
+    This function returns the path of a fresh copy of the roster database in directory. With a cache directory the
+    roster is generated only the first time and copied afterwards, which matters for the larger sizes.
+    """
+    path = os.path.join(directory, f"roster-{size}-{seed}.db")
+    if cache is None:
+        create_database(path, size, seed)
+        return path
+
+    cached = os.path.join(cache, f"roster-{size}-{seed}.db")
+    if not os.path.exists(cached):
+        os.makedirs(cache, exist_ok=True)
+        create_database(cached + ".part", size, seed)
+        os.replace(cached + ".part", cached)
+    shutil.copyfile(cached, path)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a database with a synthetic roster.")
+    parser.add_argument("path")
+    parser.add_argument("size", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    create_database(args.path, args.size, args.seed)
+    print(f"{args.size} students written to {args.path} in {time.perf_counter() - start:.1f} s", file=sys.stderr)
@@ -0,0 +1,143 @@
+import sqlite3
+from typing import Iterable, NamedTuple, Optional
+
+from database import DatabaseConnection
+from instrumentation import timed
+
+
+class StudentChange(NamedTuple):
+    """
+    A student that was inserted, updated or deleted since the previous poll. row is None once the student is deleted.
+    """
+    student_id: int
+    row: Optional[tuple]
+    inserted: bool
+
+
+def changelog_position(connection: sqlite3.Connection) -> tuple[int, int]:
+    """
+    This function returns how far the changelog and the student ids are: the seq of the latest student_changes entry
+    and the highest id ever handed out. Read inside one transaction, the two describe the same moment.
+    """
+    last_change: int = connection.execute("SELECT coalesce(max(seq), 0) FROM student_changes").fetchone()[0]
+    last_id: int = connection.execute(
+        "SELECT coalesce((SELECT seq FROM sqlite_sequence WHERE name = 'students'), 0)").fetchone()[0]
+    return last_change, last_id
+
+
+class ChangeFeed:
+    """
+    Tells which students other connections, including other instances of the application, changed since the last look.
+
+    The feed keeps its own connection, so PRAGMA data_version tells it whether any other connection committed since
+    the last poll, which costs a few microseconds and no table access and can therefore run every second. When
+    something did change, only the ids logged in student_changes since the last seen seq are read. Ids above the
+    previous high-water mark of sqlite_sequence were inserted, since AUTOINCREMENT never hands out an id twice, the
+    others were updated or, if their row is gone, deleted. If the changelog was pruned past the last seen seq or too
+    many rows changed, poll returns None and the caller reads everything again.
+
+    The feed is not thread safe, only one thread may use it at a time.
+
+    Attributes:
+    MAX_CHANGED_ROWS (int): Above this many changed ids poll gives up and returns None.
+
+    Methods:
+    skip(self) -> None: Forgets every change up to now, after the caller read everything again.
+    seek(self, last_change: int, last_id: int) -> None: Moves the feed back to a position read earlier.
+    poll(self, ignore) -> Optional[list[StudentChange]]: Returns the students that changed since the previous poll.
+    close(self) -> None: Closes the feed connection.
+    """
+
+    MAX_CHANGED_ROWS: int = 5000
+
+    def __init__(self, database: Optional[DatabaseConnection] = None) -> None:
+        self.database: DatabaseConnection = database or DatabaseConnection()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+        self._last_change: int = 0
+        self._last_id: int = 0
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = self.database.open()
+        return self._connection
+
+    def skip(self) -> None:
+        """
+        This function moves the feed past every change committed so far. The positions are read in one transaction,
+        so no change can slip in between them.
+        """
+        connection = self.connection
+        connection.execute("BEGIN")
+        try:
+            self._read_positions(connection)
+        finally:
+            connection.rollback()
+
+    def seek(self, last_change: int, last_id: int) -> None:
+        """
+        This function moves the feed to a changelog position read earlier with changelog_position, for example when
+        the rows shown were read back from a snapshot. The next poll returns every change committed since.
+        """
+        self._last_change = last_change
+        self._last_id = last_id
+        # No data_version is ever negative, so the next poll looks at the changelog
+        self._data_version = -1
+
+    @timed("feed.poll")
+    def poll(self, ignore: Iterable[int] = ()) -> Optional[list[StudentChange]]:
+        """
+        This function returns the students that changed since the previous poll, in no particular order, leaving out
+        the ids in ignore, which the caller already knows about. It returns an empty list if nothing changed, and None
+        if the changes cannot be told apart and everything has to be read again.
+        """
+        if self._data_version is None:
+            self.skip()
+            return []
+        connection = self.connection
+        if connection.execute("PRAGMA data_version").fetchone()[0] == self._data_version:
+            return []
+
+        last_change: int = self._last_change
+        last_id: int = self._last_id
+        connection.execute("BEGIN")
+        try:
+            oldest: Optional[int] = connection.execute("SELECT min(seq) FROM student_changes").fetchone()[0]
+            self._read_positions(connection)
+            if self._last_change < last_change or self._last_id < last_id:
+                return None  # the changelog went back, the database was restored or replaced
+            if self._last_change == last_change:
+                return []
+            if oldest is None or oldest > last_change + 1:
+                return None  # pruned past the last seen entry
+
+            ignored: set[int] = set(ignore)
+            ids: list[int] = [student_id for student_id, in connection.execute(
+                "SELECT DISTINCT student_id FROM student_changes WHERE seq > ? AND seq <= ? LIMIT ?",
+                (last_change, self._last_change, self.MAX_CHANGED_ROWS + len(ignored) + 1))
+                if student_id not in ignored]
+            if len(ids) > self.MAX_CHANGED_ROWS:
+                return None
+
+            current: dict[int, tuple] = {}
+            # Stay below the default limit of 999 bound parameters per statement
+            for start in range(0, len(ids), 900):
+                chunk = ids[start:start + 900]
+                for row in connection.execute(
+                        f"SELECT id, name, course, mobile FROM student_rows WHERE id IN ({','.join('?' * len(chunk))})",
+                        chunk):
+                    current[row[0]] = row
+        finally:
+            connection.rollback()
+        return [StudentChange(student_id, current.get(student_id), student_id > last_id) for student_id in ids]
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _read_positions(self, connection: sqlite3.Connection) -> None:
+        # Remembers how far the changelog and the ids are, inside the caller's read transaction
+        self._data_version = connection.execute("PRAGMA data_version").fetchone()[0]
+        self._last_change, self._last_id = changelog_position(connection)
@@ -0,0 +1,276 @@
+"""
+Command line interface to the student database, for scripts and cron jobs.
+
+It never imports PyQt6 or dataclasses, and the import, export, duplicate and backup modules are only loaded by the
+commands that need them. A command such as courses takes about 0.09 s, of which starting Python is about 0.02 s and
+importing argparse, re, typing and sqlite3 most of the rest. Exit status is 0 on success, 1 when the command failed and
+2 for invalid arguments.
+
+Usage:
+    python cli.py add "Jane Doe" Math 5551234567
+    python cli.py search [--name NAME] [--course COURSE] [--mobile MOBILE] [--match TEXT] [--format table|csv|json]
+    python cli.py update ID [--name NAME] [--course COURSE] [--mobile MOBILE]
+    python cli.py delete ID [ID ...]
+    python cli.py set-course COURSE ID [ID ...]
+    python cli.py import students.csv [--rejects rejected.csv] [--duplicates duplicates.csv]
+    python cli.py export students.jsonl [--course COURSE]
+    python cli.py stats [--changes N]
+    python cli.py courses
+    python cli.py add-course Geography
+    python cli.py retire-course Science [--undo]
+    python cli.py duplicates [--report duplicates.csv]
+    python cli.py backup [--directory DIRECTORY] [--keep N]
+    python cli.py restore backups/students-20240101-120000.db.gz
+"""
+import argparse
+import sqlite3
+import sys
+from typing import Optional
+
+from database import DatabaseConnection
+from repository import Student, StudentRepository
+from schema import NAME_SEARCH_LIMIT
+
+
+def print_students(students: list[Student], output_format: str) -> None:
+    if output_format == "json":
+        import json
+        for student in students:
+            print(json.dumps(student._asdict(), ensure_ascii=False))
+    elif output_format == "csv":
+        import csv
+        writer = csv.writer(sys.stdout)
+        writer.writerow(Student._fields)
+        writer.writerows(students)
+    else:
+        for student in students:
+            print(f"{student.id:>8}  {student.name or '':<30}  {student.course or '':<10}  {student.mobile or ''}")
+
+
+def add(repository: StudentRepository, args: argparse.Namespace) -> int:
+    from duplicates import find_matches
+    from importer import RowError, offered_courses, validate_row
+    try:
+        row = validate_row({"name": args.name, "course": args.course, "mobile": args.mobile},
+                           offered_courses(repository.database))
+    except RowError as e:
+        print(f"invalid student: {e}", file=sys.stderr)
+        return 1
+    # Scripts cannot be asked like the add dialog asks, the student is added and the matches are only reported
+    for student, reason in find_matches(row[0], row[2], repository.database):
+        print(f"warning: may already be student {student.id}: {student.name}, {student.course or 'no course'}, "
+              f"{student.mobile} ({reason})", file=sys.stderr)
+    print(repository.add([row])[0].id)
+    return 0
+
+
+def search(repository: StudentRepository, args: argparse.Namespace) -> int:
+    if args.match is not None:
+        students = repository.match_name(args.match, args.limit or NAME_SEARCH_LIMIT)
+    else:
+        students = repository.search(args.name, args.course, args.mobile, args.limit)
+    print_students(students, args.format)
+    return 0
+
+
+def update(repository: StudentRepository, args: argparse.Namespace) -> int:
+    found = repository.get([args.id])
+    if not found:
+        print(f"no student with id {args.id}", file=sys.stderr)
+        return 1
+    current = found[0]
+    repository.update([current._replace(**{field: value for field, value in
+                                           (("name", args.name), ("course", args.course), ("mobile", args.mobile))
+                                           if value is not None})])
+    return 0
+
+
+def delete(repository: StudentRepository, args: argparse.Namespace) -> int:
+    deleted = repository.delete(args.ids)
+    print(deleted)
+    return 0 if deleted == len(set(args.ids)) else 1
+
+
+def set_course(repository: StudentRepository, args: argparse.Namespace) -> int:
+    changed = repository.set_course(args.ids, args.course)
+    print(changed)
+    return 0 if changed == len(set(args.ids)) else 1
+
+
+def import_file(repository: StudentRepository, args: argparse.Namespace) -> int:
+    from importer import import_students
+    outcome = import_students(args.path, repository.database, rejects_path=args.rejects,
+                              duplicates_path=args.duplicates)
+    print(f"{outcome.imported} imported, {outcome.rejected} rejected in {outcome.seconds:.1f} s", file=sys.stderr)
+    for line_number, reason in outcome.errors:
+        print(f"line {line_number}: {reason}", file=sys.stderr)
+    if args.duplicates:
+        print(f"{outcome.duplicates} groups of probable duplicates written to {args.duplicates}", file=sys.stderr)
+    return 0
+
+
+def export_file(repository: StudentRepository, args: argparse.Namespace) -> int:
+    from exporter import export_students
+    from schema import search_query
+    sql, params = search_query(args.name, args.course, args.mobile)
+    outcome = export_students(args.path, f"SELECT id, name, course, mobile FROM ({sql}) ORDER BY id", params,
+                              repository.database, args.format)
+    print(f"{outcome.exported} exported, {outcome.size} bytes in {outcome.seconds:.1f} s", file=sys.stderr)
+    return 0
+
+
+def stats(repository: StudentRepository, args: argparse.Namespace) -> int:
+    counts = repository.course_counts()
+    total = sum(counts.values())
+    for course, students in sorted(counts.items(), key=lambda item: -item[1]):
+        print(f"{course or '(no course)':<12}  {students:>10}  {students / total:>6.1%}")
+    print(f"{'total':<12}  {total:>10}")
+    if args.changes:
+        print()
+        for change in repository.recent_changes(args.changes):
+            student = change.student
+            now: str = "deleted" if student is None else f"{student.name or ''}, {student.course or ''}"
+            print(f"{change.seq:>10}  {change.student_id:>8}  {now}")
+    return 0
+
+
+def courses(repository: StudentRepository, args: argparse.Namespace) -> int:
+    for course in repository.courses():
+        print(f"{course.name:<20}  {'retired' if course.retired else ''}".rstrip())
+    return 0
+
+
+def add_course(repository: StudentRepository, args: argparse.Namespace) -> int:
+    repository.add_course(args.name)
+    return 0
+
+
+def retire_course(repository: StudentRepository, args: argparse.Namespace) -> int:
+    if not repository.retire_course(args.name, not args.undo):
+        print(f"no course {args.name!r}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def duplicates(repository: StudentRepository, args: argparse.Namespace) -> int:
+    from duplicates import find_duplicates, report_duplicates, write_report
+    if args.report:
+        outcome = report_duplicates(args.report, repository.database)
+    else:
+        outcome = find_duplicates(repository.database)
+        write_report(sys.stdout, outcome.groups)
+    print(f"{len(outcome.groups)} groups of {sum(len(group) for group in outcome.groups)} students among "
+          f"{outcome.students} in {outcome.seconds:.1f} s", file=sys.stderr)
+    return 0
+
+
+def backup(repository: StudentRepository, args: argparse.Namespace) -> int:
+    from backup import backup_database
+    outcome = backup_database(repository.database, args.directory, args.keep)
+    print(outcome.path)
+    print(f"{outcome.pages} pages, {outcome.size} bytes compressed in {outcome.seconds:.1f} s, "
+          f"{len(outcome.removed)} old backups removed", file=sys.stderr)
+    return 0
+
+
+def restore(repository: StudentRepository, args: argparse.Namespace) -> int:
+    from backup import restore_database
+    outcome = restore_database(args.path, repository.database)
+    print(f"{outcome.students} students restored in {outcome.seconds:.1f} s", file=sys.stderr)
+    return 0
+
+
+def parser() -> argparse.ArgumentParser:
+    main_parser = argparse.ArgumentParser(description="Manage the students of the student management system.")
+    main_parser.add_argument("--database", help="database file, overrides STUDENTS_DATABASE and config.ini")
+    commands = main_parser.add_subparsers(dest="command", required=True)
+
+    def add_fields(command: argparse.ArgumentParser) -> None:
+        command.add_argument("--name")
+        command.add_argument("--course")
+        command.add_argument("--mobile", type=int)
+
+    command = commands.add_parser("add", help="add a student and print its id")
+    command.add_argument("name")
+    command.add_argument("course")
+    command.add_argument("mobile")
+    command.set_defaults(run=add)
+
+    command = commands.add_parser("search", help="print the students that match")
+    add_fields(command)
+    command.add_argument("--match", help="match names as they are typed in the filter bar instead")
+    command.add_argument("--limit", type=int)
+    command.add_argument("--format", choices=("table", "csv", "json"), default="table")
+    command.set_defaults(run=search)
+
+    command = commands.add_parser("update", help="change fields of a student")
+    command.add_argument("id", type=int)
+    add_fields(command)
+    command.set_defaults(run=update)
+
+    command = commands.add_parser("delete", help="delete students and print how many were deleted")
+    command.add_argument("ids", type=int, nargs="+", metavar="id")
+    command.set_defaults(run=delete)
+
+    command = commands.add_parser("set-course", help="move students to a course and print how many were moved")
+    command.add_argument("course")
+    command.add_argument("ids", type=int, nargs="+", metavar="id")
+    command.set_defaults(run=set_course)
+
+    command = commands.add_parser("import", help="import a CSV or JSON Lines file")
+    command.add_argument("path")
+    command.add_argument("--rejects", help="write every rejected line and the reason to this CSV file")
+    command.add_argument("--duplicates", help="write the probable duplicates of the imported students to this CSV file")
+    command.set_defaults(run=import_file)
+
+    command = commands.add_parser("export", help="export students to a CSV, JSON Lines or columnar file")
+    command.add_argument("path")
+    add_fields(command)
+    command.add_argument("--format", choices=("csv", "jsonl", "columnar"))
+    command.set_defaults(run=export_file)
+
+    command = commands.add_parser("stats", help="print the number of students per course")
+    command.add_argument("--changes", type=int, default=0, metavar="N", help="also print the last N changes")
+    command.set_defaults(run=stats)
+
+    command = commands.add_parser("courses", help="print every course, retired ones marked")
+    command.set_defaults(run=courses)
+
+    command = commands.add_parser("add-course", help="add a course")
+    command.add_argument("name")
+    command.set_defaults(run=add_course)
+
+    command = commands.add_parser("retire-course", help="stop offering a course, its students keep it")
+    command.add_argument("name")
+    command.add_argument("--undo", action="store_true", help="offer a retired course again")
+    command.set_defaults(run=retire_course)
+
+    command = commands.add_parser("duplicates", help="print a merge report of the students entered more than once")
+    command.add_argument("--report", help="write the report to this CSV file instead")
+    command.set_defaults(run=duplicates)
+
+    command = commands.add_parser("backup", help="back the database up and print the path of the backup")
+    command.add_argument("--directory", help="backup directory, overrides config.ini")
+    command.add_argument("--keep", type=int, help="number of backups to keep, overrides config.ini")
+    command.set_defaults(run=backup)
+
+    command = commands.add_parser("restore", help="replace the database with a backup")
+    command.add_argument("path")
+    command.set_defaults(run=restore)
+    return main_parser
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = parser().parse_args(argv)
+    repository = StudentRepository(DatabaseConnection(args.database))
+    try:
+        return args.run(repository, args)
+    except (OSError, sqlite3.Error, ValueError) as e:
+        print(f"{args.command} failed: {e}", file=sys.stderr)
+        return 1
+    finally:
+        DatabaseConnection.close_all()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+import configparser
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import instrumentation
+from schema import ensure_schema, prune_changes
+
+# The database path is read from the STUDENTS_DATABASE environment variable first, then from the [database] section
+# of config.ini next to this file, and falls back to database.db next to this file.
+DATABASE_ENV: str = "STUDENTS_DATABASE"
+CONFIG_FILE: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.ini")
+DEFAULT_DATABASE_FILE: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database.db")
+
+POOL_SIZE: int = 4
+CLOSE_TIMEOUT: float = 2.0  # seconds close_all waits for a connection to optimize with before closing without
+STATEMENT_CACHE_SIZE: int = 256
+PRAGMAS: dict[str, object] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -32000,  # negative means KiB, so about 32 MB of page cache per connection
+    "mmap_size": 268435456,  # 256 MB
+    "busy_timeout": 5000,  # ms
+    "temp_store": "MEMORY",
+    "foreign_keys": "ON",  # a student can only refer to a course that exists
+}
+
+
+def database_path() -> str:
+    """
+    This function returns the path of the database file from the environment, the config file or the default.
+    """
+    path: Optional[str] = os.environ.get(DATABASE_ENV)
+    if path:
+        return path
+
+    config = configparser.ConfigParser()
+    if config.read(CONFIG_FILE) and config.has_option("database", "path"):
+        return os.path.expanduser(config.get("database", "path"))
+
+    return DEFAULT_DATABASE_FILE
+
+
+class ConnectionPool:
+    """
+    Keeps a small set of long-lived connections to one database file.
+
+    Connections are opened on demand up to max_size, tuned with PRAGMAS once when they are opened and then reused, so
+    their page cache and prepared-statement cache stay warm. Idle connections are handed out last-in first-out, which
+    keeps the most recently used (and warmest) connection busy. A connection is only ever used by one thread at a time,
+    but it may be a different thread each time it is borrowed.
+
+    Attributes:
+    database_file (str): The path to the database file.
+    max_size (int): The maximum number of open connections.
+
+    Methods:
+    acquire(self, timeout: Optional[float]) -> sqlite3.Connection: Borrows a connection, opening one if needed.
+    release(self, connection: sqlite3.Connection) -> None: Returns a borrowed connection to the pool.
+    open(self) -> sqlite3.Connection: Opens a new tuned connection that does not belong to the pool.
+    close(self) -> None: Closes all idle connections, and the borrowed ones once they are released.
+    """
+
+    def __init__(self, database_file: str, max_size: int = POOL_SIZE) -> None:
+        self.database_file: str = database_file
+        self.max_size: int = max_size
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._opened: int = 0
+        self._closed: bool = False
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: Optional[float] = None) -> sqlite3.Connection:
+        """
+        This function borrows an idle connection, opens a new one while the pool is not full, or waits for one to be
+        released. It raises queue.Empty if none was released within timeout seconds, and RuntimeError once the pool is
+        closed, also to a caller that is still waiting then.
+        """
+        try:
+            return self._checked(self._idle.get_nowait())
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("the connection pool is closed")
+            can_open: bool = self._opened < self.max_size
+            if can_open:
+                self._opened += 1
+        if can_open:
+            try:
+                return self.open()
+            except sqlite3.Error:
+                with self._lock:
+                    self._opened -= 1
+                raise
+
+        return self._checked(self._idle.get(timeout=timeout))
+
+    def release(self, connection: sqlite3.Connection) -> None:
+        """
+        This function returns a borrowed connection to the pool, rolling back anything left uncommitted. Once the pool
+        is closed the connection is closed instead.
+        """
+        if connection.in_transaction:
+            connection.rollback()
+        with self._lock:
+            # Checked under the lock, so close never misses a connection that is put back while it drains the pool
+            if not self._closed:
+                self._idle.put(connection)
+                return
+            self._opened -= 1
+        connection.close()
+
+    def close(self) -> None:
+        """
+        This function closes all idle connections. Connections that are still borrowed are closed when released later,
+        and callers waiting for one get RuntimeError.
+        """
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if connection is None:
+                continue
+            connection.close()
+            with self._lock:
+                self._opened -= 1
+        # Wakes the callers waiting in acquire, nothing is released to them any more
+        self._idle.put(None)
+
+    def open(self) -> sqlite3.Connection:
+        """
+        This function opens a new connection tuned like the pooled ones. Callers that need to keep the same
+        connection, for example to compare PRAGMA data_version between calls, use this and close it themselves.
+        """
+        connection = sqlite3.connect(self.database_file, check_same_thread=False,
+                                     cached_statements=STATEMENT_CACHE_SIZE, **instrumentation.connection_options())
+        instrumentation.trace(connection)
+        for pragma, value in PRAGMAS.items():
+            connection.execute(f"PRAGMA {pragma}={value}")
+        return connection
+
+    def _checked(self, connection: Optional[sqlite3.Connection]) -> sqlite3.Connection:
+        if connection is None:
+            # Put back for the next waiter, every one of them has to wake up
+            self._idle.put(None)
+            raise RuntimeError("the connection pool is closed")
+        return connection
+
+
+class DatabaseConnection:
+    """
+    Connects to the database file.
+
+    All instances that point at the same file share one ConnectionPool, so creating a DatabaseConnection is cheap and
+    the connections it hands out are already tuned and warm. The first time a file is used, its tables and indexes are
+    brought up to date with ensure_schema.
+
+    Attributes:
+    database_file (str): The path to the database file.
+
+    Methods:
+    connect (self) -> Iterator[sqlite3.Connection]: Context manager that borrows a pooled connection to the database file.
+    open (self) -> sqlite3.Connection: Opens a dedicated connection outside of the pool.
+    close_all (cls) -> None: Closes every pool, used when the application exits.
+    """
+
+    _pools: dict[str, ConnectionPool] = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(self, database_file: Optional[str] = None) -> None:
+        self.database_file: str = database_file or database_path()
+
+    @property
+    def pool(self) -> ConnectionPool:
+        with self._pools_lock:
+            pool = self._pools.get(self.database_file)
+            if pool is None:
+                pool = ConnectionPool(self.database_file)
+                connection = pool.acquire()
+                try:
+                    ensure_schema(connection)
+                finally:
+                    pool.release(connection)
+                self._pools[self.database_file] = pool
+            return pool
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        """
+        This function borrows a connection for the duration of the with block. The work is committed when the block
+        ends normally and rolled back if it raises.
+        """
+        pool = self.pool
+        connection = pool.acquire()
+        try:
+            yield connection
+            if connection.in_transaction:
+                connection.commit()
+        finally:
+            pool.release(connection)
+
+    def open(self) -> sqlite3.Connection:
+        """
+        This function opens a connection of its own to the database file, tuned like the pooled ones, which the caller
+        keeps as long as it likes and has to close itself. See ConnectionPool.open.
+        """
+        return self.pool.open()
+
+    @classmethod
+    def close_all(cls) -> None:
+        """
+        This function closes every pool. Before that it optimizes each database and prunes its changelog on a pooled
+        connection, unless every connection stays borrowed for CLOSE_TIMEOUT seconds, which skips that upkeep rather
+        than wait on a query that may not end soon.
+        """
+        with cls._pools_lock:
+            for pool in cls._pools.values():
+                try:
+                    connection: Optional[sqlite3.Connection] = pool.acquire(CLOSE_TIMEOUT)
+                except queue.Empty:
+                    connection = None
+                if connection is not None:
+                    try:
+                        # Lets sqlite refresh the statistics of tables that changed a lot, cheap when nothing did
+                        connection.execute("PRAGMA optimize")
+                        prune_changes(connection)
+                    finally:
+                        pool.release(connection)
+                pool.close()
+            cls._pools.clear()
@@ -0,0 +1,430 @@
+"""
+Detection of students that were entered twice, with a slightly different spelling of the name or format of the phone
+number.
+
+Names and phone numbers are normalized before they are compared. A name is folded to lower case without accents,
+apostrophes and punctuation, single letters such as middle initials are dropped and the words are sorted, so
+"Doe, Jane A." and "jane doe" become the same name. A phone number keeps its last PHONE_KEY_DIGITS digits, which leaves
+out country codes, so +1 (555) 123-4567 and 5551234567 are the same number.
+
+The whole table is never compared pairwise. Every student gets a few blocking keys, and only students that share a key
+are compared with each other:
+
+    phone                        the phone number, the names must be similar
+    name + even digits           the name and every other digit of the phone number, starting with the first
+    name + odd digits            the name and every other digit, starting with the second
+    name + sorted digits         the name and the digits of the phone number in ascending order
+    name                         the name, for students without a phone number
+
+A number with one wrong digit still has the same even or the same odd digits, and one with two neighbouring digits
+swapped still has the same sorted digits, so those typos end up in a common block. Each kind of key is one pass over
+the students with a dict. Students of a block with the same normalized name and phone number are joined without
+comparing them. The blocks that share the name are searched for typos with a dict of masked phone numbers too, which
+takes time in proportion to the block however large it is; the students of a phone number block are compared pairwise,
+and such a block of more than MAX_BLOCK different names is skipped. A full pass over a million students takes about
+ten seconds. Students that match are joined into groups, the one with the lowest id, entered first, is the one to keep.
+
+find_matches checks a single new student the same way with indexed lookups, for a warning before it is added.
+
+Usage:
+    python duplicates.py [--report duplicates.csv]
+"""
+import argparse
+import csv
+import difflib
+import os
+import re
+import sqlite3
+import sys
+import time
+import unicodedata
+from dataclasses import dataclass, field
+from functools import lru_cache, partial
+from itertools import combinations
+from typing import Callable, Iterable, NamedTuple, Optional, TextIO, Union
+
+from database import DatabaseConnection
+from repository import Student, StudentRepository
+
+PHONE_KEY_DIGITS: int = 10  # national number without the country code
+NAME_SIMILARITY: float = 0.8  # difflib ratio of two words that are one spelling, "kim" and "ki" just pass
+MAX_BLOCK: int = 100
+MATCH_CANDIDATES: int = 50_000  # bounds the name lookup of find_matches for the most common names
+FETCH_SIZE: int = 10_000
+PROGRESS_ROWS: int = 100_000
+REPORT_COLUMNS: tuple[str, ...] = ("group", "keep", "id", "name", "course", "mobile", "reason")
+
+_APOSTROPHES = re.compile(r"['’`]")
+_NAME_WORDS = re.compile(r"[^\W_]+")
+_NOT_DIGITS = re.compile(r"\D")
+
+
+class Duplicate(NamedTuple):
+    """
+    A student that is probably the same as another one, and why. The reason is empty for the student to keep.
+    """
+    student: Student
+    reason: str
+
+
+@dataclass
+class DuplicateProgress:
+    """
+    Progress of a running duplicate search, passed to the progress callback while it reads and compares.
+    """
+    stage: str  # reading or comparing
+    fraction: float  # share of the stage done so far, 0.0 to 1.0
+
+
+@dataclass
+class DuplicateResult:
+    """
+    Outcome of a duplicate search. groups holds the students that are probably the same, the one to keep first.
+    """
+    students: int = 0
+    groups: list[list[Duplicate]] = field(default_factory=list)
+    compared: int = 0  # candidate pairs compared
+    skipped_blocks: int = 0  # blocks of more than MAX_BLOCK students
+    path: str = ""
+    seconds: float = 0.0
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """
+    This function returns the form of a name that spellings of the same name share: lower case, without accents and
+    punctuation, without single letters and with the words sorted.
+    """
+    if not name:
+        return ""
+    if not name.isascii():
+        name = "".join(char for char in unicodedata.normalize("NFKD", name) if not unicodedata.combining(char))
+    words: list[str] = _NAME_WORDS.findall(_APOSTROPHES.sub("", name).casefold())
+    # Middle initials come and go, unless the name is nothing but initials
+    return " ".join(sorted([word for word in words if len(word) > 1] or words))
+
+
+def normalize_phone(mobile: Union[int, str, None]) -> str:
+    """
+    This function returns the last PHONE_KEY_DIGITS digits of a phone number, an empty string if it has none.
+    """
+    if mobile is None:
+        return ""
+    return _NOT_DIGITS.sub("", str(mobile))[-PHONE_KEY_DIGITS:]
+
+
+@lru_cache(maxsize=1 << 16)
+def similar_names(first: str, second: str) -> bool:
+    """
+    This function tells whether two normalized names are probably spellings of the same name: the words of one are
+    all in the other, or the words they do not share pair up into words that differ in a few letters only.
+    """
+    if first == second:
+        return True
+    if not first or not second:
+        return False
+    first_words, second_words = first.split(), second.split()
+    first_rest: list[str] = [word for word in first_words if word not in second_words]
+    second_rest: list[str] = [word for word in second_words if word not in first_words]
+    if not first_rest or not second_rest:
+        return True
+    if len(first_rest) != len(second_rest):
+        return False
+    # The words are sorted, so a misspelled word may have moved, each is paired with its closest one instead
+    for word in first_rest:
+        ratios: list[float] = [difflib.SequenceMatcher(None, word, other).ratio() for other in second_rest]
+        best: int = max(range(len(ratios)), key=ratios.__getitem__)
+        if ratios[best] < NAME_SIMILARITY:
+            return False
+        del second_rest[best]
+    return True
+
+
+def match_reason(first_name: str, first_phone: str, second_name: str, second_phone: str) -> Optional[str]:
+    """
+    This function compares two students by their normalized names and phone numbers and returns why they are
+    probably the same student, or None if they are not.
+    """
+    if first_phone and first_phone == second_phone:
+        if first_name == second_name:
+            return "same name and phone"
+        # Family members often share a number, so the names have to be alike as well
+        return "same phone, similar name" if similar_names(first_name, second_name) else None
+    if not first_name or first_name != second_name:
+        return None
+    if not first_phone and not second_phone:
+        return "same name, no phone"
+    if len(first_phone) != len(second_phone):
+        return None
+    different: list[int] = [i for i, (a, b) in enumerate(zip(first_phone, second_phone)) if a != b]
+    if len(different) == 1:
+        return "same name, phone differs in one digit"
+    if len(different) == 2 and different[1] == different[0] + 1 \
+            and first_phone[different[0]] == second_phone[different[1]] \
+            and first_phone[different[1]] == second_phone[different[0]]:
+        return "same name, phone digits swapped"
+    return None
+
+
+def phone_variants(phone: str) -> list[str]:
+    """
+    This function returns the phone number together with every number that differs from it by one digit or by two
+    neighbouring digits swapped, the typos match_reason accepts.
+    """
+    variants: list[str] = [phone]
+    for i, digit in enumerate(phone):
+        variants.extend(phone[:i] + other + phone[i + 1:] for other in "0123456789" if other != digit)
+        if i + 1 < len(phone) and phone[i + 1] != digit:
+            variants.append(phone[:i] + phone[i + 1] + digit + phone[i + 2:])
+    return variants
+
+
+def find_matches(name: str, mobile: Union[int, str, None],
+                 database: Optional[DatabaseConnection] = None) -> list[Duplicate]:
+    """
+    This function returns the students that a new student with the given name and phone number would probably
+    duplicate, in id order. The candidates are read through indexes only: the students whose phone number is one of
+    the phone_variants of the new one, and those whose name has the same words in the full text index and whose
+    national number is one of the variants, whatever country code it was stored with.
+    """
+    database = database or DatabaseConnection()
+    name_key: str = normalize_name(name)
+    phone: str = normalize_phone(mobile)
+    national: list[int] = sorted({int(variant) for variant in phone_variants(phone)}) if phone else []
+    candidates: dict[int, Student] = {}
+
+    with database.connect() as connection:
+        if phone:
+            # The number as it was typed, country code included, and the national number alone
+            prefix: str = _NOT_DIGITS.sub("", str(mobile))[:-len(phone)]
+            numbers: list[int] = sorted({int(prefix + variant) for variant in phone_variants(phone)} | set(national))
+            for row in connection.execute(f"SELECT id, name, course, mobile FROM student_rows "
+                                          f"WHERE mobile IN ({','.join('?' * len(numbers))})", numbers):
+                candidates[row[0]] = Student(*row)
+        words: list[str] = [word for word in re.findall(r"\w+", name or "") if len(word) > 1]
+        if words:
+            # Quoting keeps words such as AND, OR or NEAR from being read as operators
+            match: str = " ".join(f'"{word}"' for word in words)
+            sql: str = ("SELECT id, name, course, mobile FROM student_rows WHERE id IN "
+                        "(SELECT rowid FROM students_fts WHERE students_fts MATCH ? LIMIT ?) AND ")
+            if phone:
+                rows = connection.execute(sql + f"mobile % ? IN ({','.join('?' * len(national))})",
+                                          (match, MATCH_CANDIDATES, 10 ** PHONE_KEY_DIGITS, *national))
+            else:
+                rows = connection.execute(sql + "mobile IS NULL", (match, MATCH_CANDIDATES))
+            for row in rows:
+                candidates[row[0]] = Student(*row)
+
+    matches: list[Duplicate] = []
+    for student_id in sorted(candidates):
+        student = candidates[student_id]
+        reason = match_reason(name_key, phone, normalize_name(student.name), normalize_phone(student.mobile))
+        if reason is not None:
+            matches.append(Duplicate(student, reason))
+    return matches
+
+
+def _digit_masks(phone: str, first: int) -> list[str]:
+    """
+    This function returns the phone number with every other digit from first on masked in turn. Two numbers that
+    share one of them differ in that digit at most.
+    """
+    return [f"{phone[:i]}?{phone[i + 1:]}" for i in range(first, len(phone), 2)]
+
+
+def _swap_masks(phone: str) -> list[tuple[int, str]]:
+    """
+    This function returns the phone number with every two neighbouring digits put in order in turn, together with
+    where. Two different numbers that share one of them are the same but for those two digits swapped.
+    """
+    return [(i, f"{phone[:i]}{min(phone[i], phone[i + 1])}{max(phone[i], phone[i + 1])}{phone[i + 2:]}")
+            for i in range(len(phone) - 1) if phone[i] != phone[i + 1]]
+
+
+def _blocks(keys: Iterable[Optional[str]]) -> Iterable[list[int]]:
+    """
+    This function returns the positions of the keys that occur more than once, one ascending list per key. None keys
+    are left out.
+    """
+    first: dict[str, int] = {}
+    blocks: dict[str, list[int]] = {}
+    for position, key in enumerate(keys):
+        if key is None:
+            continue
+        seen: int = first.setdefault(key, position)
+        if seen != position:
+            block = blocks.get(key)
+            if block is None:
+                blocks[key] = [seen, position]
+            else:
+                block.append(position)
+    return blocks.values()
+
+
+def find_duplicates(database: Optional[DatabaseConnection] = None,
+                    progress: Optional[Callable[[DuplicateProgress], None]] = None,
+                    since_id: int = 0) -> DuplicateResult:
+    """
+    This function searches the whole table for students that are probably the same and returns them in groups, see
+    the module docstring for how. Only the id, the normalized name and the normalized phone number of every student
+    are held in memory. With since_id, only the groups of a student whose id is above it are returned, for instance
+    the students an import added.
+    """
+    database = database or DatabaseConnection()
+    result = DuplicateResult()
+    start = time.perf_counter()
+
+    ids: list[int] = []
+    names: list[str] = []
+    phones: list[str] = []
+    normalized: dict[Optional[str], str] = {}  # names repeat a lot, each is normalized once
+    with database.connect() as connection:
+        last_id: int = connection.execute("SELECT max(id) FROM students").fetchone()[0] or 0
+        cursor = connection.execute("SELECT id, name, mobile FROM students ORDER BY id")
+        next_report: int = PROGRESS_ROWS
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            for student_id, name, mobile in rows:
+                name_key = normalized.get(name)
+                if name_key is None:
+                    name_key = normalized[name] = normalize_name(name)
+                ids.append(student_id)
+                names.append(name_key)
+                phones.append(normalize_phone(mobile))
+            if progress is not None and len(ids) >= next_report:
+                progress(DuplicateProgress("reading", ids[-1] / last_id))
+                next_report = len(ids) + PROGRESS_ROWS
+    result.students = len(ids)
+
+    # The keys of every kind, and for the kinds whose blocks share the name the neighbour keys of a phone number and
+    # what sharing one of them means. Blocks of the other kinds are compared pairwise.
+    kinds: list[tuple[Callable[[], Iterable[Optional[str]]], Optional[Callable[[str], list]], str]] = [
+        (lambda: (phone or None for phone in phones), None, ""),
+        (lambda: (f"{name}\0{phone[0::2]}" if name and phone else None for name, phone in zip(names, phones)),
+         partial(_digit_masks, first=1), "same name, phone differs in one digit"),
+        (lambda: (f"{name}\0{phone[1::2]}" if name and phone else None for name, phone in zip(names, phones)),
+         partial(_digit_masks, first=0), "same name, phone differs in one digit"),
+        (lambda: (f"{name}\0{''.join(sorted(phone))}" if name and phone else None
+                  for name, phone in zip(names, phones)),
+         _swap_masks, "same name, phone digits swapped"),
+        (lambda: (name if name and not phone else None for name, phone in zip(names, phones)), None, ""),
+    ]
+    # Union-find over the positions that matched, a group's root is its lowest position and so its lowest id
+    parents: dict[int, int] = {}
+    reasons: dict[int, str] = {}
+
+    def root(position: int) -> int:
+        while True:
+            parent: int = parents.get(position, position)
+            if parent == position:
+                return position
+            # Path halving, every step also shortens the way for the next lookup
+            parents[position] = position = parents.get(parent, parent)
+
+    def join(first: int, second: int, reason: str) -> None:
+        reasons.setdefault(first, reason)
+        reasons.setdefault(second, reason)
+        first_root, second_root = root(first), root(second)
+        if first_root != second_root:
+            parents[max(first_root, second_root)] = min(first_root, second_root)
+
+    for done, (keys, neighbours, neighbour_reason) in enumerate(kinds):
+        for block in _blocks(keys()):
+            # Students with the same normalized name and phone number are joined right away and compared only once
+            distinct: dict[tuple[str, str], int] = {}
+            for position in block:
+                seen: int = distinct.setdefault((names[position], phones[position]), position)
+                if seen != position:
+                    join(seen, position, "same name and phone" if phones[position] else "same name, no phone")
+            if neighbours is not None:
+                # Two different numbers share a neighbour key only if they are one typo apart, however large the block
+                masks: dict = {}
+                for position in distinct.values():
+                    for mask in neighbours(phones[position]):
+                        seen = masks.setdefault(mask, position)
+                        if seen != position:
+                            join(seen, position, neighbour_reason)
+                continue
+            if len(distinct) > MAX_BLOCK:
+                result.skipped_blocks += 1
+                continue
+            for first, second in combinations(distinct.values(), 2):
+                result.compared += 1
+                reason = match_reason(names[first], phones[first], names[second], phones[second])
+                if reason is not None:
+                    join(first, second, reason)
+        if progress is not None:
+            progress(DuplicateProgress("comparing", (done + 1) / len(kinds)))
+
+    members: dict[int, list[int]] = {}
+    for position in sorted(parents.keys() | parents.values()):
+        members.setdefault(root(position), []).append(position)
+    if since_id:
+        # Positions follow the ids, so the last member of a group has its highest id
+        members = {first: group for first, group in members.items() if ids[group[-1]] > since_id}
+    students: dict[int, Student] = {student.id: student for student in StudentRepository(database).get(
+        ids[position] for group in members.values() for position in group)}
+    for group in members.values():
+        # Students deleted since they were read are left out
+        found: list[int] = [position for position in group if ids[position] in students]
+        if len(found) > 1:
+            result.groups.append([Duplicate(students[ids[found[0]]], "")] +
+                                 [Duplicate(students[ids[position]], reasons[position]) for position in found[1:]])
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def write_report(file: TextIO, groups: list[list[Duplicate]]) -> None:
+    """
+    This function writes a merge report of duplicate groups as CSV, one line per student with the REPORT_COLUMNS. The
+    first student of a group is the one to keep, the others say why they are probably the same student.
+    """
+    writer = csv.writer(file)
+    writer.writerow(REPORT_COLUMNS)
+    for number, group in enumerate(groups, start=1):
+        for student, reason in group:
+            writer.writerow((number, "yes" if not reason else "", *student, reason))
+
+
+def report_duplicates(path: str, database: Optional[DatabaseConnection] = None,
+                      progress: Optional[Callable[[DuplicateProgress], None]] = None,
+                      since_id: int = 0) -> DuplicateResult:
+    """
+    This function searches the whole table for duplicates, or those of the students above since_id, and writes the
+    merge report to path. The file is written under a temporary name and only renamed to path once it is complete.
+    """
+    result = find_duplicates(database, progress, since_id)
+    partial_path = f"{path}.part"
+    try:
+        with open(partial_path, "w", newline="", encoding="utf-8") as file:
+            write_report(file, result.groups)
+        os.replace(partial_path, path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    result.path = path
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a merge report of the students entered more than once.")
+    parser.add_argument("--report", help="CSV file for the report, printed if left out")
+    args = parser.parse_args()
+
+    def show_progress(p: DuplicateProgress) -> None:
+        print(f"\r{p.stage} {p.fraction:6.1%}", end="", file=sys.stderr)
+
+    try:
+        if args.report:
+            outcome = report_duplicates(args.report, progress=show_progress)
+        else:
+            outcome = find_duplicates(progress=show_progress)
+            write_report(sys.stdout, outcome.groups)
+    except (OSError, sqlite3.Error) as e:
+        print(f"\nduplicate search failed: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"\n{len(outcome.groups)} groups of {sum(len(group) for group in outcome.groups)} students among "
+          f"{outcome.students} in {outcome.seconds:.1f} s", file=sys.stderr)
+    sys.exit(0)
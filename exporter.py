@@ -0,0 +1,241 @@
+"""
+Streaming export of students to CSV, JSON Lines or a compact columnar binary file.
+
+The rows of any query are read with fetchmany, FETCH_SIZE at a time, and written through a buffered file, so memory
+stays flat no matter how many rows are exported. The columnar format groups up to BLOCK_SIZE rows into a block, stores
+each column of the block contiguously and compresses the block with zlib; read_columnar reads such a file back.
+
+Columnar file layout, all numbers little-endian:
+    MAGIC, then blocks until the end of the file
+    block:       row count (uint32), compressed size (uint32), zlib compressed payload
+    payload:     the id, name, course and mobile columns one after the other
+    int column:  one validity byte per row (0 for NULL), then one int64 per row
+    text column: one int32 UTF-8 length per row (-1 for NULL), then the UTF-8 bytes of all values
+
+Usage:
+    python exporter.py students.csv [--format csv|jsonl|columnar]
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sqlite3
+import struct
+import sys
+import time
+import zlib
+from array import array
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional
+
+from database import DatabaseConnection
+
+FETCH_SIZE: int = 1000
+BLOCK_SIZE: int = 65536
+BUFFER_SIZE: int = 1 << 20  # 1 MB
+PROGRESS_ROWS: int = 50_000
+
+COLUMNS: tuple[str, ...] = ("id", "name", "course", "mobile")
+COLUMN_TYPES: tuple[str, ...] = ("int", "text", "text", "int")
+FORMATS: dict[str, str] = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".stcol": "columnar"}
+MAGIC: bytes = b"STUDCOL1"
+
+_BLOCK_HEADER = struct.Struct("<II")
+
+
+@dataclass
+class ExportProgress:
+    """
+    Progress of a running export, passed to the progress callback every PROGRESS_ROWS rows.
+    """
+    exported: int
+    total: int
+
+
+@dataclass
+class ExportResult:
+    """
+    Outcome of an export.
+    """
+    exported: int = 0
+    size: int = 0  # bytes written
+    seconds: float = 0.0
+
+
+def file_format_of(path: str) -> str:
+    return FORMATS.get(os.path.splitext(path)[1].lower(), "csv")
+
+
+def fetch_rows(cursor: sqlite3.Cursor, size: int = FETCH_SIZE) -> Iterator[tuple]:
+    """
+    This function yields the rows of an executed cursor, reading size rows at a time.
+    """
+    while rows := cursor.fetchmany(size):
+        yield from rows
+
+
+def write_csv(file: BinaryIO, rows: Iterable[tuple]) -> Iterator[int]:
+    """
+    This function writes a header line and the rows as CSV, yielding after every row so the caller can count them.
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8", newline="")
+    try:
+        writer = csv.writer(text)
+        writer.writerow(COLUMNS)
+        for row in rows:
+            writer.writerow(row)
+            yield 1
+    finally:
+        text.flush()
+        text.detach()  # leaves the binary file open for the caller
+
+
+def write_jsonl(file: BinaryIO, rows: Iterable[tuple]) -> Iterator[int]:
+    """
+    This function writes one JSON object per row, yielding after every row.
+    """
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+    for row in rows:
+        file.write(dumps(dict(zip(COLUMNS, row))).encode("utf-8") + b"\n")
+        yield 1
+
+
+def write_columnar(file: BinaryIO, rows: Iterable[tuple]) -> Iterator[int]:
+    """
+    This function writes the rows as compressed columnar blocks of up to BLOCK_SIZE rows, yielding the size of each
+    block after writing it.
+    """
+    file.write(MAGIC)
+    block: list[tuple] = []
+    for row in rows:
+        block.append(row)
+        if len(block) == BLOCK_SIZE:
+            _write_block(file, block)
+            yield len(block)
+            block = []
+    if block:
+        _write_block(file, block)
+        yield len(block)
+
+
+def _write_block(file: BinaryIO, rows: list[tuple]) -> None:
+    parts: list[bytes] = []
+    for column, kind in enumerate(COLUMN_TYPES):
+        values = [row[column] for row in rows]
+        if kind == "int":
+            parts.append(bytes(value is not None for value in values))
+            numbers = array("q", (0 if value is None else value for value in values))
+            if sys.byteorder == "big":
+                numbers.byteswap()
+            parts.append(numbers.tobytes())
+        else:
+            encoded = [None if value is None else str(value).encode("utf-8") for value in values]
+            lengths = array("i", (-1 if value is None else len(value) for value in encoded))
+            if sys.byteorder == "big":
+                lengths.byteswap()
+            parts.append(lengths.tobytes())
+            parts.append(b"".join(value for value in encoded if value is not None))
+    payload: bytes = zlib.compress(b"".join(parts), 6)
+    file.write(_BLOCK_HEADER.pack(len(rows), len(payload)))
+    file.write(payload)
+
+
+def read_columnar(path: str) -> Iterator[tuple]:
+    """
+    This function yields the (id, name, course, mobile) rows of a columnar file one block at a time.
+    """
+    with open(path, "rb", buffering=BUFFER_SIZE) as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a columnar student file")
+        while header := file.read(_BLOCK_HEADER.size):
+            count, size = _BLOCK_HEADER.unpack(header)
+            payload = memoryview(zlib.decompress(file.read(size)))
+            columns: list[list] = []
+            offset = 0
+            for kind in COLUMN_TYPES:
+                if kind == "int":
+                    valid = payload[offset:offset + count]
+                    offset += count
+                    numbers = array("q")
+                    numbers.frombytes(payload[offset:offset + 8 * count])
+                    offset += 8 * count
+                    if sys.byteorder == "big":
+                        numbers.byteswap()
+                    columns.append([number if ok else None for number, ok in zip(numbers, valid)])
+                else:
+                    lengths = array("i")
+                    lengths.frombytes(payload[offset:offset + 4 * count])
+                    offset += 4 * count
+                    if sys.byteorder == "big":
+                        lengths.byteswap()
+                    values: list[Optional[str]] = []
+                    for length in lengths:
+                        if length < 0:
+                            values.append(None)
+                        else:
+                            values.append(str(payload[offset:offset + length], "utf-8"))
+                            offset += length
+                    columns.append(values)
+            yield from zip(*columns)
+
+
+WRITERS: dict[str, Callable[[BinaryIO, Iterable[tuple]], Iterator[int]]] = {
+    "csv": write_csv,
+    "jsonl": write_jsonl,
+    "columnar": write_columnar,
+}
+
+
+def export_students(path: str, sql: str = "SELECT id, name, course, mobile FROM student_rows ORDER BY id",
+                    params: tuple = (), database: Optional[DatabaseConnection] = None,
+                    file_format: Optional[str] = None,
+                    progress: Optional[Callable[[ExportProgress], None]] = None) -> ExportResult:
+    """
+    This function writes the rows of a query, the whole table by default, to path and returns how it went. The query
+    must return the id, name, course and mobile columns in that order. The file is written under a temporary name and
+    only renamed to path once it is complete, so a failed export never leaves half a file behind.
+    """
+    database = database or DatabaseConnection()
+    write = WRITERS[file_format or file_format_of(path)]
+    result = ExportResult()
+    start = time.perf_counter()
+    partial_path = f"{path}.part"
+
+    with database.connect() as connection:
+        total: int = connection.execute(f"SELECT count(*) FROM ({sql})", params).fetchone()[0] if progress else 0
+        try:
+            with open(partial_path, "wb", buffering=BUFFER_SIZE) as file:
+                next_report = PROGRESS_ROWS
+                for written in write(file, fetch_rows(connection.execute(sql, params))):
+                    result.exported += written
+                    if progress is not None and result.exported >= next_report:
+                        progress(ExportProgress(result.exported, total))
+                        next_report = result.exported + PROGRESS_ROWS
+            os.replace(partial_path, path)
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+
+    result.size = os.path.getsize(path)
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export every student to a CSV, JSON Lines or columnar file.")
+    parser.add_argument("path", help="output file, the format follows the extension (.csv, .jsonl, .stcol)")
+    parser.add_argument("--format", choices=sorted(WRITERS), help="override the format picked from the extension")
+    args = parser.parse_args()
+
+    try:
+        outcome = export_students(args.path, file_format=args.format,
+                                  progress=lambda p: print(f"\r{p.exported}/{p.total} exported", end="",
+                                                           file=sys.stderr))
+    except (OSError, sqlite3.Error) as e:
+        print(f"\nexport failed: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"\n{outcome.exported} exported, {outcome.size} bytes in {outcome.seconds:.1f} s", file=sys.stderr)
+    sys.exit(0)
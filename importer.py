@@ -0,0 +1,264 @@
+"""
+Streaming bulk import of students from CSV or JSON Lines files.
+
+Rows are read one at a time, validated, and inserted in batches of BATCH_SIZE rows, each batch in its own
+transaction, so memory stays constant no matter how large the file is. Batches are written on a separate thread while
+the next one is parsed; sqlite releases the GIL while it works, so parsing and writing overlap. Rejected rows are
+counted, the first MAX_REPORTED_ERRORS are kept in the result and all of them can be written to a separate CSV file.
+
+When the file is expected to hold at least BULK_IMPORT_ROWS rows and more than the table already has, the search
+indexes are dropped after the first batch and built again once at the end, which is much cheaper than updating them for
+every row.
+
+Imported students are not checked one by one against the students already there, that would cost an indexed lookup
+per typo of every phone number. With a duplicates report, the blocking pass of duplicates.py runs once the rows are
+in and writes the groups of probable duplicates that hold an imported student, in the format of its merge report.
+
+Usage:
+    python importer.py students.csv [--rejects rejected.csv] [--duplicates duplicates.csv]
+"""
+import argparse
+import csv
+import json
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator, Optional, TextIO
+
+from database import DatabaseConnection
+from repository import StudentRepository
+from schema import create_indexes, drop_indexes, insert_students
+
+BATCH_SIZE: int = 50_000
+BULK_IMPORT_ROWS: int = 100_000
+MAX_REPORTED_ERRORS: int = 100
+MAX_NAME_LENGTH: int = 100
+PHONE_DIGITS: tuple[int, int] = (7, 15)
+
+_PHONE_SEPARATORS = re.compile(r"[\s()+.\-]")
+
+
+@dataclass
+class ImportProgress:
+    """
+    Progress of a running import, passed to the progress callback after every batch.
+    """
+    imported: int
+    rejected: int
+    fraction: float  # share of the file read so far, 0.0 to 1.0
+
+
+@dataclass
+class ImportResult:
+    """
+    Outcome of an import. errors holds (line number, reason) for the first MAX_REPORTED_ERRORS rejected rows and
+    duplicates the number of groups of probable duplicates with an imported student, when they were looked for.
+    """
+    imported: int = 0
+    rejected: int = 0
+    errors: list[tuple[int, str]] = field(default_factory=list)
+    duplicates: int = 0
+    seconds: float = 0.0
+
+
+class RowError(ValueError):
+    """
+    Raised by validate_row and parse_phone for a row or a value that cannot be imported.
+    """
+
+
+def course_keys(courses: Iterable[str]) -> dict[str, str]:
+    """
+    This function maps every spelling of the courses that validate_row accepts to the course.
+    """
+    courses = list(courses)
+    # Exact spellings, so the usual case is one lookup, and the case folded ones
+    return {**{course.casefold(): course for course in courses}, **{course: course for course in courses}}
+
+
+def offered_courses(database: DatabaseConnection) -> dict[str, str]:
+    """
+    This function returns the course_keys of the courses that are not retired, the ones students can be added to.
+    """
+    with database.connect() as connection:
+        return course_keys(name for name, in connection.execute("SELECT name FROM courses WHERE NOT retired"))
+
+
+def validate_row(raw: dict, courses: dict[str, str]) -> tuple[str, str, int]:
+    """
+    This function checks one input row and returns it as (name, course, mobile). courses holds the course_keys of the
+    courses to accept. The course is matched without regard to case and the phone number may contain spaces, dashes,
+    dots, brackets and a leading plus.
+    """
+    name = str(raw.get("name") or "").strip()
+    if not name:
+        raise RowError("name is empty")
+    if len(name) > MAX_NAME_LENGTH:
+        raise RowError(f"name is longer than {MAX_NAME_LENGTH} characters")
+
+    course_value = raw.get("course") or ""
+    course = courses.get(course_value) or courses.get(str(course_value).strip().casefold())
+    if course is None:
+        raise RowError(f"unknown course {course_value!r}")
+
+    return name, course, parse_phone(raw.get("mobile") or raw.get("phone") or "")
+
+
+def parse_phone(value) -> int:
+    """
+    This function reads a phone number that may contain spaces, dashes, dots, brackets and a leading plus. It raises
+    RowError if what is left is not a number of PHONE_DIGITS digits.
+    """
+    # Most numbers are plain digits already, the separators only need stripping for the rest
+    phone = value if type(value) is str and value.isdigit() else _PHONE_SEPARATORS.sub("", str(value))
+    if not phone.isdigit() or not PHONE_DIGITS[0] <= len(phone) <= PHONE_DIGITS[1]:
+        raise RowError(f"invalid phone number {value!r}")
+    return int(phone)
+
+
+def read_rows(file: TextIO, file_format: str) -> Iterator[tuple[int, dict]]:
+    """
+    This function yields (line number, row) for every row of a CSV file with a header line or of a JSON Lines file.
+    """
+    if file_format == "csv":
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            row = {"_error": f"invalid JSON: {e.msg}"}
+        yield line_number, row if isinstance(row, dict) else {"_error": "line is not a JSON object"}
+
+
+def file_format_of(path: str) -> str:
+    return "jsonl" if os.path.splitext(path)[1].lower() in (".jsonl", ".ndjson", ".json") else "csv"
+
+
+def import_students(path: str, database: Optional[DatabaseConnection] = None, batch_size: int = BATCH_SIZE,
+                    rejects_path: Optional[str] = None,
+                    progress: Optional[Callable[[ImportProgress], None]] = None,
+                    duplicates_path: Optional[str] = None) -> ImportResult:
+    """
+    This function imports every valid row of a CSV or JSON Lines file and returns how it went. A failing batch is
+    rolled back and stops the import with its error, the batches before it stay committed. progress is called from
+    the writer thread after every committed batch. With duplicates_path, the probable duplicates of the imported
+    students are written there once the import is over, see duplicates.report_duplicates.
+    """
+    database = database or DatabaseConnection()
+    result = ImportResult()
+    start = time.perf_counter()
+    size = os.path.getsize(path) or 1
+    courses: dict[str, str] = offered_courses(database)
+    with database.connect() as connection:
+        # Ids are never handed out twice, the imported students are the ones above it
+        since_id: int = connection.execute("SELECT coalesce(max(id), 0) FROM students").fetchone()[0]
+
+    # At most two batches wait for the writer, which keeps memory bounded when the disk is slower than the parser
+    batches: queue.Queue = queue.Queue(maxsize=2)
+    failure: list[BaseException] = []
+
+    def write() -> None:
+        indexes_dropped: bool = False
+        while (item := batches.get()) is not None:
+            if failure:
+                continue  # drain the queue so the reader never blocks
+            batch, rejected, fraction = item
+            try:
+                # Counting the table would read every row, the course counts give the same number at once
+                drop: bool = (result.imported == 0 and 0 < fraction < 1
+                              and len(batch) / fraction >= max(BULK_IMPORT_ROWS, StudentRepository(database).count()))
+                with database.connect() as connection:
+                    if drop:
+                        drop_indexes(connection)
+                        indexes_dropped = True
+                    result.imported += insert_students(connection, batch)
+            except BaseException as e:
+                failure.append(e)
+                continue
+            if progress is not None:
+                progress(ImportProgress(result.imported, rejected, fraction))
+
+        if indexes_dropped:
+            # Rebuilt even after a failure, the batches before it are committed and need their indexes
+            try:
+                with database.connect() as connection:
+                    create_indexes(connection)
+                    connection.execute("ANALYZE")
+            except BaseException as e:
+                failure.append(e)
+
+    writer = threading.Thread(target=write, name="student-import-writer")
+    writer.start()
+    try:
+        with open(path, newline="", encoding="utf-8-sig") as file, \
+                (open(rejects_path, "w", newline="", encoding="utf-8") if rejects_path
+                 else open(os.devnull, "w")) as rejects:
+            reject_writer = csv.writer(rejects)
+            reject_writer.writerow(("line", "reason"))
+            batch: list[tuple[str, str, int]] = []
+
+            for line_number, raw in read_rows(file, file_format_of(path)):
+                try:
+                    if "_error" in raw:
+                        raise RowError(raw["_error"])
+                    batch.append(validate_row(raw, courses))
+                except RowError as e:
+                    result.rejected += 1
+                    reject_writer.writerow((line_number, str(e)))
+                    if len(result.errors) < MAX_REPORTED_ERRORS:
+                        result.errors.append((line_number, str(e)))
+                    continue
+                if len(batch) >= batch_size:
+                    batches.put((batch, result.rejected, min(file.buffer.tell() / size, 1.0)))
+                    batch = []
+                    if failure:
+                        break
+            if batch and not failure:
+                batches.put((batch, result.rejected, 1.0))
+    finally:
+        batches.put(None)
+        writer.join()
+
+    if failure:
+        raise failure[0]
+    if duplicates_path is not None:
+        from duplicates import report_duplicates
+        result.duplicates = len(report_duplicates(duplicates_path, database, since_id=since_id).groups)
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import students from a CSV or JSON Lines file.")
+    parser.add_argument("path", help="file with name, course and mobile (or phone) columns")
+    parser.add_argument("--rejects", help="write every rejected line and the reason to this CSV file")
+    parser.add_argument("--duplicates", help="write the probable duplicates of the imported students to this CSV file")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    try:
+        outcome = import_students(args.path, batch_size=args.batch_size, rejects_path=args.rejects,
+                                  duplicates_path=args.duplicates,
+                                  progress=lambda p: print(f"\r{p.fraction:6.1%}  {p.imported} imported, "
+                                                           f"{p.rejected} rejected", end="", file=sys.stderr))
+    except (OSError, sqlite3.Error) as e:
+        print(f"\nimport failed: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"\n{outcome.imported} imported, {outcome.rejected} rejected in {outcome.seconds:.1f} s", file=sys.stderr)
+    for line_number, reason in outcome.errors:
+        print(f"line {line_number}: {reason}", file=sys.stderr)
+    if args.duplicates:
+        print(f"{outcome.duplicates} groups of probable duplicates written to {args.duplicates}", file=sys.stderr)
+    sys.exit(0)
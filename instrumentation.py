@@ -0,0 +1,240 @@
+"""
+Timing spans around database calls, model refreshes and dialogs, switched on with the STUDENTS_PROFILE environment
+variable.
+
+With profiling on, every span and every SQL statement run through a pooled connection is timed and its duration kept
+in a rolling window per operation, from which Help > Performance shows the 50th, 95th and 99th percentiles. If
+STUDENTS_PROFILE_LOG names a file, every measurement is also appended to it as a line of JSON, together with every
+statement sqlite reports to the trace callback, including the ones run by triggers.
+
+With profiling off, span returns one shared object that does nothing, timed leaves functions undecorated and
+connections are plain sqlite3 connections, so the cost is a function call per span and nothing per statement.
+
+Usage:
+    STUDENTS_PROFILE=1 STUDENTS_PROFILE_LOG=profile.jsonl python main.py
+"""
+import atexit
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from functools import wraps
+from typing import Callable, Optional, TextIO
+
+PROFILE_ENV: str = "STUDENTS_PROFILE"
+LOG_ENV: str = "STUDENTS_PROFILE_LOG"
+WINDOW: int = 1000  # durations kept per operation
+
+enabled: bool = os.environ.get(PROFILE_ENV, "") not in ("", "0")
+
+# "SELECT ... FROM students WHERE ..." is reported as "sql SELECT students", so statements that only differ in their
+# values or conditions are grouped under one operation
+_VERB = re.compile(r"\s*(\w+)\s*(\w*)")
+_TABLE = re.compile(r"\b(?:FROM|INTO)\s+(\w+)", re.IGNORECASE)
+
+
+class Recorder:
+    """
+    Collects the durations of named operations.
+
+    The last WINDOW durations of each operation are kept in memory for the percentiles, older ones are dropped, so the
+    numbers follow what the application is doing now. Any thread may record at the same time.
+
+    Attributes:
+    log_path (Optional[str]): The JSON lines file every measurement is appended to, None for none.
+
+    Methods:
+    record(self, operation: str, seconds: float, detail: Optional[str]) -> None: Adds one duration of an operation.
+    log(self, entry: dict) -> None: Appends an entry to the log file, if there is one.
+    percentiles(self) -> dict[str, dict[str, float]]: Returns count, p50, p95 and p99 in ms of every operation.
+    clear(self) -> None: Forgets every duration.
+    close(self) -> None: Flushes and closes the log file.
+    """
+
+    def __init__(self, window: int = WINDOW, log_path: Optional[str] = None) -> None:
+        self.log_path: Optional[str] = log_path
+        self._window: int = window
+        self._durations: dict[str, deque] = {}
+        self._counts: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._log: Optional[TextIO] = None
+
+    def record(self, operation: str, seconds: float, detail: Optional[str] = None) -> None:
+        with self._lock:
+            durations = self._durations.get(operation)
+            if durations is None:
+                durations = self._durations[operation] = deque(maxlen=self._window)
+                self._counts[operation] = 0
+            durations.append(seconds)
+            self._counts[operation] += 1
+        if self.log_path is not None:
+            entry = {"operation": operation, "ms": round(seconds * 1000, 3)}
+            if detail is not None:
+                entry["statement"] = detail
+            self.log(entry)
+
+    def log(self, entry: dict) -> None:
+        if self.log_path is None:
+            return
+        line = json.dumps({"time": round(time.time(), 6), "thread": threading.current_thread().name, **entry})
+        with self._lock:
+            if self._log is None:
+                self._log = open(self.log_path, "a", encoding="utf-8")
+            self._log.write(line + "\n")
+
+    def percentiles(self) -> dict[str, dict[str, float]]:
+        """
+        This function returns, for every operation, how often it ran and the 50th, 95th and 99th percentile of its
+        recent durations in milliseconds.
+        """
+        with self._lock:
+            windows = {operation: sorted(durations) for operation, durations in self._durations.items()}
+            counts = dict(self._counts)
+        report: dict[str, dict[str, float]] = {}
+        for operation, durations in windows.items():
+            last = len(durations) - 1
+            report[operation] = {
+                "count": counts[operation],
+                **{name: durations[round(last * share)] * 1000
+                   for name, share in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))},
+            }
+        return report
+
+    def clear(self) -> None:
+        with self._lock:
+            self._durations.clear()
+            self._counts.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+
+recorder = Recorder(log_path=os.environ.get(LOG_ENV) or None)
+atexit.register(recorder.close)
+
+
+class Span:
+    """
+    Times the with block it is used for and records the duration under its operation.
+    """
+    __slots__ = ("operation", "start")
+
+    def __init__(self, operation: str) -> None:
+        self.operation: str = operation
+        self.start: float = 0.0
+
+    def __enter__(self) -> "Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        recorder.record(self.operation, time.perf_counter() - self.start)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoSpan":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        return None
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(operation: str):
+    """
+    This function returns a context manager that times its block as operation, or one that does nothing when
+    profiling is off.
+    """
+    return Span(operation) if enabled else _NO_SPAN
+
+
+def timed(operation: str) -> Callable[[Callable], Callable]:
+    """
+    This function returns a decorator that times every call of a function as operation. With profiling off the
+    function is returned as it is.
+    """
+    def decorate(function: Callable) -> Callable:
+        if not enabled:
+            return function
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with Span(operation):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def operation_of(statement: str) -> str:
+    """
+    This function returns the operation a statement is recorded under, its verb and the table it reads or writes.
+    """
+    match = _VERB.match(statement)
+    if match is None:
+        return "sql"
+    verb, following = match.group(1).upper(), match.group(2)
+    if verb in ("UPDATE", "PRAGMA"):
+        return f"sql {verb} {following}"
+    if verb in ("SELECT", "INSERT", "REPLACE", "DELETE", "WITH"):
+        table = _TABLE.search(statement)
+        if table is not None:
+            return f"sql {verb} {table.group(1)}"
+    return f"sql {verb}"
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """
+    A sqlite3 connection that times every execute, executemany and executescript call.
+
+    Python's sqlite3 has no hook that reports how long a statement ran, so the time is taken around the call. For a
+    query that is the time to its first row, reading the rest with fetchone or fetchmany is timed by the spans
+    around the code that reads it.
+    """
+
+    def execute(self, sql: str, parameters=(), /) -> sqlite3.Cursor:
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            recorder.record(operation_of(sql), time.perf_counter() - start, sql)
+
+    def executemany(self, sql: str, parameters, /) -> sqlite3.Cursor:
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            recorder.record(operation_of(sql), time.perf_counter() - start, sql)
+
+    def executescript(self, sql_script: str, /) -> sqlite3.Cursor:
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            recorder.record("sql script", time.perf_counter() - start, sql_script)
+
+
+def connection_options() -> dict:
+    """
+    This function returns the extra sqlite3.connect arguments for a new connection, a profiled one when profiling is
+    on.
+    """
+    return {"factory": ProfiledConnection} if enabled else {}
+
+
+def trace(connection: sqlite3.Connection) -> None:
+    """
+    This function logs every statement the connection runs, including the ones run by triggers, when profiling is
+    on and there is a log file.
+    """
+    if enabled and recorder.log_path is not None:
+        connection.set_trace_callback(lambda statement: recorder.log({"trace": statement}))
@@ -1,75 +1,1244 @@
 from PyQt6.QtWidgets import (QMainWindow, QApplication, QVBoxLayout, QLabel, QWidget, QGridLayout,
-                             QLineEdit, QPushButton, QTableWidget, QTableWidgetItem, QDialog, QComboBox, QToolBar,
-                             QStatusBar, QMessageBox, QTextEdit)
-from PyQt6.QtGui import QAction, QIcon
+                             QLineEdit, QPushButton, QTableView, QDialog, QComboBox, QToolBar,
+                             QStatusBar, QMessageBox, QTextEdit, QProgressBar, QToolButton, QFileDialog,
+                             QTableWidget, QTableWidgetItem, QHeaderView, QListWidget, QListWidgetItem, QInputDialog)
+from PyQt6.QtGui import QAction, QIcon, QRegularExpressionValidator
+from PyQt6.QtCore import (Qt, QAbstractItemModel, QAbstractListModel, QAbstractTableModel, QEvent, QItemSelectionModel,
+                          QModelIndex, QObject, QRegularExpression, QRunnable, QThreadPool, QTimer, pyqtSignal)
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import partial
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+import os
 import sys
 import sqlite3
-from typing import Optional
+import time
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Optional
+
+from backup import BackupProgress, BackupSettings, backup_settings, list_backups
+from change_feed import ChangeFeed, StudentChange
+from database import DatabaseConnection
+import instrumentation
+from instrumentation import span
+from repository import Course, Student, StudentRepository
+from schema import TableQuery, name_search_query, search_query
+from search_cache import SearchCache, SearchKey, search_key
+from snapshot import Snapshot, read_snapshot, snapshot_path, write_snapshot
+from student_cache import StudentCache, StudentView
+from writer import StudentWriter
+
+# Import and export pull in csv, json, zlib and dataclasses, they are only loaded once the user picks them
+if TYPE_CHECKING:
+    from exporter import ExportProgress
+    from importer import ImportProgress, ImportResult
+
+# The startup probe measures from here, once the modules above are imported. STARTED_AT lets a launching process add
+# the time spent before it.
+STARTED: float = time.perf_counter()
+STARTED_AT: float = time.time()
+ICONS_DIRECTORY: str = os.path.dirname(os.path.abspath(__file__))
+
+
+class QueryWorkerSignals(QObject):
+    """
+    Signals of a QueryWorker. They are emitted from the worker thread and delivered on the GUI thread.
+    """
+    chunk = pyqtSignal(list)
+    finished = pyqtSignal()
+    failed = pyqtSignal(str)
 
 
-class DatabaseConnection:
+class QueryWorker(QRunnable):
     """
-    Connects to the database file.
+    Runs one read query on a QThreadPool thread and streams the rows back in chunks.
+
+    The query can be cancelled at any time. A sqlite progress handler checks the cancelled flag every PROGRESS_STEPS
+    virtual machine instructions, so even a long scan that has not produced a row yet is interrupted promptly.
 
     Attributes:
-    database_file (str): The path to the database file.
+    CHUNK_SIZE (int): The default number of rows emitted per chunk signal.
+    PROGRESS_STEPS (int): The number of sqlite instructions between two cancellation checks.
+    signals (QueryWorkerSignals): The chunk, finished and failed signals of the worker.
+    cancelled (bool): Whether cancel was called.
+    row_count (int): The number of rows emitted so far.
 
     Methods:
-    connect (self) -> Optional[sqlite3.Connection]: Connects to the database file.
+    cancel(self) -> None: Asks the worker to stop as soon as possible.
+    run(self) -> None: Executes the query, called by the thread pool.
+    """
+
+    CHUNK_SIZE: int = 500
+    PROGRESS_STEPS: int = 1000
+
+    def __init__(self, database: DatabaseConnection, sql: str, params: tuple = (), chunk_size: int = CHUNK_SIZE) -> None:
+        super().__init__()
+        self.signals = QueryWorkerSignals()
+        self.database: DatabaseConnection = database
+        self.sql: str = sql
+        self.params: tuple = tuple(params)
+        self.chunk_size: int = chunk_size
+        self.cancelled: bool = False
+        self.row_count: int = 0
+
+    def cancel(self) -> None:
+        """
+        This function asks the worker to stop. Chunks that were already emitted are dropped by the QueryExecutor.
+        """
+        self.cancelled = True
+
+    def run(self) -> None:
+        try:
+            with span("query.run"), self.database.connect() as connection:
+                connection.set_progress_handler(lambda: int(self.cancelled), self.PROGRESS_STEPS)
+                try:
+                    cursor = connection.execute(self.sql, self.params)
+                    while not self.cancelled:
+                        rows = cursor.fetchmany(self.chunk_size)
+                        if not rows:
+                            break
+                        self.row_count += len(rows)
+                        self.signals.chunk.emit(rows)
+                    cursor.close()
+                finally:
+                    connection.set_progress_handler(None, 0)
+        except sqlite3.Error as e:
+            # An interrupted query raises OperationalError, that is the expected way out of a cancelled scan
+            if not self.cancelled:
+                self.signals.failed.emit(str(e))
+        self.signals.finished.emit()
+
 
-    Returns:
-        Optional[sqlite3.Connection]: The connection to the database, or None if the connection could not be established.
+class TaskWorkerSignals(QObject):
     """
+    Signals of a TaskWorker. They are emitted from the worker thread and delivered on the GUI thread.
+    """
+    result = pyqtSignal(object)
+    progress = pyqtSignal(object)
+    finished = pyqtSignal()
+    failed = pyqtSignal(str)
 
-    def __init__(self, database_file='/Users/dennisrotnov/Documents/Coding/Classes/Books/py_tricks/py_tricks/code/sql-gui/database.db') -> None:
-        self.database_file: str = database_file
 
-    def connect(self) -> Optional[sqlite3.Connection]:
-        connection = sqlite3.connect(self.database_file)
-        return connection
+class TaskWorker(QRunnable):
+    """
+    Runs any function on a QThreadPool thread and hands its return value back through the result signal.
 
+    Attributes:
+    signals (TaskWorkerSignals): The result, progress, finished and failed signals of the worker.
+    cancelled (bool): Whether cancel was called, the result of a cancelled task is dropped.
 
-class MainWindow(QMainWindow):
+    Methods:
+    cancel(self) -> None: Drops the result of the task. The function itself runs to its end.
+    run(self) -> None: Calls the function, called by the thread pool.
+    """
+
+    def __init__(self, function: Callable, *args, **kwargs) -> None:
+        super().__init__()
+        self.signals = TaskWorkerSignals()
+        self.function: Callable = function
+        self.args: tuple = args
+        self.kwargs: dict = kwargs
+        self.cancelled: bool = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+    def run(self) -> None:
+        try:
+            result = self.function(*self.args, **self.kwargs)
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.result.emit(result)
+        self.signals.finished.emit()
+
+
+class WriterSignals(QObject):
     """
-    The MainWindow class is the main window of the student management system. It contains the menu bar, table widget, status bar, and other elements.
+    Signals of the StudentWriter of the window. They are emitted from the writer thread and delivered on the GUI thread.
+    """
+    batch_done = pyqtSignal(int)
+
+
+class QueryExecutor(QObject):
+    """
+    Runs read queries and other database tasks off the GUI thread and reports when any of them is in flight.
 
-    The init method sets the window title, size, and creates a vertical layout for the elements. It also creates a menu bar with three menus, File and Help and Edit. The File menu contains an Add Student action, which opens the AddDialog when triggered. The Help menu contains an About action. The Edit menu contains an Edit Student action, which opens the EditDialog when triggered.
+    Callbacks passed to run are invoked on the GUI thread. Chunks that arrive after a query was cancelled are dropped,
+    so a cancelled query never touches the view again.
+
+    Attributes:
+    MAX_THREADS (int): The number of queries that may run at the same time.
+    busy (pyqtSignal): Emitted with True when the first query starts and with False when the last one ends.
+
+    Methods:
+    run(self, sql, params, ...) -> QueryWorker: Starts a query in the background and returns its worker.
+    submit(self, function, *args, ...) -> TaskWorker: Calls a function in the background and returns its worker.
+    cancel_all(self) -> None: Cancels every query in flight.
+    shutdown(self) -> None: Cancels every query and waits for the threads to finish.
+    """
+
+    MAX_THREADS: int = 2
+    busy = pyqtSignal(bool)
+
+    def __init__(self, database: Optional[DatabaseConnection] = None, parent=None) -> None:
+        super().__init__(parent)
+        self.database: DatabaseConnection = database or DatabaseConnection()
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(self.MAX_THREADS)
+        self._active: set = set()
+
+    def run(self, sql: str, params: tuple = (), on_chunk: Optional[Callable[[list], None]] = None,
+            on_finished: Optional[Callable[[QueryWorker], None]] = None,
+            on_failed: Optional[Callable[[str], None]] = None,
+            chunk_size: int = QueryWorker.CHUNK_SIZE) -> QueryWorker:
+        """
+        This function starts a query in the background. on_chunk receives lists of rows as they are read, on_finished
+        receives the worker once the query ended (also when it failed or was cancelled) and on_failed the error message.
+        """
+        worker = QueryWorker(self.database, sql, params, chunk_size)
+        if on_chunk is not None:
+            worker.signals.chunk.connect(lambda rows: None if worker.cancelled else on_chunk(rows))
+        if on_failed is not None:
+            worker.signals.failed.connect(on_failed)
+        worker.signals.finished.connect(lambda: self._finished(worker, on_finished))
+        self._start(worker)
+        return worker
+
+    def submit(self, function: Callable, *args, on_result: Optional[Callable[[Any], None]] = None,
+               on_failed: Optional[Callable[[str], None]] = None,
+               on_progress: Optional[Callable[[Any], None]] = None, quiet: bool = False) -> TaskWorker:
+        """
+        This function calls function(*args) in the background. on_result receives its return value and on_failed the
+        message of the exception it raised, both on the GUI thread. With on_progress, the function is also passed a
+        progress keyword argument to call with progress reports, which may be called from any thread and are
+        delivered to on_progress on the GUI thread. A quiet task does not count as busy, for housekeeping the user did
+        not ask for and cannot stop.
+        """
+        worker = TaskWorker(function, *args)
+        if on_progress is not None:
+            worker.kwargs["progress"] = worker.signals.progress.emit
+            worker.signals.progress.connect(lambda report: None if worker.cancelled else on_progress(report))
+        if on_result is not None:
+            worker.signals.result.connect(lambda result: None if worker.cancelled else on_result(result))
+        if on_failed is not None:
+            worker.signals.failed.connect(on_failed)
+        worker.signals.finished.connect(lambda: self._finished(worker, None))
+        if quiet:
+            self.thread_pool.start(worker)
+        else:
+            self._start(worker)
+        return worker
 
-    Two buttons are created: Add Student, Search Record. The Add Student button is used to add a new student record, the Search Record button is used to search for a student record.
+    def cancel_all(self) -> None:
+        for worker in self._active:
+            worker.cancel()
 
-    A table widget is created to display the student records. The table contains four columns, ID, Name, Course, and Phone. The row headers are hidden to avoid extra indices.
+    def shutdown(self) -> None:
+        self.cancel_all()
+        self.thread_pool.waitForDone()
 
-    The load_data method is used to load the data from the database into the table widget.
+    def _start(self, worker) -> None:
+        self._active.add(worker)
+        if len(self._active) == 1:
+            self.busy.emit(True)
+        self.thread_pool.start(worker)
 
-    The cell_clicked function is triggered when a cell in the table is clicked. It adds two buttons to the status bar, "Edit Record" and "Delete Record", which allow the user to edit or delete the corresponding record in the table.
+    def _finished(self, worker, on_finished: Optional[Callable[[QueryWorker], None]]) -> None:
+        self._active.discard(worker)
+        if on_finished is not None:
+            on_finished(worker)
+        if not self._active:
+            self.busy.emit(False)
 
-    The edit_record function is triggered when the edit button in the status bar is clicked. It opens the EditDialog, which allows the user to edit the selected record in the table.
 
-    The delete_record function is triggered when the delete button in the status bar is clicked. It opens the DeleteDialog, which allows the user to delete the selected record in the table.
+class _AbstractModelType(type(QAbstractTableModel), ABCMeta):
+    """
+    The metaclass of Qt models with abstract methods. The Qt classes have a metaclass of their own, which conflicts with
+    ABCMeta unless a metaclass derives from both.
+    """
 
-    The insert method is used to insert a new student record into the database.
 
-    The search method is used to search for a student record in the database.
+class StudentModel(QAbstractTableModel, metaclass=_AbstractModelType):
+    """
+    Common base of the models shown in the main table. Subclasses provide rowCount and record, the columns, headers
+    and display text are shared. A missing value is shown as an empty cell.
 
     Attributes:
-    table (QTableWidget): The table widget that displays the student records.
+    HEADERS (tuple): The column headers of the table.
+    MAX_REMOVED_RUNS (int): Above this many separate runs of removed rows the model is reset instead.
+
+    Methods:
+    record(self, row: int) -> tuple: Returns the database row shown at the given table row.
+    ids(self, first: int, last: int) -> list[int]: Returns the ids shown at the table rows first to last.
+    runs(positions: list[int]) -> list[tuple[int, int]]: Groups ascending positions into runs of neighbours.
+    """
+
+    HEADERS: tuple = ("ID", "Name", "Course", "Phone")
+    # Every removed run costs a signal that the view handles on its own, a reset is cheaper for a scattered selection
+    MAX_REMOVED_RUNS: int = 256
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        value = self.record(index.row())[index.column()]
+        return "" if value is None else str(value)
+
+    @abstractmethod
+    def record(self, row: int) -> tuple:
+        """
+        This function returns the database row (id, name, course, mobile) shown at the given table row.
+        """
+
+    def ids(self, first: int, last: int) -> list[int]:
+        return [self.record(row)[0] for row in range(first, last + 1)]
+
+    @staticmethod
+    def runs(positions: list[int]) -> list[tuple[int, int]]:
+        """
+        This function groups ascending positions into (first, last) runs of consecutive positions.
+        """
+        runs: list[tuple[int, int]] = []
+        for position in positions:
+            if runs and runs[-1][1] == position - 1:
+                runs[-1] = (runs[-1][0], position)
+            else:
+                runs.append((position, position))
+        return runs
+
+
+class PageOffsets:
+    """
+    The first table row of every page of a StudentTableModel. The row counts of the pages are kept in a Fenwick tree,
+    so a row inserted into or removed from a page costs O(log pages) instead of shifting the offset of every later
+    page, and the page of a table row is found in O(log pages) as well.
+
+    Methods:
+    reset(self, counts: Iterable[int]) -> None: Starts over with pages of the given row counts.
+    append(self, count: int) -> None: Adds a page after the last one.
+    add(self, page: int, delta: int) -> None: Grows or shrinks a page by delta rows.
+    start(self, page: int) -> int: Returns the first table row of a page.
+    find(self, row: int) -> int: Returns the page a table row is in.
+    """
+
+    def __init__(self) -> None:
+        self._tree: list[int] = [0]  # 1-based, node i holds the counts of pages i - lowbit(i) to i - 1
+
+    def __len__(self) -> int:
+        return len(self._tree) - 1
+
+    def reset(self, counts: Iterable[int] = ()) -> None:
+        tree: list[int] = [0, *counts]
+        for node in range(1, len(tree)):
+            parent = node + (node & -node)
+            if parent < len(tree):
+                tree[parent] += tree[node]
+        self._tree = tree
+
+    def append(self, count: int) -> None:
+        node: int = len(self._tree)
+        # The new node also covers the pages of the nodes that end right before it
+        lower: int = node - (node & -node)
+        child: int = node - 1
+        while child > lower:
+            count += self._tree[child]
+            child -= child & -child
+        self._tree.append(count)
+
+    def add(self, page: int, delta: int) -> None:
+        node: int = page + 1
+        while node < len(self._tree):
+            self._tree[node] += delta
+            node += node & -node
+
+    def start(self, page: int) -> int:
+        total: int = 0
+        while page > 0:
+            total += self._tree[page]
+            page -= page & -page
+        return total
+
+    def find(self, row: int) -> int:
+        """
+        This function returns the last page that starts at or before row, like bisect_right over the page starts
+        minus one, so an empty page never hides the page after it.
+        """
+        page: int = 0
+        step: int = 1 << (len(self).bit_length() - 1) if len(self) else 0
+        while step:
+            node = page + step
+            if node <= len(self) and self._tree[node] <= row:
+                page = node
+                row -= self._tree[node]
+            step >>= 1
+        return min(page, len(self) - 1)
+
+
+class StudentTableModel(StudentModel):
+    """
+    Table model that reads the students table lazily, one keyset page at a time, in the order and with the column
+    filters of its TableQuery.
+
+    Rows are fetched with "WHERE <after the last row read> ORDER BY <sort key> LIMIT n" through canFetchMore/fetchMore
+    as the view scrolls, so the first paint only costs a single page no matter how large the table is, and sqlite seeks
+    to every later page through the index that serves the order instead of counting rows off as OFFSET would. For every
+    page only its last row and row count are kept, the rows themselves live in a small LRU cache and are re-read from
+    the last row of the page before when evicted, so memory follows the visible window instead of the table size.
+
+    Sorting by a column or changing a filter reads the first page of the new order. With a StudentCache that holds
+    the whole roster, pages are sliced from its sorted view of the order instead, see student_cache.py, and the
+    database is only read until that view is sorted.
+
+    When an executor is given, new pages are read on a worker thread and appended when they arrive. Re-reading an
+    evicted page stays on the GUI thread since it is a single index range of at most PAGE_SIZE rows.
+
+    Attributes:
+    PAGE_SIZE (int): The number of rows read by a single fetch.
+    MAX_CACHED_PAGES (int): The number of pages kept in memory at once.
+    page_fetched (pyqtSignal): Emitted with the number of rows read when a fetch is over, also when it read none.
+    table_query (TableQuery): The order and the column filters of the rows.
+    cache (Optional[StudentCache]): The in-memory copy of the students pages are read from once it is loaded.
+
+    Methods:
+    reload(self) -> None: Drops everything that was read and fetches the first page again.
+    load_cache(self) -> None: Loads the student cache in the background if the roster fits in it.
+    show_rows(self, rows: list[tuple], complete: bool) -> None: Shows rows read elsewhere as the first pages.
+    sort(self, column: int, order) -> None: Orders the rows by a column and reads them again.
+    set_filters(self, course, name_prefix: str, mobile_prefix: str) -> None: Limits the rows and reads them again.
+    query(self) -> tuple[str, tuple]: Returns the SQL that reads the same rows in the same order.
+    record(self, row: int) -> tuple: Returns the database row shown at the given table row.
+    canFetchMore(self, parent) -> bool: Tells the view whether there are rows left in the database.
+    fetchMore(self, parent) -> None: Reads the next page of rows after the last loaded row.
+    ids(self, first: int, last: int) -> list[int]: Returns the ids shown at the table rows first to last.
+    insert_record(self, record: tuple) -> None: Adds a newly inserted row without reloading the table.
+    update_record(self, record: tuple) -> None: Replaces an edited row in place, or moves it if its sort key changed.
+    remove_record(self, student_id: int) -> None: Removes a deleted row in place.
+    remove_records(self, student_ids) -> None: Removes many deleted rows at once.
+    set_field(self, student_ids, column: int, value) -> None: Sets one column of many edited rows in place.
+    apply_changes(self, changes) -> None: Patches the rows another connection inserted, updated or deleted.
+    """
+
+    PAGE_SIZE: int = 256
+    MAX_CACHED_PAGES: int = 32
+    page_fetched = pyqtSignal(int)
+
+    def __init__(self, parent=None, database: Optional[DatabaseConnection] = None,
+                 executor: Optional[QueryExecutor] = None, cache: Optional[StudentCache] = None) -> None:
+        super().__init__(parent)
+        self.database: DatabaseConnection = database or DatabaseConnection()
+        self.executor: Optional[QueryExecutor] = executor
+        self.table_query: TableQuery = TableQuery()
+        self.cache: Optional[StudentCache] = cache
+        self._cache_job: Optional[TaskWorker] = None  # a load or a view being sorted, the cache is not used meanwhile
+        self._fetching: Optional[QueryWorker] = None
+        self._bounds: list[tuple] = []  # last row of each page
+        self._starts: PageOffsets = PageOffsets()  # first table row of each page
+        self._counts: list[int] = []  # number of rows in each page
+        self._cache: OrderedDict[int, list[tuple]] = OrderedDict()
+        self._row_count: int = 0
+        self._exhausted: bool = False
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else self._row_count
+
+    def record(self, row: int) -> tuple:
+        """
+        This function returns the database row (id, name, course, mobile) shown at the given table row.
+        """
+        page = self._starts.find(row)
+        return self._page(page)[row - self._starts.start(page)]
+
+    def reload(self) -> None:
+        """
+        This function drops everything that was read and fetches the first page again.
+        """
+        if self._fetching is not None:
+            self._fetching.cancel()
+            self._fetching = None
+
+        with span("model.reload"):
+            self.beginResetModel()
+            self._bounds.clear()
+            self._starts.reset()
+            self._counts.clear()
+            self._cache.clear()
+            self._row_count = 0
+            self._exhausted = False
+            self.endResetModel()
+            self.fetchMore(QModelIndex())
+
+    def show_rows(self, rows: list[tuple], complete: bool) -> None:
+        """
+        This function drops everything that was read and shows rows read elsewhere, a snapshot for example, as the
+        first pages instead of reading them. They have to be the first rows of the current order. complete tells
+        whether they are all the rows there are, otherwise the rows after them are read as the view scrolls.
+        """
+        if self._fetching is not None:
+            self._fetching.cancel()
+            self._fetching = None
+
+        with span("model.show_rows"):
+            self.beginResetModel()
+            self._bounds.clear()
+            self._starts.reset()
+            self._counts.clear()
+            self._cache.clear()
+            self._row_count = 0
+            self.endResetModel()
+            for start in range(0, len(rows), self.PAGE_SIZE):
+                self._add_page(rows[start:start + self.PAGE_SIZE])
+            self._exhausted = complete
+        self.page_fetched.emit(len(rows))
+
+    def sort(self, column: int, order: Qt.SortOrder = Qt.SortOrder.AscendingOrder) -> None:
+        """
+        This function orders the rows by a column, ties by id, and reads them again from the first page.
+        """
+        descending: bool = order == Qt.SortOrder.DescendingOrder
+        if (column, descending) == (self.table_query.column, self.table_query.descending):
+            return
+        self.table_query = self.table_query._replace(column=column, descending=descending)
+        self.reload()
+
+    def set_filters(self, course: Optional[str] = None, name_prefix: str = "", mobile_prefix: str = "") -> None:
+        """
+        This function limits the rows to a course, a name prefix and a phone prefix, and reads them again from the
+        first page. None and empty prefixes do not filter.
+        """
+        table_query = self.table_query._replace(course=course, name_prefix=name_prefix, mobile_prefix=mobile_prefix)
+        if table_query == self.table_query:
+            return
+        self.table_query = table_query
+        self.reload()
+
+    def query(self) -> tuple[str, tuple]:
+        """
+        This function returns the query that reads the rows of this view, in the same order, without paging. Used for
+        exports, which should not hold the rows in memory.
+        """
+        return self.table_query.query()
+
+    def canFetchMore(self, parent: QModelIndex = QModelIndex()) -> bool:
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent: QModelIndex = QModelIndex()) -> None:
+        if not self.canFetchMore(parent) or self._fetching is not None:
+            return
+
+        last: Optional[tuple] = self._bounds[-1] if self._bounds else None
+        if self.executor is None or self._cached_view() is not None:
+            rows: list[tuple] = self._query(last, self.PAGE_SIZE)
+            self._add_page(rows)
+            self.page_fetched.emit(len(rows))
+            return
+
+        sql, params = self.table_query.select(last, self.PAGE_SIZE)
+        self._fetching = self.executor.run(sql, params, on_chunk=self._add_page, on_finished=self._fetch_finished,
+                                           chunk_size=self.PAGE_SIZE)
+
+    def _fetch_finished(self, worker: QueryWorker) -> None:
+        if worker is not self._fetching:
+            return
+        self._fetching = None
+        if worker.row_count == 0 and not worker.cancelled:
+            self._exhausted = True
+        self.page_fetched.emit(worker.row_count)
+
+    def _add_page(self, rows: list[tuple]) -> None:
+        """
+        This function appends a freshly fetched page to the end of the table.
+        """
+        if len(rows) < self.PAGE_SIZE:
+            self._exhausted = True
+        if not rows:
+            return
+
+        page = len(self._bounds)
+        with span("model.add_page"):
+            self.beginInsertRows(QModelIndex(), self._row_count, self._row_count + len(rows) - 1)
+            self._bounds.append(rows[-1])
+            self._starts.append(len(rows))
+            self._counts.append(len(rows))
+            self._row_count += len(rows)
+            self._remember(page, rows)
+            self.endInsertRows()
+
+    def insert_record(self, record: tuple) -> None:
+        """
+        This function adds a newly inserted row at its place in the order. A row that sorts after every loaded row
+        simply arrives with a later page while there are rows left to fetch, otherwise it is appended to the last
+        page. In a page that is not cached it is counted at the end of the page and shows up at its place once the
+        page is read again.
+        """
+        if not self.table_query.accepts(record):
+            return
+
+        key = self.table_query.key
+        page = bisect_left(self._bounds, key(record), key=key)
+        if page == len(self._bounds):
+            if not self._exhausted:
+                return
+            if not self._counts or self._counts[-1] >= self.PAGE_SIZE:
+                self._bounds.append(record)
+                self._starts.append(0)
+                self._counts.append(0)
+            page = len(self._counts) - 1
+            self._bounds[page] = record
+
+        rows = self._cache.get(page)
+        position = bisect_left(rows, key(record), key=key) if rows is not None else self._counts[page]
+        row = self._starts.start(page) + position
+        self.beginInsertRows(QModelIndex(), row, row)
+        if rows is not None:
+            rows.insert(position, record)
+        self._counts[page] += 1
+        self._starts.add(page, 1)
+        self._row_count += 1
+        self.endInsertRows()
+
+    def update_record(self, record: tuple) -> None:
+        """
+        This function replaces an edited row in place, or moves it when the edit changed its place in the order or
+        took it out of the filters. Pages that are not cached are read fresh when they are shown again.
+        """
+        page, position = self._find(record[0])
+        if position is None:
+            return
+
+        rows = self._cache[page]
+        key = self.table_query.key
+        if self.table_query.accepts(record) and key(rows[position]) == key(record):
+            rows[position] = record
+            row = self._starts.start(page) + position
+            self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+            return
+        self._remove_runs([(page, rows, [(position, position)])])
+        self.insert_record(record)
+
+    def remove_record(self, student_id: int) -> None:
+        """
+        This function removes a deleted row in place, the page offsets follow in O(log pages).
+        """
+        self.remove_records([student_id])
+
+    def ids(self, first: int, last: int) -> list[int]:
+        """
+        This function returns the ids shown at the table rows first to last. Pages that are no longer cached are read
+        back together, so a selection over thousands of pages costs a few range queries.
+        """
+        first_page = self._starts.find(first)
+        last_page = self._starts.find(last)
+        # In id order the id is the whole sort key, which is all that is needed to split the pages
+        columns: str = "id" if self.table_query.column == 0 else "id, name, course, mobile"
+        pages = self._pages(range(first_page, last_page + 1), columns)
+        ids: list[int] = []
+        for page in range(first_page, last_page + 1):
+            start = self._starts.start(page)
+            ids.extend(row[0] for row in pages[page][max(first - start, 0):last - start + 1])
+        return ids
+
+    def remove_records(self, student_ids: Iterable[int]) -> None:
+        """
+        This function removes many deleted rows at once, one signal per run of neighbouring rows, so deleting a
+        selected range does not notify the view row by row. Rows of cached pages are removed where they are. Pages
+        that are no longer cached are read again and shrink by the rows they lost, those are not shown so where the
+        rows sat does not matter. In id order the page of an id is known, in any other order the deleted rows are gone
+        with their sort key, so every page that is not cached is read again.
+        """
+        gone: set[int] = set(student_ids)
+        removals: list[tuple[int, list[tuple], list[tuple[int, int]]]] = []
+        missing: set[int] = set(gone)
+        for page, rows in self._cache.items():
+            positions = [position for position, row in enumerate(rows) if row[0] in gone]
+            if positions:
+                removals.append((page, rows, self.runs(positions)))
+                missing.difference_update(rows[position][0] for position in positions)
+
+        evicted: list[int] = []
+        if missing and self.table_query.column == 0:
+            # The sort key is the id, or minus the id when descending, so only the id of the bounds is compared
+            sign: int = -1 if self.table_query.descending else 1
+            bound_id: Callable[[tuple], int] = lambda row: sign * row[0]
+            evicted = sorted({page for page in (bisect_left(self._bounds, sign * student_id, key=bound_id)
+                                                for student_id in missing)
+                              if page < len(self._bounds) and page not in self._cache})
+        elif missing:
+            evicted = [page for page in range(len(self._bounds)) if page not in self._cache]
+        for page, rows in self._pages(evicted).items():
+            lost = self._counts[page] - len(rows)
+            if lost < 0:
+                # Someone else added rows to the range too, the row offsets cannot be trusted
+                self.reload()
+                return
+            if lost:
+                # Stand-ins for the lost rows at the end of the page, removed right away
+                rows = list(rows) + [rows[-1] if rows else self._bounds[page]] * lost
+                removals.append((page, rows, [(len(rows) - lost, len(rows) - 1)]))
+
+        self._remove_runs(sorted(removals, key=itemgetter(0)))
+
+    def set_field(self, student_ids: Iterable[int], column: int, value: Any) -> None:
+        """
+        This function sets one column of many edited rows in place. Only cached pages hold rows to change, the others
+        are read fresh when they are shown again. If the rows are sorted or filtered by that column the edited rows
+        may have to move, so everything is read again instead.
+        """
+        if self.table_query.uses(column):
+            self.reload()
+            return
+
+        changed: set[int] = set(student_ids)
+        for page, rows in self._cache.items():
+            positions = [position for position, row in enumerate(rows) if row[0] in changed]
+            if not positions:
+                continue
+            for position in positions:
+                rows[position] = rows[position][:column] + (value,) + rows[position][column + 1:]
+            start = self._starts.start(page)
+            self.dataChanged.emit(self.index(start + positions[0], column), self.index(start + positions[-1], column))
+
+    def apply_changes(self, changes: Iterable[StudentChange]) -> None:
+        """
+        This function patches the rows that another connection changed, as reported by a ChangeFeed. Inserted and
+        deleted rows are added and removed like local ones, inserted ones first: pages that are not cached are read
+        back from the database, which already holds every change, so their row counts have to include the new rows
+        before a deleted or updated row is looked for in them. An updated row is replaced where it is cached. When it
+        is not cached, its page is only known in id order, where a filtered table reads that page again to tell
+        whether the row left or entered the filters, see _patch_uncached. In any other order it may have moved from or
+        to any page, so everything is read again, as it is when more cached rows changed than patching them one by
+        one is worth.
+        """
+        changes = list(changes)
+        for change in changes:
+            if change.inserted and change.row is not None:
+                self.insert_record(change.row)
+        deleted: list[int] = [change.student_id for change in changes if change.row is None and not change.inserted]
+        if deleted:
+            self.remove_records(deleted)
+
+        changes = [change for change in changes if change.row is not None and not change.inserted]
+        cached: set[int] = {row[0] for rows in self._cache.values() for row in rows}
+        updated: list[tuple] = [change.row for change in changes if change.student_id in cached]
+        if len(updated) > self.MAX_REMOVED_RUNS:
+            self.reload()
+            return
+        for record in updated:
+            self.update_record(record)
+        for change in changes:
+            if change.student_id in cached:
+                continue
+            if self.table_query.column != 0:
+                self.reload()
+                return
+            elif self.table_query.filtered():
+                self._patch_uncached(change.row)
+
+    def _patch_uncached(self, record: tuple) -> None:
+        """
+        This function patches an updated row that is not cached, in id order with filters on, where the page of an id
+        is known from the page bounds. The page is read again with room for one more row: if it gained a row, the
+        edit moved the row into the filters and it is inserted at its place, if it lost one the edit took it out and
+        it is removed, otherwise the fresh rows simply replace the page. Without filters nothing needs doing, the
+        page is read fresh when it is shown again.
+        """
+        sign: int = -1 if self.table_query.descending else 1
+        bound_id: Callable[[tuple], int] = lambda row: sign * row[0]
+        page: int = bisect_left(self._bounds, sign * record[0], key=bound_id)
+        if page == len(self._bounds):
+            # After every loaded row, it arrives with a later page or is appended like a new row
+            self.insert_record(record)
+            return
+
+        lower: Optional[tuple] = self._bounds[page - 1] if page > 0 else None
+        rows: list[tuple] = self._query(lower, self._counts[page] + 1)
+        rows = rows[:bisect_right(rows, sign * self._bounds[page][0], key=bound_id)]
+        gained: int = len(rows) - self._counts[page]
+        position: Optional[int] = next((position for position, row in enumerate(rows) if row[0] == record[0]), None)
+        if gained == -1:
+            self.remove_records([record[0]])
+        elif gained == 1 and position is not None:
+            row = self._starts.start(page) + position
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._remember(page, rows)
+            self._counts[page] += 1
+            self._starts.add(page, 1)
+            self._row_count += 1
+            self.endInsertRows()
+        elif gained == 0:
+            self._remember(page, rows)
+            if rows:
+                start = self._starts.start(page)
+                self.dataChanged.emit(self.index(start, 0), self.index(start + len(rows) - 1, self.columnCount() - 1))
+        else:
+            # Other rows of the page changed too, the row offsets cannot be trusted
+            self.reload()
+
+    def _remove_runs(self, removals: list[tuple[int, list[tuple], list[tuple[int, int]]]]) -> None:
+        """
+        This function removes runs of (first, last) positions from the given rows of ascending pages and tells the
+        view, or resets it if the runs are too many.
+        """
+        reset: bool = sum(len(runs) for _, _, runs in removals) > self.MAX_REMOVED_RUNS
+        if reset:
+            self.beginResetModel()
+        # Last page first, so a removal never moves the rows of a page that is still to come
+        for page, rows, runs in reversed(removals):
+            self._remember(page, rows)
+            for first, last in reversed(runs):
+                count = last - first + 1
+                if not reset:
+                    row = self._starts.start(page) + first
+                    self.beginRemoveRows(QModelIndex(), row, row + count - 1)
+                del rows[first:last + 1]
+                self._counts[page] -= count
+                self._row_count -= count
+                if not reset:
+                    self._starts.add(page, -count)
+                    self.endRemoveRows()
+        if reset:
+            self._starts.reset(self._counts)
+            self.endResetModel()
+
+    def _find(self, student_id: int) -> tuple[int, Optional[int]]:
+        """
+        This function finds a row among the cached pages and returns its page and position inside it. The position is
+        None if the row is not cached.
+        """
+        for page, rows in self._cache.items():
+            for position, row in enumerate(rows):
+                if row[0] == student_id:
+                    return page, position
+        return -1, None
+
+    def _page(self, page: int) -> list[tuple]:
+        """
+        This function returns the rows of a page, reading them back from the last row of the page before if they were
+        evicted from the cache.
+        """
+        rows = self._cache.get(page)
+        if rows is not None:
+            self._cache.move_to_end(page)
+            return rows
+
+        rows = self._pages([page])[page]
+        self._remember(page, rows)
+        return rows
+
+    def _pages(self, pages: Iterable[int], columns: str = "id, name, course, mobile") -> dict[int, list[tuple]]:
+        """
+        This function returns the rows of the given ascending pages without touching the cache order. Neighbouring
+        pages that are not cached are read with one keyset query and split at their last rows. Only the given columns
+        are read for them, they have to hold the sort key.
+        """
+        found: dict[int, list[tuple]] = {}
+        evicted: list[list[int]] = []  # runs of neighbouring pages that are not cached
+        for page in pages:
+            rows = self._cache.get(page)
+            if rows is not None:
+                found[page] = rows
+            elif evicted and evicted[-1][-1] == page - 1:
+                evicted[-1].append(page)
+            else:
+                evicted.append([page])
+
+        key = self.table_query.key
+        for run in evicted:
+            lower: Optional[tuple] = self._bounds[run[0] - 1] if run[0] > 0 else None
+            # No more rows than the pages held can belong to them, rows past the last one are cut off below
+            rows = self._query(lower, sum(self._counts[page] for page in run), columns)
+            start = 0
+            for page in run:
+                end = bisect_right(rows, key(self._bounds[page]), lo=start, key=key)
+                found[page] = rows[start:end]
+                start = end
+        return found
+
+    def _remember(self, page: int, rows: list[tuple]) -> None:
+        self._cache[page] = rows
+        self._cache.move_to_end(page)
+        while len(self._cache) > self.MAX_CACHED_PAGES:
+            self._cache.popitem(last=False)
+
+    def load_cache(self) -> None:
+        """
+        This function loads the student cache in the background, unless there is none, it is loaded or busy already.
+        The cache only loads rosters that fit in it, see StudentCache.load.
+        """
+        cache = self.cache
+        if cache is None or cache.loaded or self._cache_job is not None:
+            return
+        if self.executor is None:
+            cache.load()
+            return
+        self._cache_job = self.executor.submit(cache.load, quiet=True)
+        self._cache_job.signals.finished.connect(self._cache_loaded)
+
+    def _cached_view(self) -> Optional[StudentView]:
+        """
+        This function returns the rows of the student cache in the order and with the filters of the table, up to date
+        with the database, or None if the database has to be read. A view that is not sorted yet is sorted from a
+        copy of the rows in the background, and used once it is done if no student changed in the meantime.
+        """
+        cache = self.cache
+        if cache is None or self._cache_job is not None or not cache.refresh():
+            return None
+        view: Optional[StudentView] = cache.view(self.table_query)
+        if view is None:
+            build = partial(StudentView.build, self.table_query, list(cache.rows.values()))
+            if self.executor is None:
+                return cache.add_view(build())
+            on_result = partial(cache.add_view, generation=cache.generation)
+            self._cache_job = self.executor.submit(build, on_result=on_result, quiet=True)
+            self._cache_job.signals.finished.connect(self._cache_job_done)
+        return view
+
+    def _cache_job_done(self) -> None:
+        self._cache_job = None
+
+    def _cache_loaded(self) -> None:
+        # The view of the current order is sorted right away rather than when the next page is read
+        self._cache_job = None
+        self._cached_view()
+
+    def _query(self, after: Optional[tuple], limit: int, columns: str = "id, name, course, mobile") -> list[tuple]:
+        """
+        This function reads at most limit rows that follow the row after in the order of the table, from the student
+        cache when it has them. Rows of the cache hold every column, whatever columns asks for.
+        """
+        view: Optional[StudentView] = self._cached_view()
+        if view is not None:
+            return view.after(after, limit)
+        sql, params = self.table_query.select(after, limit, columns)
+        with self.database.connect() as connection:
+            return connection.execute(sql, params).fetchall()
+
+
+class StudentListModel(StudentModel):
+    """
+    Table model over a list of rows that were read up front, used for search and filter results.
+
+    Methods:
+    set_rows(self, rows: list[tuple]) -> None: Replaces all rows.
+    append_rows(self, rows: list[tuple]) -> None: Adds rows at the end, used as results stream in.
+    record(self, row: int) -> tuple: Returns the database row shown at the given table row.
+    insert_record(self, record: tuple) -> None: Does nothing, a new row is not known to match the results.
+    update_record(self, record: tuple) -> None: Replaces an edited row in place.
+    remove_record(self, student_id: int) -> None: Removes a deleted row in place.
+    remove_records(self, student_ids) -> None: Removes many deleted rows at once.
+    set_field(self, student_ids, column: int, value) -> None: Sets one column of many edited rows in place.
+    apply_changes(self, changes) -> None: Patches the rows another connection updated or deleted.
+    """
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self._rows: list[tuple] = []
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def record(self, row: int) -> tuple:
+        return self._rows[row]
+
+    def set_rows(self, rows: list[tuple]) -> None:
+        self.beginResetModel()
+        self._rows = list(rows)
+        self.endResetModel()
+
+    def append_rows(self, rows: list[tuple]) -> None:
+        if not rows:
+            return
+        with span("model.results.append"):
+            self.beginInsertRows(QModelIndex(), len(self._rows), len(self._rows) + len(rows) - 1)
+            self._rows.extend(rows)
+            self.endInsertRows()
+
+    def insert_record(self, record: tuple) -> None:
+        pass
+
+    def update_record(self, record: tuple) -> None:
+        row = self._position(record[0])
+        if row is not None:
+            self._rows[row] = record
+            self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+
+    def remove_record(self, student_id: int) -> None:
+        row = self._position(student_id)
+        if row is not None:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._rows[row]
+            self.endRemoveRows()
+
+    def remove_records(self, student_ids: Iterable[int]) -> None:
+        """
+        This function removes many deleted rows at once, one signal per run of neighbouring rows.
+        """
+        gone: set[int] = set(student_ids)
+        runs = self.runs([row for row, record in enumerate(self._rows) if record[0] in gone])
+        if len(runs) > self.MAX_REMOVED_RUNS:
+            self.beginResetModel()
+            self._rows = [record for record in self._rows if record[0] not in gone]
+            self.endResetModel()
+            return
+        for first, last in reversed(runs):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self._rows[first:last + 1]
+            self.endRemoveRows()
+
+    def set_field(self, student_ids: Iterable[int], column: int, value: Any) -> None:
+        changed: set[int] = set(student_ids)
+        rows = [row for row, record in enumerate(self._rows) if record[0] in changed]
+        if not rows:
+            return
+        for row in rows:
+            self._rows[row] = self._rows[row][:column] + (value,) + self._rows[row][column + 1:]
+        self.dataChanged.emit(self.index(rows[0], column), self.index(rows[-1], column))
+
+    def apply_changes(self, changes: Iterable[StudentChange]) -> None:
+        """
+        This function patches the rows that another connection changed. Deleted rows are removed and updated rows
+        replaced in place, new rows are left out like in insert_record.
+        """
+        changes = list(changes)
+        self.remove_records(change.student_id for change in changes if change.row is None)
+        positions: dict[int, int] = {record[0]: row for row, record in enumerate(self._rows)}
+        for change in changes:
+            row = positions.get(change.student_id)
+            if change.row is not None and row is not None:
+                self._rows[row] = change.row
+                self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+
+    def _position(self, student_id: int) -> Optional[int]:
+        for row, record in enumerate(self._rows):
+            if record[0] == student_id:
+                return row
+        return None
+
+
+class CourseModel(QAbstractListModel):
+    """
+    List model of the courses, read once and shared by the course drop-downs of the window and of every dialog, so
+    none of them keeps a list of its own or reads the courses when it opens.
+
+    Retired courses are listed but disabled: they cannot be picked for a student, while a student who is in one still
+    shows it. The model is only reset when the courses really changed, since a reset moves every drop-down on it back
+    to its first entry.
+
+    Attributes:
+    courses (list[Course]): The courses, retired ones included, ordered by name.
+
+    Methods:
+    reload(self) -> None: Reads the courses again and resets the model if they changed.
+    names(self) -> list[str]: Returns the names of the courses that are offered, not retired.
+    first_offered(self) -> int: Returns the row of the first course that is offered, -1 if there is none.
+    """
+
+    def __init__(self, parent=None, repository: Optional[StudentRepository] = None,
+                 courses: Optional[list[Course]] = None) -> None:
+        super().__init__(parent)
+        self.repository: StudentRepository = repository or StudentRepository()
+        # Courses known already, from a snapshot, spare the query until the next reload
+        self.courses: list[Course] = courses if courses is not None else self.repository.courses()
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.courses)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.courses[index.row()].name
+        if role == Qt.ItemDataRole.ToolTipRole and self.courses[index.row()].retired:
+            return "Retired, no longer offered for new students"
+        return None
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlag:
+        if self.courses[index.row()].retired:
+            return Qt.ItemFlag.NoItemFlags
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+
+    def reload(self) -> None:
+        courses: list[Course] = self.repository.courses()
+        if courses != self.courses:
+            self.beginResetModel()
+            self.courses = courses
+            self.endResetModel()
+
+    def names(self) -> list[str]:
+        return [course.name for course in self.courses if not course.retired]
+
+    def first_offered(self) -> int:
+        return next((row for row, course in enumerate(self.courses) if not course.retired), -1)
+
+
+class CourseFilterModel(QAbstractListModel):
+    """
+    The courses of a CourseModel behind an "All courses" entry, for the drop-downs that filter or search by course.
+    Retired courses can be picked here, their students are still there to be found.
+    """
+
+    ALL_COURSES: str = "All courses"
+
+    def __init__(self, source: CourseModel, parent=None) -> None:
+        super().__init__(parent)
+        self.source: CourseModel = source
+        source.modelAboutToBeReset.connect(self.beginResetModel)
+        source.modelReset.connect(self.endResetModel)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.source.courses) + 1
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if index.row() == 0:
+            return self.ALL_COURSES if role == Qt.ItemDataRole.DisplayRole else None
+        return self.source.data(self.source.index(index.row() - 1), role)
+
+
+class StartupProbe(QObject):
+    """
+    Measures how long the main window takes to start, in seconds from STARTED.
+
+    Three stages are marked: window when the table is painted for the first time, first_row when the first page of
+    students has arrived, and interactive when the event loop is idle again after both, which is when the window
+    reacts to input without delay. Started with python main.py --startup-probe, the marks are printed as one line of
+    JSON and the application quits, see benchmarks/bench_startup.py.
+
+    Attributes:
+    marks (dict[str, float]): The seconds from STARTED to each stage reached so far.
+    finished (pyqtSignal): Emitted with the marks once the window is interactive.
+
+    Methods:
+    report(self) -> str: Returns the marks as a line of JSON, together with the wall clock time of STARTED.
+    """
+
+    STAGES: tuple[str, ...] = ("window", "first_row", "interactive")
+    finished = pyqtSignal(dict)
+
+    def __init__(self, window: "MainWindow") -> None:
+        super().__init__(window)
+        self.marks: dict[str, float] = {}
+        self._viewport = window.table.viewport()
+        self._viewport.installEventFilter(self)
+        window.student_model.page_fetched.connect(self._page_fetched)
+
+    def eventFilter(self, watched: QObject, event: QEvent) -> bool:
+        if event.type() == QEvent.Type.Paint and "window" not in self.marks:
+            self._mark("window")
+        return False
+
+    def report(self) -> str:
+        import json
+        return json.dumps({"started_at": STARTED_AT, **{stage: self.marks.get(stage) for stage in self.STAGES}})
+
+    def _page_fetched(self) -> None:
+        if "first_row" not in self.marks:
+            self._mark("first_row")
+
+    def _mark(self, stage: str) -> None:
+        self.marks[stage] = time.perf_counter() - STARTED
+        if "window" in self.marks and "first_row" in self.marks and stage != "interactive":
+            self._viewport.removeEventFilter(self)
+            # Runs once every event queued so far, including the repaint with the first rows, has been handled
+            QTimer.singleShot(0, lambda: self._mark("interactive"))
+        elif stage == "interactive":
+            self.finished.emit(dict(self.marks))
+
+
+class MainWindow(QMainWindow):
+    """
+    The MainWindow class is the main window of the student management system. It contains the menu bar, table view, status bar, and other elements.
+
+    The table shows a StudentTableModel, which reads keyset pages as it is scrolled, or a StudentListModel with the rows of a filter or search. Reads run in the background on a QueryExecutor, the dialogs queue their writes on a StudentWriter, and a ChangeFeed patches in what other instances commit. The methods below say what each part does, the modules they use say how.
+
+    Attributes:
+    table (QTableView): The table view that displays the student records.
+    student_model (StudentTableModel): The model that lazily reads the student records for the table.
+    student_cache (StudentCache): The students in memory, which the table is sorted and filtered from once loaded.
+    cache_timer (QTimer): Loads the student cache CACHE_DELAY_MS after the table was read.
+    search_model (StudentListModel): The model that holds the rows of the current filter or search.
+    filter_input (QLineEdit): The filter bar in the toolbar, matches student names as the user types.
+    course_filter (QComboBox): The course column filter in the toolbar.
+    course_model (CourseModel): The courses, shared by every course drop-down of the window and its dialogs.
+    course_filter_model (CourseFilterModel): The courses behind an "All courses" entry, for the filter and search.
+    name_prefix_filter (QLineEdit): The name column filter in the toolbar, matches the start of the name.
+    mobile_prefix_filter (QLineEdit): The phone column filter in the toolbar, matches the start of the number.
     statusbar (QStatusBar): The status bar that displays the buttons for editing and deleting records.
+    edit_record_action (QAction): Opens the EditDialog for the current student, in the status bar and the Edit menu.
+    delete_record_action (QAction): Opens the DeleteDialog for the selected students.
+    set_course_action (QAction): Opens the CourseDialog for the selected students.
+    executor (QueryExecutor): Runs the read queries of the window in the background.
+    busy_indicator (QProgressBar): Shown in the status bar while a query is running.
+    stop_button (QToolButton): Cancels the running queries.
+    import_action (QAction): The File menu action that imports students, disabled while an import runs.
+    export_action (QAction): The File menu action that exports the shown students, disabled while an export runs.
+    duplicates_action (QAction): The File menu action that writes the duplicates report, disabled while it runs.
+    backup_action (QAction): The File menu action that backs the database up, disabled while a backup or restore runs.
+    restore_action (QAction): The File menu action that restores a backup, disabled while a backup or restore runs.
+    backup_settings (BackupSettings): Where backups go, how many are kept and how often one is made.
+    backup_timer (QTimer): Backs the database up every backup_settings.interval_hours, unless that is 0.
     toolbar (QToolBar): The toolbar that displays the buttons for adding and searching records.
+    students_changed (pyqtSignal): Emitted after a dialog, an import or another instance changed students.
+    change_feed (ChangeFeed): Tells which students other connections changed since the last look.
+    change_timer (QTimer): Polls the change feed every CHANGE_POLL_MS.
+    writer (StudentWriter): Applies the writes of the dialogs in batches on a background thread.
+    snapshot_timer (QTimer): Writes the snapshot again SNAPSHOT_DELAY_MS after students last changed.
     student_id (int): The ID of the selected student record.
     student_name (str): The name of the selected student record.
     student_course (str): The course of the selected student record.
     student_phone (int): The phone number of the selected student record.
 
     Methods:
-    cell_clicked(self) -> None: This function is triggered when a cell in the table is clicked. It adds two buttons to the status bar, "Edit Record" and "Delete Record", which allow the user to edit or delete the corresponding record in the table.
+    update_record_actions(self) -> None: This function is triggered when the selection of the table changes. It enables the "Edit Record", "Delete Record" and "Set Course" actions while there is a student to apply them to.
     edit_record(self) -> None: This function is triggered when the edit button in the status bar is clicked. It opens the EditDialog, which allows the user to edit the selected record in the table.
-    delete_record(self) -> None: This function is triggered when the delete button in the status bar is clicked. It opens the DeleteDialog, which allows the user to delete the selected record in the table.
-    load_data(self) -> None: This function loads the data from the database into the table widget.
+    patch_edited(self, record) -> list[int]: This function shows the row of a committed edit in the table.
+    delete_record(self) -> None: This function is triggered when the delete button in the status bar is clicked. It opens the DeleteDialog, which allows the user to delete the selected records in the table.
+    set_course(self) -> None: This function is triggered when the set course button in the status bar is clicked. It opens the CourseDialog, which moves the selected students to another course.
+    selected_ids(self) -> list[int]: This function returns the ids of the selected rows.
+    load_data(self) -> None: This function loads the first page of data from the database into the table.
+    show_busy(self, busy: bool) -> None: This function shows or hides the busy indicator in the status bar.
+    reconcile(self) -> None: This function brings the rows shown from the snapshot up to date with the database.
+    save_snapshot(self) -> None: This function writes the snapshot of the first rows again in the background.
     insert(self) -> None: This function is used to insert a new student record into the database.
+    patch_inserted(self, students) -> list[int]: This function adds the rows of committed inserts to the table.
+    patch_deleted(self, student_ids) -> list[int]: This function removes the rows of a committed delete from the table.
+    patch_course(self, student_ids, course) -> list[int]: This function shows the new course of a committed course change.
     search(self) -> None: This function is used to search for a student record in the database.
+    apply_filter(self) -> None: This function shows the students whose name matches the filter bar.
+    show_search(self, key: SearchKey) -> None: This function shows the results of a search, from the search cache if it can.
+    show_results(self, sql: str, params: tuple, cache_key) -> None: This function shows the rows of a query in the table.
+    search_failed(self, message: str) -> None: This function tells in the status bar that a search or filter query failed.
+    show_all(self) -> None: This function goes back to showing every student.
+    sort_students(self, column: int, order) -> None: This function shows every student sorted by a column.
+    filter_columns(self) -> None: This function shows only the students that pass the column filters in the toolbar.
+    import_file(self) -> None: This function asks for a CSV or JSON Lines file and imports it in the background.
+    show_import_progress(self, progress: ImportProgress) -> None: This function shows how far the import is.
+    import_finished(self, result, rejects_path, duplicates_path) -> None: This function reports the outcome of an import.
+    current_query(self) -> tuple[str, tuple]: This function returns the query for the rows shown in the table.
+    export_file(self) -> None: This function asks for a file name and exports the shown rows in the background.
+    find_duplicates(self) -> None: This function asks for a file name and writes the duplicates report in the background.
+    back_up(self) -> None: This function backs the database up in the background.
+    restore_backup(self) -> None: This function asks for a backup and restores it in the background.
+    pull_changes(self, ignore) -> None: This function patches the table with the students other instances changed.
+    when_written(self, future, on_written, on_failed) -> None: This function patches the table once a queued write is committed.
+    manage_courses(self) -> None: This function opens the course administration.
+    show_statistics(self) -> None: This function opens the enrollment statistics.
+    show_performance(self) -> None: This function opens the performance panel.
     about(self) -> None: This function is triggered when the about button is clicked. It opens the about dialog box.
     """
 
+    FILTER_DELAY_MS: int = 150
+    CHANGE_POLL_MS: int = 1000
+    BACKUP_STARTUP_DELAY_MS: int = 60000
+    SNAPSHOT_DELAY_MS: int = 5000
+    CACHE_DELAY_MS: int = 2000
+    students_changed = pyqtSignal()
+
     def __init__(self) -> None:
         super().__init__()
         self.setWindowTitle("Student Management System")
@@ -81,11 +1250,40 @@ class MainWindow(QMainWindow):
         edit_menu_item = self.menuBar().addMenu("&Edit")
 
         # Add subitems for File menu, Self connects QAction to the MainWindow class
-        add_student_action = QAction(QIcon(
-            '/Users/dennisrotnov/Documents/Coding/Classes/Books/py_tricks/py_tricks/code/sql-gui/icons/add.png'), 'Add Student', self)
+        # A QIcon made from a path only reads the file when the icon is first drawn
+        add_student_action = QAction(QIcon(os.path.join(ICONS_DIRECTORY, 'add.png')), 'Add Student', self)
         file_menu_item.addAction(add_student_action)
         add_student_action.triggered.connect(self.insert)
 
+        self.import_action = QAction('Import Students...', self)
+        file_menu_item.addAction(self.import_action)
+        self.import_action.triggered.connect(self.import_file)
+
+        self.export_action = QAction('Export...', self)
+        file_menu_item.addAction(self.export_action)
+        self.export_action.triggered.connect(self.export_file)
+
+        self.duplicates_action = QAction('Find Duplicates...', self)
+        file_menu_item.addAction(self.duplicates_action)
+        self.duplicates_action.triggered.connect(self.find_duplicates)
+
+        self.backup_action = QAction('Back Up Now', self)
+        file_menu_item.addAction(self.backup_action)
+        self.backup_action.triggered.connect(self.back_up)
+
+        self.restore_action = QAction('Restore Backup...', self)
+        file_menu_item.addAction(self.restore_action)
+        self.restore_action.triggered.connect(self.restore_backup)
+
+        courses_action = QAction('Courses...', self)
+        file_menu_item.addAction(courses_action)
+        courses_action.triggered.connect(self.manage_courses)
+
+        statistics_action = QAction('Statistics', self)
+        file_menu_item.addAction(statistics_action)
+        statistics_action.triggered.connect(self.show_statistics)
+        self._statistics_dialog: Optional[StatisticsDialog] = None
+
         # Add subitems for Help menu, Self connects QAction to the MainWindow class
         about_action = QAction('About', self)
         help_menu_item.addAction(about_action)
@@ -94,21 +1292,105 @@ class MainWindow(QMainWindow):
         # Quick fix for Mac if there is no Help menu showed
         about_action.setMenuRole(QAction.MenuRole.NoRole)
 
+        performance_action = QAction('Performance', self)
+        help_menu_item.addAction(performance_action)
+        performance_action.triggered.connect(self.show_performance)
+        performance_action.setMenuRole(QAction.MenuRole.NoRole)
+        self._performance_dialog: Optional[PerformanceDialog] = None
+
         # Add subitems for Edit menu, Self connects QAction to the MainWindow class
-        search_record_action = QAction(QIcon(
-            '/Users/dennisrotnov/Documents/Coding/Classes/Books/py_tricks/py_tricks/code/sql-gui/icons/search.png'), 'Search Record', self)
+        search_record_action = QAction(QIcon(os.path.join(ICONS_DIRECTORY, 'search.png')), 'Search Record', self)
         edit_menu_item.addAction(search_record_action)
         search_record_action.triggered.connect(self.search)
 
-        # CREATE TABLE
-        self.table = QTableWidget()
-        self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels(("ID", "Name", "Course", "Phone"))
+        # Record actions, built once and shown in the status bar too, enabled while a student is selected
+        self.edit_record_action = QAction('Edit Record', self)
+        edit_menu_item.addAction(self.edit_record_action)
+        self.edit_record_action.triggered.connect(self.edit_record)
+
+        self.delete_record_action = QAction('Delete Record', self)
+        edit_menu_item.addAction(self.delete_record_action)
+        self.delete_record_action.triggered.connect(self.delete_record)
+
+        self.set_course_action = QAction('Set Course...', self)
+        edit_menu_item.addAction(self.set_course_action)
+        self.set_course_action.triggered.connect(self.set_course)
+
+        # Dialogs are built on first use and reset every time they are opened again
+        self._insert_dialog: Optional[InsertDialog] = None
+        self._search_dialog: Optional[SearchDialog] = None
+        self._edit_dialog: Optional[EditDialog] = None
+        self._delete_dialog: Optional[DeleteDialog] = None
+        self._course_dialog: Optional[CourseDialog] = None
+
+        # SNAPSHOT of the first rows and the courses, shown before the database is asked anything, see snapshot.py
+        self._snapshot: Optional[Snapshot] = read_snapshot(snapshot_path())
+        # Written again once students stop changing for SNAPSHOT_DELAY_MS
+        self.snapshot_timer = QTimer(self)
+        self.snapshot_timer.setSingleShot(True)
+        self.snapshot_timer.setInterval(self.SNAPSHOT_DELAY_MS)
+        self.snapshot_timer.timeout.connect(self.save_snapshot)
+        self.students_changed.connect(self.snapshot_timer.start)
+
+        # COURSES, read once and shared by every course drop-down
+        self.course_model = CourseModel(self, courses=self._snapshot.courses() if self._snapshot is not None else None)
+        self.course_filter_model = CourseFilterModel(self.course_model, self)
+        self._course_filter_text: str = ""
+        self.course_model.modelAboutToBeReset.connect(self._remember_course_filter)
+        self.course_model.modelReset.connect(self._restore_course_filter)
+
+        # CREATE TABLE, rows are read page by page on a worker thread as the view scrolls
+        self.executor = QueryExecutor(parent=self)
+        # Sorting and filtering are served from memory for rosters that fit, loaded once the first page is shown
+        self.student_cache = StudentCache()
+        self.student_model = StudentTableModel(self, executor=self.executor, cache=self.student_cache)
+        self.cache_timer = QTimer(self)
+        self.cache_timer.setSingleShot(True)
+        self.cache_timer.setInterval(self.CACHE_DELAY_MS)
+        self.cache_timer.timeout.connect(self.student_model.load_cache)
+        # A cache that dropped its rows after too many changes loads them again once students stop changing
+        self.students_changed.connect(self.cache_timer.start)
+        # Filter and search results are shown through a second model, the table switches between the two
+        self.search_model = StudentListModel(self)
+        self._search_worker: Optional[QueryWorker] = None
+        self._results_query: tuple[str, tuple] = ("", ())
+        # Repeated searches of the search dialog are shown from here, see show_search
+        self.search_cache = SearchCache()
+        # Changes committed by other instances are patched into both models, see pull_changes
+        self.change_feed = ChangeFeed()
+        self.change_timer = QTimer(self)
+        self.change_timer.setInterval(self.CHANGE_POLL_MS)
+        self.change_timer.timeout.connect(self._poll_changes)
+        self.change_timer.start()
+        # Dialogs queue their writes on the writer, the rows are patched once the batch is committed
+        self._writer_signals = WriterSignals(self)
+        self._writer_signals.batch_done.connect(self._writes_done)
+        self.writer = StudentWriter(on_batch_done=self._writer_signals.batch_done.emit)
+        self._pending_writes: list[tuple[Future, Optional[Callable[[Any], Iterable[int]]],
+                                         Optional[Callable[[str], None]]]] = []
+        # Scheduled backups, the first one shortly after startup if the newest backup is older than the interval
+        self.backup_settings: BackupSettings = backup_settings()
+        self.backup_timer = QTimer(self)
+        self.backup_timer.timeout.connect(self.back_up)
+        if self.backup_settings.interval_hours > 0:
+            self.backup_timer.start(int(self.backup_settings.interval_hours * 3600 * 1000))
+            QTimer.singleShot(self.BACKUP_STARTUP_DELAY_MS, self._back_up_if_due)
+        self.table = QTableView()
+        self._set_table_model(self.student_model)
+        self.table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+        # Shift and Ctrl select many rows, which are then deleted or moved to a course in one transaction
+        self.table.setSelectionMode(QTableView.SelectionMode.ExtendedSelection)
         self.table.verticalHeader().setVisible(False)  # to avoid extra(duplicate) index
 
+        # Clicking a header orders the student model by that column, in the database
+        header = self.table.horizontalHeader()
+        header.setSectionsClickable(True)
+        header.setSortIndicatorShown(True)
+        header.setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+        header.sortIndicatorChanged.connect(self.sort_students)
+
         # SPECIFY CENTRAL WIDGET FOR QMAINWINDOW
         self.setCentralWidget(self.table)
-        self.load_data()
 
         # CREATE TOOLBAR
         toolbar = QToolBar()
@@ -119,86 +1401,631 @@ class MainWindow(QMainWindow):
         toolbar.addAction(add_student_action)
         toolbar.addAction(search_record_action)
 
+        # Live name filter, the query runs once typing pauses for FILTER_DELAY_MS
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText("Filter by name")
+        self.filter_input.setClearButtonEnabled(True)
+        self.filter_input.setMaximumWidth(250)
+        toolbar.addWidget(self.filter_input)
+
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(self.FILTER_DELAY_MS)
+        self.filter_timer.timeout.connect(self.apply_filter)
+        self.filter_input.textChanged.connect(lambda: self.filter_timer.start())
+
+        # Column filters, they become conditions of the student model query once typing pauses
+        self.name_prefix_filter = QLineEdit()
+        self.name_prefix_filter.setPlaceholderText("Name starts with")
+        self.name_prefix_filter.setClearButtonEnabled(True)
+        self.name_prefix_filter.setMaximumWidth(150)
+        toolbar.addWidget(self.name_prefix_filter)
+
+        self.course_filter = QComboBox()
+        self.course_filter.setModel(self.course_filter_model)
+        toolbar.addWidget(self.course_filter)
+
+        self.mobile_prefix_filter = QLineEdit()
+        self.mobile_prefix_filter.setPlaceholderText("Phone starts with")
+        self.mobile_prefix_filter.setClearButtonEnabled(True)
+        self.mobile_prefix_filter.setMaximumWidth(150)
+        self.mobile_prefix_filter.setValidator(QRegularExpressionValidator(QRegularExpression(r"\d*"), self))
+        toolbar.addWidget(self.mobile_prefix_filter)
+
+        self.column_filter_timer = QTimer(self)
+        self.column_filter_timer.setSingleShot(True)
+        self.column_filter_timer.setInterval(self.FILTER_DELAY_MS)
+        self.column_filter_timer.timeout.connect(self.filter_columns)
+        self.name_prefix_filter.textChanged.connect(lambda: self.column_filter_timer.start())
+        self.mobile_prefix_filter.textChanged.connect(lambda: self.column_filter_timer.start())
+        self.course_filter.currentIndexChanged.connect(self.filter_columns)
+
         # CREATE STATUS BAR WITH ELEMENTS
         self.statusbar = QStatusBar()
         self.setStatusBar(self.statusbar)
         # statusbar.showMessage(
         #     dt.datetime.today().strftime("%A, %B %d, %Y %I:%M %p"))
 
-        # DETECT TABLE CLICK
-        self.table.clicked.connect(
-            self.cell_clicked)
-
-    def cell_clicked(self) -> None:
+        # Busy indicator and Stop button, shown while a query runs in the background
+        self.busy_indicator = QProgressBar()
+        self.busy_indicator.setRange(0, 0)  # no range makes it an endless busy bar
+        self.busy_indicator.setMaximumWidth(120)
+        self.stop_button = QToolButton()
+        self.stop_button.setText("Stop")
+        self.stop_button.clicked.connect(self.executor.cancel_all)
+        self.statusbar.addPermanentWidget(self.busy_indicator)
+        self.statusbar.addPermanentWidget(self.stop_button)
+        self.show_busy(False)
+        self.executor.busy.connect(self.show_busy)
+
+        # Record buttons, they follow the selection instead of being added on the first click
+        for action in (self.edit_record_action, self.delete_record_action, self.set_course_action):
+            button = QToolButton()
+            button.setDefaultAction(action)
+            self.statusbar.addWidget(button)
+        # Rows can disappear under the selection without it emitting a change, when a model is reset or patched
+        for model in (self.student_model, self.search_model):
+            model.modelReset.connect(self.update_record_actions)
+            model.rowsRemoved.connect(self.update_record_actions)
+        self.update_record_actions()
+
+        # The first page is read by load_data once the event loop runs, so the window is shown before any query
+
+    def update_record_actions(self) -> None:
         """
-        This function is triggered when a cell in the table is clicked. It adds
-        two buttons to the status bar, "Edit Record" and "Delete Record", which
-        allow the user to edit or delete the corresponding record in the table.
+        This function is triggered when the selection or the current row of the table changes. It enables the "Edit Record", "Delete Record" and "Set Course" actions while there is a student to apply them to, and disables them otherwise.
         """
-        edit_button = QPushButton("Edit Record")
-        edit_button.clicked.connect(self.edit_record)
-        delete_button = QPushButton("Delete Record")
-        delete_button.clicked.connect(self.delete_record)
+        selection = self.table.selectionModel()
+        current: bool = self.table.currentIndex().isValid()
+        self.edit_record_action.setEnabled(current)
+        self.delete_record_action.setEnabled(current or selection.hasSelection())
+        self.set_course_action.setEnabled(current or selection.hasSelection())
 
-        children = self.findChildren(QPushButton)
-
-        # if children:
-        #     for child in children:
-        #         self.statusBar.removeWidget(child)
-
-        # Used to avoid duplicated buttons in the status bar
-        if not children:
-            self.statusbar.addWidget(edit_button)
-            self.statusbar.addWidget(delete_button)
+    def _set_table_model(self, model: QAbstractItemModel) -> None:
+        """
+        This function shows model in the table. The table makes a new selection model for it, which the record actions follow from then on, and the one it replaces is deleted, since Qt leaves that to the caller.
+        """
+        previous: Optional[QItemSelectionModel] = self.table.selectionModel()
+        self.table.setModel(model)
+        selection = self.table.selectionModel()
+        selection.selectionChanged.connect(self.update_record_actions)
+        selection.currentChanged.connect(self.update_record_actions)
+        if previous is not None:
+            previous.deleteLater()
+        self.update_record_actions()
 
     def edit_record(self) -> None:
         """
         This function is triggered when the edit button in the status bar is clicked. It opens the EditDialog, which allows the user to edit the selected record in the table.
         """
-        dialog: EditDialog = EditDialog()
+        if not self.table.currentIndex().isValid():
+            return
+        with span("dialog.edit.open"):
+            if self._edit_dialog is None:
+                self._edit_dialog = EditDialog()
+            else:
+                self._edit_dialog.reset()
+            dialog: EditDialog = self._edit_dialog
         dialog.exec()
-        self.load_data() if dialog.success else None
+
+    def patch_edited(self, record: tuple) -> list[int]:
+        """
+        This function shows the row of a committed edit in the table and returns its id.
+        """
+        with span("dialog.edit.apply"):
+            self.student_model.update_record(record)
+            self.search_model.update_record(record)
+        return [record[0]]
 
     def delete_record(self) -> None:
         """
         This function is triggered when the delete button in the status bar is clicked. It opens the DeleteDialog, which allows the user to delete the selected record in the table.
         """
-        dialog: DeleteDialog = DeleteDialog()
+        if not self.table.selectionModel().hasSelection() and not self.table.currentIndex().isValid():
+            return
+        with span("dialog.delete.open"):
+            if self._delete_dialog is None:
+                self._delete_dialog = DeleteDialog()
+            else:
+                self._delete_dialog.reset()
+            dialog: DeleteDialog = self._delete_dialog
         dialog.exec()
-        self.load_data() if dialog.success else None
 
-    def load_data(self) -> None:
+    def patch_deleted(self, student_ids: list[int]) -> list[int]:
         """
-        This function loads the data from the database into the table widget.
+        This function removes the rows of a committed delete from the table and returns their ids.
         """
-        connection = connection = DatabaseConnection().connect().cursor()
-        result = connection.execute("SELECT * FROM students")
-        self.table.setRowCount(0)  # to avoid duplicated data
+        with span("dialog.delete.apply"):
+            self.student_model.remove_records(student_ids)
+            self.search_model.remove_records(student_ids)
+        return student_ids
 
-        for row_idx, row_data in enumerate(result.fetchall()):
-            self.table.insertRow(row_idx)
-            for col_idx, col_data in enumerate(row_data):
-                self.table.setItem(
-                    row_idx, col_idx, QTableWidgetItem(str(col_data)))
+    def set_course(self) -> None:
+        """
+        This function is triggered when the set course button in the status bar is clicked. It opens the CourseDialog, which moves the selected students to another course.
+        """
+        if not self.table.selectionModel().hasSelection() and not self.table.currentIndex().isValid():
+            return
+        with span("dialog.course.open"):
+            if self._course_dialog is None:
+                self._course_dialog = CourseDialog()
+            else:
+                self._course_dialog.reset()
+            dialog: CourseDialog = self._course_dialog
+        dialog.exec()
 
-        connection.close()
+    def patch_course(self, student_ids: list[int], course: str) -> list[int]:
+        """
+        This function shows the students of a committed course change in their new course and returns their ids.
+        """
+        with span("dialog.course.apply"):
+            self.student_model.set_field(student_ids, 2, course)
+            self.search_model.set_field(student_ids, 2, course)
+        return student_ids
+
+    def selected_ids(self) -> list[int]:
+        """
+        This function returns the ids of the selected rows in table order, or the id of the current row when no row is selected.
+        """
+        model = self.table.model()
+        ranges = sorted((selection_range.top(), selection_range.bottom())
+                        for selection_range in self.table.selectionModel().selection())
+        if not ranges:
+            current = self.table.currentIndex()
+            return [model.record(current.row())[0]] if current.isValid() else []
+        ids: list[int] = []
+        for top, bottom in ranges:
+            ids.extend(model.ids(top, bottom))
+        # Overlapping ranges list a row twice
+        return list(dict.fromkeys(ids))
+
+    def show_busy(self, busy: bool) -> None:
+        """
+        This function shows or hides the busy indicator and the Stop button in the status bar.
+        """
+        self.busy_indicator.setVisible(busy)
+        self.stop_button.setVisible(busy)
+
+    def load_data(self) -> None:
+        """
+        This function loads the data from the database into the table. Only the first page is read here, the rest is fetched by the model as the user scrolls. At startup the first rows come from the snapshot instead, if there is one, and are reconciled with the database right after.
+        """
+        self.cache_timer.start()
+        if self._snapshot is not None and self._show_snapshot():
+            return
+        # Whatever was committed until now is in the pages about to be read
+        self.change_feed.skip()
+        self.student_model.reload()
+        self.snapshot_timer.start()
+
+    def _show_snapshot(self) -> bool:
+        """
+        This function shows the rows of the snapshot read at startup and returns whether it could. The change feed is moved back to where the snapshot was written, so reconciling is polling it: the changes committed since are patched in like those of another instance, or everything is read again if there are too many.
+        """
+        snapshot, self._snapshot = self._snapshot, None
+        try:
+            rows: list[tuple] = snapshot.records()
+        except ValueError:  # a damaged name
+            return False
+        finally:
+            snapshot.close()
+        if self.student_model.table_query != TableQuery():
+            return False
+        self.student_model.show_rows(rows, snapshot.complete)
+        self.change_feed.seek(snapshot.last_change, snapshot.last_id)
+        QTimer.singleShot(0, self.reconcile)
+        return True
+
+    def reconcile(self) -> None:
+        """
+        This function brings the rows and courses shown from the snapshot up to date with the database.
+        """
+        with span("window.reconcile"):
+            self.course_model.reload()
+            self.pull_changes()
+
+    def save_snapshot(self) -> None:
+        """
+        This function writes the snapshot of the first rows again in the background, so the next start shows them at once. A snapshot that cannot be written, on a read-only share for example, only costs the next start its head start, so the failure is told in the status bar rather than in a message box.
+        """
+        self.executor.submit(write_snapshot, quiet=True, on_failed=lambda message: self.statusbar.showMessage(
+            f"The snapshot for the next start could not be written: {message}", 10000))
 
     def insert(self) -> None:
         """
         This function is used to insert a new student record into the database.
         """
-        dialog: InsertDialog = InsertDialog()
+        with span("dialog.insert.open"):
+            if self._insert_dialog is None:
+                self._insert_dialog = InsertDialog()
+            else:
+                self._insert_dialog.reset()
+            dialog: InsertDialog = self._insert_dialog
         dialog.exec()
-        self.load_data() if dialog.success else None
+
+    def patch_inserted(self, students: list[Student]) -> list[int]:
+        """
+        This function adds the rows of committed inserts to the table and returns their ids.
+        """
+        with span("dialog.insert.apply"):
+            for record in students:
+                self.student_model.insert_record(record)
+        return [record[0] for record in students]
 
     def search(self) -> None:
         """
         This function is used to search for a student record in the database.
         """
-        dialog: SearchDialog = SearchDialog()
+        with span("dialog.search.open"):
+            if self._search_dialog is None:
+                self._search_dialog = SearchDialog()
+            else:
+                self._search_dialog.reset()
+            dialog: SearchDialog = self._search_dialog
         dialog.exec()
         if dialog.success == True:
-            print(dialog.data)
+            self._clear_filter()
+            self.show_search(dialog.key)
+
+    def show_search(self, key: SearchKey) -> None:
+        """
+        This function shows the results of the search dialog. A search that was run before and whose results no write has changed since is shown from the search cache without a query, otherwise the query runs in the background and its rows are cached once they are all read.
+        """
+        sql, params = search_query(*key)
+        rows: Optional[list[tuple]] = self.search_cache.get(key)
+        if rows is None:
+            self.show_results(sql, params, cache_key=key)
+            return
+        if self._search_worker is not None:
+            self._search_worker.cancel()
+            self._search_worker = None
+        if self.table.model() is not self.search_model:
+            self._set_table_model(self.search_model)
+        self.search_model.set_rows(rows)
+        self._results_query = (sql, params)
+
+    def apply_filter(self) -> None:
+        """
+        This function shows the students whose name matches the text of the filter bar, or all students if it is empty.
+        """
+        query = name_search_query(self.filter_input.text())
+        if query is None:
+            self.show_all()
+        else:
+            self.show_results(*query)
+
+    def show_results(self, sql: str, params: tuple, cache_key: Optional[SearchKey] = None) -> None:
+        """
+        This function shows the rows of a query in the table as they arrive. A query that is still running is
+        cancelled first, so results of an older keystroke never mix with the newer ones. With a cache_key, the rows
+        are kept in the search cache once the query finished.
+        """
+        if self._search_worker is not None:
+            self._search_worker.cancel()
+        self.search_model.set_rows([])
+        if self.table.model() is not self.search_model:
+            self._set_table_model(self.search_model)
+        on_chunk: Callable[[list[tuple]], None] = self.search_model.append_rows
+        on_finished: Optional[Callable[[QueryWorker], None]] = None
+        on_failed: Callable[[str], None] = self.search_failed
+        if cache_key is not None:
+            # The position of the lookup that missed, the cache refuses the rows if anything was committed since
+            position: int = self.search_cache.position
+            rows: list[tuple] = []
+            errors: list[str] = []
+
+            def on_chunk(chunk: list[tuple]) -> None:
+                rows.extend(chunk)
+                self.search_model.append_rows(chunk)
+
+            def on_failed(message: str) -> None:
+                errors.append(message)
+                self.search_failed(message)
+
+            def on_finished(worker: QueryWorker) -> None:
+                if not worker.cancelled and not errors:
+                    self.search_cache.put(cache_key, rows, position)
+
+        self._search_worker = self.executor.run(sql, params, on_chunk=on_chunk, on_finished=on_finished,
+                                                on_failed=on_failed)
+        self._results_query = (sql, params)
+
+    def search_failed(self, message: str) -> None:
+        """
+        This function tells in the status bar that the query of a search or of the filter bar failed. The filter bar runs a query at every pause in typing, a message box would interrupt the typing each time.
+        """
+        self.statusbar.showMessage(f"The search failed: {message}", 10000)
+
+    def show_all(self) -> None:
+        """
+        This function goes back to showing every student.
+        """
+        if self._search_worker is not None:
+            self._search_worker.cancel()
+            self._search_worker = None
+        self.search_model.set_rows([])
+        if self.table.model() is not self.student_model:
+            self._set_table_model(self.student_model)
+
+    def sort_students(self, column: int, order: Qt.SortOrder) -> None:
+        """
+        This function is triggered when a column header is clicked. It shows the students sorted by that column.
+        """
+        self.student_model.sort(column, order)
+        self._clear_filter()
+        self.show_all()
+
+    def filter_columns(self) -> None:
+        """
+        This function is triggered when a column filter in the toolbar changes. It shows only the students of the
+        picked course whose name and phone number start with the typed text.
+        """
+        self.column_filter_timer.stop()
+        course: Optional[str] = self.course_filter.currentText() if self.course_filter.currentIndex() > 0 else None
+        self.student_model.set_filters(course, self.name_prefix_filter.text().strip(),
+                                       self.mobile_prefix_filter.text())
+        self._clear_filter()
+        self.show_all()
+
+    def import_file(self) -> None:
+        """
+        This function asks for a CSV or JSON Lines file and imports its students in the background. The table is read
+        again once the import is over.
+        """
+        path, _ = QFileDialog.getOpenFileName(self, "Import Students", "",
+                                              "Student files (*.csv *.jsonl *.ndjson);;All files (*)")
+        if not path:
+            return
+
+        from importer import import_students
+
+        rejects_path: str = os.path.splitext(path)[0] + ".rejected.csv"
+        duplicates_path: str = os.path.splitext(path)[0] + ".duplicates.csv"
+        self.import_action.setEnabled(False)
+        self.statusbar.showMessage(f"Importing {os.path.basename(path)}...")
+        worker = self.executor.submit(partial(import_students, rejects_path=rejects_path,
+                                              duplicates_path=duplicates_path), path,
+                                      on_progress=self.show_import_progress,
+                                      on_result=lambda result: self.import_finished(result, rejects_path,
+                                                                                    duplicates_path),
+                                      on_failed=lambda message: QMessageBox.warning(self, "Import failed", message))
+        worker.signals.finished.connect(self._import_done)
+
+    def show_import_progress(self, progress: "ImportProgress") -> None:
+        self.statusbar.showMessage(f"Importing... {progress.fraction:.0%}, "
+                                   f"{progress.imported} imported, {progress.rejected} rejected")
+
+    def import_finished(self, result: "ImportResult", rejects_path: str, duplicates_path: str) -> None:
+        """
+        This function reports how many students were imported, why the first rejected lines were rejected and where
+        the probable duplicates of the imported students were written. Empty reports are removed.
+        """
+        message: str = f"{result.imported} students imported, {result.rejected} rejected in {result.seconds:.1f} s."
+        self.statusbar.showMessage(message, 10000)
+        details: list[str] = []
+        if result.rejected:
+            reasons: str = "\n".join(f"Line {line}: {reason}" for line, reason in result.errors[:10])
+            details.append(f"{reasons}\n\nAll rejected lines are listed in {rejects_path}")
+        elif os.path.exists(rejects_path):
+            os.remove(rejects_path)
+        if result.duplicates:
+            details.append(f"{result.duplicates} groups of students may already have been in the database, "
+                           f"they are listed in {duplicates_path}")
+        elif os.path.exists(duplicates_path):
+            os.remove(duplicates_path)
+        if details:
+            QMessageBox.information(self, "Import finished", "\n\n".join([message] + details))
+
+    def _import_done(self) -> None:
+        self.import_action.setEnabled(True)
+        self.load_data()
+        self.students_changed.emit()
+
+    def pull_changes(self, ignore: Iterable[int] = ()) -> None:
+        """
+        This function patches the table with the students other instances inserted, updated or deleted since the last look. ignore holds the ids a dialog of this window just changed and patched itself. If the changes cannot be told apart the rows are read again.
+        """
+        ignore = set(ignore)
+        changes: Optional[list[StudentChange]] = self.change_feed.poll(ignore)
+        if changes != []:
+            # Courses another instance added or retired show up with its next change to students
+            self.course_model.reload()
+        if changes is None:
+            self.load_data()
+            if self.table.model() is self.search_model:
+                self.show_results(*self._results_query)
+        elif changes:
+            with span("window.pull_changes"):
+                self.student_model.apply_changes(changes)
+                self.search_model.apply_changes(changes)
+        if changes != [] or ignore:
+            self.students_changed.emit()
+
+    def when_written(self, future: Future, on_written: Optional[Callable[[Any], Iterable[int]]] = None,
+                     on_failed: Optional[Callable[[str], None]] = None) -> None:
+        """
+        This function waits for a write queued on the writer without blocking. Once its batch is committed, on_written receives the result of the write and patches the table, returning the ids it patched. A failed write is passed to on_failed, or reported in a message box without one.
+        """
+        self._pending_writes.append((future, on_written, on_failed))
+
+    def _writes_done(self, count: int) -> None:
+        # A batch of the writer is over, the writes it resolved are patched and the rest comes through the change feed
+        done = [pending for pending in self._pending_writes if pending[0].done()]
+        self._pending_writes = [pending for pending in self._pending_writes if not pending[0].done()]
+        patched: set[int] = set()
+        errors: list[str] = []
+        for future, on_written, on_failed in done:
+            if future.exception() is not None:
+                if on_failed is not None:
+                    on_failed(str(future.exception()))
+                else:
+                    errors.append(str(future.exception()))
+            elif on_written is not None:
+                patched.update(on_written(future.result()))
+        self.pull_changes(ignore=patched)
+        if errors:
+            self.statusbar.showMessage(f"{len(errors)} changes could not be saved.", 10000)
+            QMessageBox.warning(self, "Saving Failed", "\n".join(errors[:10]))
+
+    def _poll_changes(self) -> None:
+        # While a dialog is open it may be about to patch what it changed itself, pull_changes runs once it closed
+        if QApplication.activeModalWidget() is None:
+            self.pull_changes()
+
+    def current_query(self) -> tuple[str, tuple]:
+        """
+        This function returns the query that reads the rows shown in the table, in the order they are shown.
+        """
+        model = self.table.model()
+        if model is self.search_model:
+            sql, params = self._results_query
+            return f"SELECT id, name, course, mobile FROM ({sql})", params
+        return self.student_model.query()
+
+    def export_file(self) -> None:
+        """
+        This function asks for a file name and writes the rows shown in the table to it in the background. The format
+        follows the chosen filter or the extension of the file name.
+        """
+        from exporter import FORMATS, export_students
+
+        filters: dict[str, str] = {"CSV (*.csv)": ".csv", "JSON Lines (*.jsonl)": ".jsonl",
+                                   "Columnar binary (*.stcol)": ".stcol"}
+        path, chosen = QFileDialog.getSaveFileName(self, "Export Students", "students.csv", ";;".join(filters))
+        if not path:
+            return
+        if os.path.splitext(path)[1].lower() not in FORMATS:
+            path += filters.get(chosen, ".csv")
+
+        sql, params = self.current_query()
+        self.export_action.setEnabled(False)
+        self.statusbar.showMessage(f"Exporting to {os.path.basename(path)}...")
+        worker = self.executor.submit(export_students, path, sql, params,
+                                      on_progress=self.show_export_progress,
+                                      on_result=lambda result: self.statusbar.showMessage(
+                                          f"{result.exported} students exported to {os.path.basename(path)} "
+                                          f"in {result.seconds:.1f} s.", 10000),
+                                      on_failed=lambda message: QMessageBox.warning(self, "Export failed", message))
+        worker.signals.finished.connect(lambda: self.export_action.setEnabled(True))
+
+    def show_export_progress(self, progress: "ExportProgress") -> None:
+        self.statusbar.showMessage(f"Exporting... {progress.exported / max(progress.total, 1):.0%}, "
+                                   f"{progress.exported} of {progress.total} students")
+
+    def find_duplicates(self) -> None:
+        """
+        This function asks for a file name and searches every student for duplicates in the background. The groups it
+        finds are written to the file as a merge report, with the student to keep first in every group.
+        """
+        from duplicates import report_duplicates
+
+        path, _ = QFileDialog.getSaveFileName(self, "Duplicates Report", "duplicates.csv", "CSV (*.csv)")
+        if not path:
+            return
+        self.duplicates_action.setEnabled(False)
+        self.statusbar.showMessage("Searching for duplicates...")
+        worker = self.executor.submit(report_duplicates, path,
+                                      on_progress=lambda progress: self.statusbar.showMessage(
+                                          f"Searching for duplicates, {progress.stage}... {progress.fraction:.0%}"),
+                                      on_result=lambda result: self.statusbar.showMessage(
+                                          f"{len(result.groups)} groups of duplicates among {result.students} "
+                                          f"students written to {os.path.basename(path)} in {result.seconds:.1f} s.",
+                                          10000),
+                                      on_failed=lambda message: QMessageBox.warning(self, "Duplicate search failed",
+                                                                                    message))
+        worker.signals.finished.connect(lambda: self.duplicates_action.setEnabled(True))
+
+    def back_up(self) -> None:
+        """
+        This function backs the database up in the background, page by page, so neither the window nor the writer
+        waits for it. Old backups beyond the configured number are removed.
+        """
+        from backup import backup_database
+
+        if not self.backup_action.isEnabled():
+            return
+        self.backup_action.setEnabled(False)
+        self.restore_action.setEnabled(False)
+        self.statusbar.showMessage("Backing up...")
+        worker = self.executor.submit(backup_database, None, self.backup_settings.directory,
+                                      on_progress=self.show_backup_progress,
+                                      on_result=lambda result: self.statusbar.showMessage(
+                                          f"Backed up to {os.path.basename(result.path)}, "
+                                          f"{result.size / 1e6:.1f} MB in {result.seconds:.1f} s.", 10000),
+                                      on_failed=lambda message: QMessageBox.warning(self, "Backup failed", message))
+        worker.signals.finished.connect(self._backup_done)
+
+    def restore_backup(self) -> None:
+        """
+        This function asks for a backup and, once confirmed, replaces the students with those of the backup in the
+        background. What the dialogs queued is saved first, the table is read again once the restore is over.
+        """
+        from backup import restore_database
+
+        path, _ = QFileDialog.getOpenFileName(self, "Restore Backup", self.backup_settings.directory,
+                                              "Backups (*.db.gz);;All files (*)")
+        if not path:
+            return
+        answer = QMessageBox.question(self, "Restore Backup",
+                                      f"Replace all students with those of {os.path.basename(path)}? "
+                                      "Changes made since the backup are lost.")
+        if answer != QMessageBox.StandardButton.Yes:
+            return
+
+        self.writer.flush()
+        self.backup_action.setEnabled(False)
+        self.restore_action.setEnabled(False)
+        self.statusbar.showMessage(f"Restoring {os.path.basename(path)}...")
+        worker = self.executor.submit(restore_database, path,
+                                      on_progress=self.show_backup_progress,
+                                      on_result=lambda result: self.statusbar.showMessage(
+                                          f"{result.students} students restored in {result.seconds:.1f} s.", 10000),
+                                      on_failed=lambda message: QMessageBox.warning(self, "Restore failed", message))
+        worker.signals.finished.connect(self._restore_done)
+
+    def show_backup_progress(self, progress: BackupProgress) -> None:
+        self.statusbar.showMessage(f"{progress.stage.capitalize()}... {progress.fraction:.0%}")
+
+    def _back_up_if_due(self) -> None:
+        backups: list[str] = list_backups(self.backup_settings.directory)
+        if not backups or time.time() - os.path.getmtime(backups[0]) > self.backup_settings.interval_hours * 3600:
+            self.back_up()
+
+    def _backup_done(self) -> None:
+        self.backup_action.setEnabled(True)
+        self.restore_action.setEnabled(True)
+
+    def _restore_done(self) -> None:
+        self._backup_done()
+        self.load_data()
+        if self.table.model() is self.search_model:
+            self.show_results(*self._results_query)
+        self.students_changed.emit()
+
+    def manage_courses(self) -> None:
+        """
+        This function opens the course administration, where courses are added, retired and offered again.
+        """
+        dialog = CoursesDialog(self)
+        dialog.exec()
+        if dialog.changed:
+            self.course_model.reload()
+            self.students_changed.emit()
+
+    def _remember_course_filter(self) -> None:
+        self._course_filter_text = self.course_filter.currentText() if self.course_filter.currentIndex() > 0 else ""
+
+    def _restore_course_filter(self) -> None:
+        # The reset moved the filter back to its first entry, the filter itself did not change
+        self.course_filter.blockSignals(True)
+        self.course_filter.setCurrentIndex(max(self.course_filter.findText(self._course_filter_text), 0)
+                                           if self._course_filter_text else 0)
+        self.course_filter.blockSignals(False)
+
+    def _clear_filter(self) -> None:
+        self.filter_input.blockSignals(True)
+        self.filter_input.clear()
+        self.filter_input.blockSignals(False)
 
     def about(self) -> None:
         """
@@ -207,6 +2034,25 @@ class MainWindow(QMainWindow):
         dialog: AboutDialog = AboutDialog()
         dialog.exec()
 
+    def show_statistics(self) -> None:
+        """
+        This function opens the enrollment statistics. They are not modal and stay up to date while students change.
+        """
+        if self._statistics_dialog is None:
+            self._statistics_dialog = StatisticsDialog(self)
+            self.students_changed.connect(self._statistics_dialog.refresh)
+        self._statistics_dialog.show()
+        self._statistics_dialog.raise_()
+
+    def show_performance(self) -> None:
+        """
+        This function opens the performance panel. It is not modal, so it can stay open while the window is used.
+        """
+        if self._performance_dialog is None:
+            self._performance_dialog = PerformanceDialog(self)
+        self._performance_dialog.show()
+        self._performance_dialog.raise_()
+
 
 class InsertDialog(QDialog):
     '''
@@ -223,15 +2069,21 @@ class InsertDialog(QDialog):
     student_name (str): The name of the selected student record.
     student_course (str): The course of the selected student record.
     student_phone (int): The phone number of the selected student record.
+    writes (list[Future]): The inserts queued while the dialog was open, each resolves to the added students once committed.
 
     Methods:
-    submit(self) -> None: This function is used to insert the new student record into the database.
+    reset(self) -> None: This function empties the form before the dialog is opened again.
+    submit(self) -> None: This function checks the new student for duplicates in the background, then adds it.
+    add(self, student: tuple, matches: list) -> None: This function queues the new student record for insertion into the database.
+    confirm_duplicates(self, matches: list) -> bool: This function asks the user whether to add a student that may already be in the database.
     cancel(self) -> None: This function is used to close the dialog box.
     '''
 
     def __init__(self) -> None:
         super().__init__()
         self.success: bool = False
+        self.writes: list[Future] = []
+        self._checking: Optional[TaskWorker] = None
         self.setWindowTitle("Add Student")
         self.setFixedWidth(300)
         self.setFixedHeight(280)
@@ -255,9 +2107,7 @@ class InsertDialog(QDialog):
         # CREATE DROP DOWN MENU
         self.course_name = QComboBox()
         self.course_name.setPlaceholderText("Select Course")
-        courses = ['Math', 'Physics', 'Chemistry',
-                   'Biology', 'History', 'Science']
-        self.course_name.addItems(courses)
+        self.course_name.setModel(main_window.course_model)
 
         # CREATE BUTTONS
         self.button_ok = QPushButton("Submit")
@@ -276,41 +2126,83 @@ class InsertDialog(QDialog):
         layout.addWidget(self.button_ok)
         layout.addWidget(self.button_cancel)
 
-    def submit(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
         """
-        This function is used to insert a new student record into the database.
+        This function empties the form before the dialog is opened again, the dialog itself is only built once.
         """
-        try:
-            name: str = self.input_name.text()
-            course: str = self.course_name.currentText()
-            # course = self.course_name.itemText(self.cours_name.currentIndex())
-            phone: int = int(self.input_phone.text())
+        self.success = False
+        self.writes = []
+        self.input_name.clear()
+        self.input_phone.clear()
+        self.course_name.setCurrentIndex(main_window.course_model.first_offered())
+        self.input_name.setFocus()
 
-            connection = connection = DatabaseConnection().connect()
-            cursor = connection.cursor()
-            connection.execute(
-                "INSERT INTO students (name, course, mobile) VALUES (?,?,?)", (name, course, phone))
+    def submit(self) -> None:
+        """
+        This function is used to insert a new student record into the database. The phone number may be typed with spaces, dashes, dots, brackets and a leading plus. The student is first looked for among the students already in the database, the same name with a slightly different phone number or the same phone number with a similar name. That search reads the database, so it runs on the executor of the main window and the Submit button waits for it, the student is added once it answered, see add.
+        """
+        from duplicates import find_matches
+        from importer import parse_phone
+
+        if self._checking is not None:
+            return
+        with span("dialog.insert.submit"):
+            try:
+                name: str = self.input_name.text()
+                course: Optional[str] = self.course_name.currentText() or None
+                phone: int = parse_phone(self.input_phone.text())
+            except ValueError as e:
+                self.success = False
+                print(e)
+                return
+
+            self.button_ok.setEnabled(False)
+            worker = main_window.executor.submit(
+                find_matches, name, phone, on_result=partial(self.add, (name, course, phone)),
+                on_failed=lambda message: QMessageBox.warning(self, "Duplicate Check Failed", message))
+            # Also over when it was cancelled or failed, the student is not added then
+            worker.signals.finished.connect(lambda: self._check_done(worker))
+            self._checking = worker
+
+    def _check_done(self, worker: TaskWorker) -> None:
+        if worker is self._checking:
+            self._checking = None
+            self.button_ok.setEnabled(True)
+
+    def add(self, student: tuple, matches: list) -> None:
+        """
+        This function is called with the students the new one may duplicate once the duplicate check is over. If there are any, the user is warned and asked whether to add it anyway. The insert is queued on the writer, so the dialog is ready for the next student at once, and the main window adds the row once it is committed.
+        """
+        self._check_done(self._checking)
+        with span("dialog.insert.add"):
+            if matches and not self.confirm_duplicates(matches):
+                return
 
-            connection.commit()
+            write: Future = main_window.writer.add([student])
+            main_window.when_written(write, main_window.patch_inserted)
+            self.writes.append(write)
 
             # Clear inputs
             self.input_name.setText("")
             self.input_phone.setText("")
-            self.course_name.clear()
-            self.course_name.setPlaceholderText("Select Course")
-            self.course_name.addItems(['Math', 'Physics', 'Chemistry',
-                                       'Biology', 'History', 'Science'])
+            self.course_name.setCurrentIndex(main_window.course_model.first_offered())
 
             # FIXME had metaclass conflict when used @abstractmethod for def load_data() function
             # OR use main_window.load_data()
             self.success = True
 
-        except sqlite3.Error as e:
-            self.success = False
-            print(e)
-        finally:
-            cursor.close()
-            connection.close()
+    def confirm_duplicates(self, matches: list) -> bool:
+        """
+        This function lists the students the new one may duplicate, as (student, reason) pairs from duplicates.find_matches, and asks the user whether to add it anyway. It returns True to add the student. A caller without a user to ask, a script or a benchmark, overrides it.
+        """
+        listed: str = "\n".join(f"{student.id}: {student.name}, {student.course or 'no course'}, "
+                                f"{student.mobile} ({reason})" for student, reason in matches[:5])
+        more: str = f"\n... and {len(matches) - 5} more" if len(matches) > 5 else ""
+        answer = QMessageBox.question(self, "Possible Duplicate",
+                                      f"This student may already be in the database:\n\n{listed}{more}\n\nAdd anyway?")
+        return answer == QMessageBox.StandardButton.Yes
 
     def cancel(self) -> None:
         """
@@ -328,15 +2220,19 @@ class SearchDialog(QDialog):
 
     Two buttons are created: Submit, Cancel. The Submit button is used to search for the data, while the Cancel button closes the window.
 
-    The submit method is used to search for the data in the database. It first tries to search for the data, and if it fails, it displays an error message.
+    The submit method builds the search query from the inputs. The query is run in the background by the main window, so a slow search never freezes the dialog. The criteria are normalized into a key first, so the same search typed differently is served from the search cache of the main window.
 
     Attributes:
     student_name (str): The name of the selected student record.
     student_course (str): The course of the selected student record.
     student_phone (int): The phone number of the selected student record.
+    sql (str): The search query built by submit.
+    params (tuple): The parameters of the search query.
+    key (SearchKey): The normalized criteria the query was built from.
 
     Methods:
-    submit(self) -> None: This function is used to search for the data in the database.
+    reset(self) -> None: This function empties the form before the dialog is opened again.
+    submit(self) -> None: This function is used to build the search query.
     cancel(self) -> None: This function is used to close the window.
 
     '''
@@ -344,7 +2240,9 @@ class SearchDialog(QDialog):
     def __init__(self) -> None:
         super().__init__()
         self.success: bool = False
-        self.data: list[tuple] = []
+        self.sql: str = ""
+        self.params: tuple = ()
+        self.key: SearchKey = SearchKey(None, None, None)
         self.setWindowTitle("Search Student")
         self.setFixedWidth(300)
         self.setFixedHeight(280)
@@ -368,9 +2266,7 @@ class SearchDialog(QDialog):
         # CREATE DROP DOWN MENU
         self.course_name = QComboBox()
         self.course_name.setPlaceholderText("Select Course")
-        courses: list[str] = ['Math', 'Physics', 'Chemistry',
-                              'Biology', 'History', 'Science']
-        self.course_name.addItems(courses)
+        self.course_name.setModel(main_window.course_filter_model)
 
         # CREATE BUTTONS
         self.button_ok = QPushButton("Submit")
@@ -390,6 +2286,21 @@ class SearchDialog(QDialog):
         layout.addWidget(self.button_ok)
         layout.addWidget(self.button_cancel)
 
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        This function empties the form before the dialog is opened again, the dialog itself is only built once.
+        """
+        self.success = False
+        self.sql = ""
+        self.params = ()
+        self.key = SearchKey(None, None, None)
+        self.input_name.clear()
+        self.input_phone.clear()
+        self.course_name.setCurrentIndex(0)
+        self.input_name.setFocus()
+
     def cancel(self) -> None:
         """
         This function is triggered when the cancel button is clicked. It closes the window.
@@ -398,61 +2309,53 @@ class SearchDialog(QDialog):
 
     def submit(self) -> None:
         """
-        This function is used to search a new student record into the database.
+        This function builds the search query from the filled in fields and closes the dialog. The query itself is run in the background by the main window, or not at all if its results are cached.
         """
-        try:
-            name: Optional[str] = self.input_name.text() or None
-            course: Optional[str] = self.course_name.currentText() or None
-            phone: Optional[str] = self.input_phone.text() or None
-
-            connection = connection = DatabaseConnection().connect()
-            cursor = connection.cursor()
-
-            sql: str = f"SELECT * FROM students WHERE"
-            params: list = []
-
-            if name is not None:
-                sql += " name=? AND"
-                params.append(name)
-            if course is not None:
-                sql += " course=? AND"
-                params.append(course)
-            if phone is not None:
-                sql += " mobile=? AND"
-                params.append(int(phone))
-
-            cursor.execute(
-                sql[0:-3], (params))
-            self.data = cursor.fetchall()
+        with span("dialog.search.submit"):
+            try:
+                course: Optional[str] = self.course_name.currentText() if self.course_name.currentIndex() > 0 else None
+                self.key = search_key(self.input_name.text(), course, self.input_phone.text())
 
-        except sqlite3.Error as e:
-            self.success = False
-            print(e)
-        else:
-            self.success = True
-        finally:
-            cursor.close()
-            connection.close()
+                # Every combination of fields is served by an index, see schema.INDEXES
+                self.sql, self.params = search_query(*self.key)
+
+            except ValueError as e:
+                self.success = False
+                print(e)
+            else:
+                self.success = True
+                self.close()
 
 
 class EditDialog(QDialog):
     '''
     The EditDialog class is used to edit a student record in the database. It contains several elements, such as labels, inputs, and buttons.
 
-    The init method sets the window title, size, and creates a vertical layout for the elements. It also gets the current row index and values from the table widget.
+    The init method sets the window title, size, and creates a vertical layout for the elements. It also gets the current row index and values from the table model.
 
     Two buttons are created: Update, Cancel. The Update button is used to update the record, while the Cancel button closes the window.
 
-    The submit method is used to update the record in the database. It first tries to update the record, and if it fails, it displays an error message.
+    The submit method is used to update the record in the database. The update is queued on the writer of the main window and the dialog stays open until it is committed, without blocking the window. If it fails, an error message is shown.
+
+    The student is read again with the version of its row when the dialog opens, and the update only goes through if the row still has that version. If another instance changed the student in the meantime, both versions are shown and the user decides whether to overwrite the other change, keep it, or go back to the form, which then shows the other change.
 
     Attributes:
     student_id (int): The ID of the selected student record.
     student_name (str): The name of the selected student record.
     student_course (str): The course of the selected student record.
-    student_phone (int): The phone number of the selected student record.
+    student_phone (Optional[int]): The stored phone number of the selected student record, kept as it is if the phone field is not changed.
+    data (list[tuple]): The updated row as (id, name, course, mobile) once the update succeeded.
+    version (Optional[int]): The version of the row the edit started from, None if the student was deleted.
+    pending (Optional[Future]): The queued update, resolves to whether the row still had the version once committed.
 
     Methods:
+    reset(self) -> None: This function fills the form in with the current student of the table.
+    show_student(self, record: tuple) -> None: This function fills the form in with a student, missing values as empty fields.
     submit(self) -> None: This function is used to update the record in the database.
+    write(self, student: tuple) -> None: This function queues writing the student if its row still has the version the edit started from.
+    written(self, future, student, updated) -> list[int]: This function closes the dialog once the update is committed, or resolves the conflict.
+    write_failed(self, future, message) -> None: This function reports an update that could not be saved.
+    resolve_conflict(self, repository, student) -> Optional[bool]: This function asks what to do when the student changed since the dialog opened.
     cancel(self) -> None: This function is used to close the window.
     '''
 
@@ -468,13 +2371,10 @@ class EditDialog(QDialog):
         layout = QVBoxLayout()
         self.setLayout(layout)
 
-        # GET CURRENT ROW INDEX AND VALUES
-        index = main_window.table.currentRow()
-        # Row index and column index
-        self.student_id: str = main_window.table.item(index, 0).text()
-        student_name: str = main_window.table.item(index, 1).text()
-        student_course: str = main_window.table.item(index, 2).text()
-        student_phone: str = main_window.table.item(index, 3).text()
+        self.version: Optional[int] = None
+        self.pending: Optional[Future] = None
+        self.student_id: str = ""
+        self.student_phone: Optional[int] = None
 
         # CREATE LABELS
         self.label_name = QLabel("Name:")
@@ -482,8 +2382,8 @@ class EditDialog(QDialog):
         self.label_phone = QLabel("Phone:")
 
         # CREATE INPUTS
-        self.input_name = QLineEdit(student_name)
-        self.input_phone = QLineEdit(student_phone)
+        self.input_name = QLineEdit()
+        self.input_phone = QLineEdit()
 
         self.input_name.setPlaceholderText("Student name")
         self.input_phone.setPlaceholderText("Studen phone number")
@@ -491,10 +2391,8 @@ class EditDialog(QDialog):
         # CREATE DROP DOWN MENU
         self.course_name = QComboBox()
         self.course_name.setPlaceholderText("Select Course")
-        courses = ['Math', 'Physics', 'Chemistry',
-                   'Biology', 'History', 'Science']
-        self.course_name.addItems(courses)
-        self.course_name.setCurrentText(student_course)
+        # A retired course is disabled in the list, but still shown for a student who is in it
+        self.course_name.setModel(main_window.course_model)
 
         # CREATE BUTTONS
         self.button_ok = QPushButton("Update")
@@ -514,6 +2412,37 @@ class EditDialog(QDialog):
         layout.addWidget(self.button_ok)
         layout.addWidget(self.button_cancel)
 
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        This function fills the form in with the current student of the table before the dialog is opened again, the dialog itself is only built once.
+        """
+        self.success = False
+        self.data = []
+        self.pending = None
+        self.button_ok.setEnabled(True)
+
+        # GET CURRENT ROW INDEX AND VALUES, read again with the row version since the table may be a moment behind
+        index = main_window.table.currentIndex().row()
+        record: tuple = main_window.table.model().record(index)
+        self.version = None
+        found = StudentRepository().get_versioned(record[0])
+        if found is not None:
+            record, self.version = found
+        self.show_student(record)
+        self.input_name.setFocus()
+
+    def show_student(self, record: tuple) -> None:
+        """
+        This function fills the form in with a (id, name, course, mobile) row. A missing name or phone number is shown as an empty field rather than as "None", so it is saved back as missing.
+        """
+        self.student_id = str(record[0])
+        self.student_phone = record[3]
+        self.input_name.setText(record[1] if record[1] is not None else "")
+        self.course_name.setCurrentIndex(self.course_name.findText(record[2]) if record[2] is not None else -1)
+        self.input_phone.setText(str(record[3]) if record[3] is not None else "")
+
     def cancel(self) -> None:
         """
         This function is triggered when the cancel button is clicked. It closes the window.
@@ -522,51 +2451,126 @@ class EditDialog(QDialog):
 
     def submit(self) -> None:
         """
-        This function is used to update a student record in the database.
+        This function is used to update a student record in the database. The phone number may be typed with spaces, dashes, dots, brackets and a leading plus, and an empty field saves the student without one.
         """
-        try:
-            name: Optional[str] = self.input_name.text() or None
-            course: Optional[str] = self.course_name.currentText() or None
-            phone: Optional[int] = int(self.input_phone.text()) or None
+        from importer import parse_phone
+
+        with span("dialog.edit.submit"):
+            try:
+                name: Optional[str] = self.input_name.text() or None
+                course: Optional[str] = self.course_name.currentText() or None
+                # Formatted numbers are read like the insert dialog does, a number left as it was is kept as stored
+                typed: str = self.input_phone.text().strip()
+                phone: Optional[int] = (None if not typed else self.student_phone
+                                        if typed == str(self.student_phone) else parse_phone(typed))
 
-            connection = connection = DatabaseConnection().connect()
+                self.write((int(self.student_id), name, course, phone))
 
-            cursor = connection.cursor()
+            except (RuntimeError, ValueError) as e:
+                self.success = False
+                print(e)
+                self.close()
 
-            cursor.execute(
-                "UPDATE students SET name=?, course=?, mobile=? WHERE id=?", (name, course, phone, self.student_id))
+    def write(self, student: tuple) -> None:
+        """
+        This function queues writing the student on the writer of the main window if its row still has the version the edit started from. The dialog stays open, with the update button disabled, until written or write_failed is called back once the batch is committed.
+        """
+        future: Future = main_window.writer.update_versioned(student, self.version)
+        self.pending = future
+        self.button_ok.setEnabled(False)
+        main_window.when_written(future, partial(self.written, future, student), partial(self.write_failed, future))
 
-            connection.commit()
+    def written(self, future: Future, student: tuple, updated: bool) -> list[int]:
+        """
+        This function is called back once the update is committed. An update that went through is patched into the table and closes the dialog. Otherwise the student changed since the dialog opened, and the user decides whether to write it again over the other change. It returns the ids it patched.
+        """
+        if future is not self.pending:
+            # The dialog was opened again in the meantime, only the table is left to patch
+            return main_window.patch_edited(student) if updated else []
+        self.pending = None
+        self.button_ok.setEnabled(True)
+        if updated:
+            self.data = [student]
+            self.success = True
+            self.close()
+            return main_window.patch_edited(student)
 
+        try:
+            overwrite: Optional[bool] = self.resolve_conflict(StudentRepository(), student)
         except sqlite3.Error as e:
-            self.success = False
-            print(e)
-        else:
+            self.write_failed(future, str(e))
+            return []
+        if overwrite:
+            self.write(student)
+        elif overwrite is not None:
             self.success = True
-        finally:
-            cursor.close()
-            connection.close()
             self.close()
+        return []
+
+    def write_failed(self, future: Future, message: str) -> None:
+        """
+        This function is called back when the update could not be saved, it shows why and closes the dialog.
+        """
+        if future is not self.pending:
+            main_window.statusbar.showMessage(f"A change could not be saved: {message}", 10000)
+            return
+        self.pending = None
+        self.button_ok.setEnabled(True)
+        self.success = False
+        QMessageBox.warning(self, "Saving Failed", message)
+        self.close()
+
+    def resolve_conflict(self, repository: StudentRepository, student: tuple) -> Optional[bool]:
+        """
+        This function is called when the student changed or was deleted since the dialog opened. It shows the other change next to the edit and returns True to overwrite it, False to keep it, or None to go back to the form, which then shows the other change.
+        """
+        found = repository.get_versioned(student[0])
+        if found is None:
+            QMessageBox.warning(self, "Edit Conflict", "Another user deleted this student, your changes were not saved.")
+            return False
+        theirs, self.version = found
+
+        def describe(row: tuple) -> str:
+            return ", ".join(str(value) if value is not None else "-" for value in row[1:])
+
+        box = QMessageBox(QMessageBox.Icon.Warning, "Edit Conflict",
+                          "Another user changed this student while you were editing it.", parent=self)
+        box.setInformativeText(f"Theirs: {describe(theirs)}\nYours: {describe(student)}")
+        overwrite_button = box.addButton("Overwrite Theirs", QMessageBox.ButtonRole.DestructiveRole)
+        keep_button = box.addButton("Keep Theirs", QMessageBox.ButtonRole.RejectRole)
+        box.addButton(QMessageBox.StandardButton.Cancel)
+        box.exec()
+        if box.clickedButton() is overwrite_button:
+            return True
+        if box.clickedButton() is keep_button:
+            return False
+        self.show_student(theirs)
+        return None
 
 
 class DeleteDialog(QDialog):
     """
-    This class is used to delete a student record from the database. 
+    This class is used to delete the selected student records from the database.
 
     Attributes:
-    student_id (int): The ID of the selected student record.
-    student_name (str): The name of the selected student record.
+    student_ids (list[int]): The IDs of the selected student records.
+    student_name (str): The name of the selected student record, or how many are selected.
+    pending (Optional[Future]): The queued delete, resolves to the number of deleted students once committed.
 
     Methods:
+    reset(self) -> None: This function takes the selected rows of the table.
     cancel(self) -> None: This function is triggered when the cancel button is clicked. It closes the window.
     submit(self) -> None: This function is used to delete a student record from the database. It opens the warning dialog box.
     delete(self) -> None: This function is used to delete a student record from the database.
+    deleted(self, future, student_ids, count) -> list[int]: This function removes the deleted rows from the table once the delete is committed.
+    delete_failed(self, future, message) -> None: This function reports a delete that could not be saved.
+    confirm_deleted(self, count: int) -> None: This function tells the user that the students are deleted.
     """
 
     def __init__(self) -> None:
         super().__init__()
         self.success: bool = False
-        self.data: list[tuple] = []
+        self.pending: Optional[Future] = None
         self.setWindowTitle("Delete Student Record")
         self.setFixedWidth(350)
         self.setFixedHeight(200)
@@ -575,17 +2579,11 @@ class DeleteDialog(QDialog):
         layout = QVBoxLayout()
         self.setLayout(layout)
 
-        # GET CURRENT ROW INDEX AND VALUES
-        index: int = main_window.table.currentRow()
-
-        # Row index and column index
-        self.student_id: str = main_window.table.item(index, 0).text()
-        student_name: str = main_window.table.item(index, 1).text()
+        self.student_ids: list[int] = []
 
         # CREATE LABELS
-        self.label_question = QLabel(
-            "Are you sure you want to delete this student?")
-        self.label_name = QLabel(student_name)
+        self.label_question = QLabel()
+        self.label_name = QLabel()
         self.label_name.setStyleSheet("font-size: 12px; font-weight: bold;")
 
         # CREATE BUTTONS
@@ -608,6 +2606,27 @@ class DeleteDialog(QDialog):
         layout.addWidget(self.button_ok)
         layout.addWidget(self.button_cancel)
 
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        This function takes the selected rows of the table before the dialog is opened again, the dialog itself is only built once.
+        """
+        self.success = False
+        self.pending = None
+        self.button_ok.setEnabled(True)
+
+        # GET SELECTED ROWS, the name is only shown for a single one
+        self.student_ids = main_window.selected_ids()
+        if len(self.student_ids) == 1:
+            # The selected row, which need not be the current one, read by id like the edit dialog does
+            found: list[Student] = StudentRepository().get(self.student_ids)
+            self.label_question.setText("Are you sure you want to delete this student?")
+            self.label_name.setText((found[0].name or "") if found else f"Student {self.student_ids[0]}")
+        else:
+            self.label_question.setText("Are you sure you want to delete these students?")
+            self.label_name.setText(f"{len(self.student_ids)} students")
+
     def cancel(self) -> None:
         """
         This function is triggered when the cancel button is clicked. It closes the window.
@@ -628,36 +2647,234 @@ class DeleteDialog(QDialog):
 
         if button == QMessageBox.StandardButton.Ok:
             self.delete()
-            confirmation_widget = QMessageBox()
-            confirmation_widget.setText(
-                'The record has been deleted successfully.')
-            confirmation_widget.exec()
         else:
             self.close()
 
     def delete(self) -> None:
         """
-        This function is used to delete a student record from the database.
+        This function is used to delete a student record from the database. The delete is queued on the writer of the main window and the dialog stays open, with the delete button disabled, until deleted or delete_failed is called back once the batch is committed.
         """
-        try:
-            connection = connection = DatabaseConnection().connect()
+        with span("dialog.delete.submit"):
+            try:
+                student_ids: list[int] = self.student_ids
+                future: Future = main_window.writer.delete(student_ids)
+            except RuntimeError as e:
+                self.success = False
+                print(e)
+                self.close()
+                return
+            self.pending = future
+            self.button_ok.setEnabled(False)
+            main_window.when_written(future, partial(self.deleted, future, student_ids),
+                                     partial(self.delete_failed, future))
+
+    def deleted(self, future: Future, student_ids: list[int], count: int) -> list[int]:
+        """
+        This function is called back once the delete is committed. It removes the rows from the table, closes the dialog and confirms the delete, and returns the ids it patched.
+        """
+        patched: list[int] = main_window.patch_deleted(student_ids)
+        if future is self.pending:
+            self.pending = None
+            self.button_ok.setEnabled(True)
+            self.success = True
+            self.close()
+            self.confirm_deleted(count)
+        return patched
 
-            cursor = connection.cursor()
+    def delete_failed(self, future: Future, message: str) -> None:
+        """
+        This function is called back when the delete could not be saved, it shows why and closes the dialog.
+        """
+        if future is not self.pending:
+            main_window.statusbar.showMessage(f"A delete could not be saved: {message}", 10000)
+            return
+        self.pending = None
+        self.button_ok.setEnabled(True)
+        self.success = False
+        QMessageBox.warning(self, "Deleting Failed", message)
+        self.close()
 
-            cursor.execute(
-                f"DELETE FROM students WHERE id={self.student_id}")
+    def confirm_deleted(self, count: int) -> None:
+        """
+        This function tells the user that the delete is committed, count is the number of students it deleted.
+        """
+        confirmation_widget = QMessageBox()
+        confirmation_widget.setText('The record has been deleted successfully.' if count == 1 else
+                                    f'{count} records have been deleted successfully.')
+        confirmation_widget.exec()
 
-            connection.commit()
 
-        except sqlite3.Error as e:
-            self.success = False
-            print(e)
-        else:
-            self.success = True
-        finally:
-            cursor.close()
-            connection.close()
-            self.close()
+class CourseDialog(QDialog):
+    """
+    This class is used to move the selected student records to another course in one step.
+
+    Attributes:
+    student_ids (list[int]): The IDs of the selected student records.
+    course (str): The course the students are moved to.
+    pending (Optional[Future]): The queued course change, resolves to the number of moved students once committed.
+
+    Methods:
+    reset(self) -> None: This function takes the selected rows of the table.
+    cancel(self) -> None: This function is triggered when the cancel button is clicked. It closes the window.
+    submit(self) -> None: This function is used to move the selected students to the picked course.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.success: bool = False
+        self.pending: Optional[Future] = None
+        self.course: str = ""
+        self.setWindowTitle("Set Course")
+        self.setFixedWidth(300)
+        self.setFixedHeight(200)
+
+        # CREATE LAYOUT
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        self.student_ids: list[int] = []
+
+        # CREATE LABELS
+        self.label_course = QLabel()
+
+        # CREATE DROP DOWN MENU
+        self.course_name = QComboBox()
+        self.course_name.setModel(main_window.course_model)
+
+        # CREATE BUTTONS
+        self.button_ok = QPushButton("Update")
+        self.button_cancel = QPushButton("Cancel")
+        self.button_ok.clicked.connect(self.submit)
+        self.button_cancel.clicked.connect(self.cancel)
+
+        # ADD INPUTS TO LAYOUT
+        layout.addWidget(self.label_course)
+        layout.addWidget(self.course_name)
+
+        layout.addStretch()  # to push buttons down
+        layout.addWidget(self.button_ok)
+        layout.addWidget(self.button_cancel)
+
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        This function takes the selected rows of the table before the dialog is opened again, the dialog itself is only built once.
+        """
+        self.success = False
+        self.pending = None
+        self.course = ""
+
+        # GET SELECTED ROWS
+        self.student_ids = main_window.selected_ids()
+        count: int = len(self.student_ids)
+        self.label_course.setText(f"Move {count} student{'s' if count != 1 else ''} to:")
+        self.course_name.setCurrentIndex(main_window.course_model.first_offered())
+
+    def cancel(self) -> None:
+        """
+        This function is triggered when the cancel button is clicked. It closes the window.
+        """
+        self.close()
+
+    def submit(self) -> None:
+        """
+        This function is used to move the selected students to the picked course, all of them in one transaction.
+        """
+        with span("dialog.course.submit"):
+            try:
+                course: str = self.course_name.currentText()
+                student_ids: list[int] = self.student_ids
+                self.course = course
+                self.pending = main_window.writer.set_course(student_ids, course)
+                main_window.when_written(self.pending, lambda moved: main_window.patch_course(student_ids, course))
+
+            except (sqlite3.Error, RuntimeError) as e:
+                self.success = False
+                print(e)
+            else:
+                self.success = True
+            finally:
+                self.close()
+
+
+class CoursesDialog(QDialog):
+    """
+    This class is used to administer the courses: add a course, retire one that is no longer offered, or offer a retired course again. Retiring keeps the course for the students who are in it, it is only no longer offered for new students. Courses are never deleted, so no student loses theirs.
+
+    Attributes:
+    courses_list (QListWidget): The courses with the number of students in each, retired ones marked.
+    changed (bool): Whether a course was added, retired or offered again while the dialog was open.
+
+    Methods:
+    refresh(self) -> None: This function reads the courses again and fills the list.
+    add_course(self) -> None: This function asks for the name of a new course and adds it.
+    retire_course(self, retired: bool) -> None: This function retires the selected course, or offers it again.
+    """
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.changed: bool = False
+        self.repository = StudentRepository()
+        self.setWindowTitle("Courses")
+        self.setMinimumSize(320, 360)
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        self.courses_list = QListWidget()
+        layout.addWidget(self.courses_list)
+
+        # CREATE BUTTONS
+        self.button_add = QPushButton("Add Course...")
+        self.button_retire = QPushButton("Retire")
+        self.button_offer = QPushButton("Offer Again")
+        self.button_close = QPushButton("Close")
+        self.button_add.clicked.connect(self.add_course)
+        self.button_retire.clicked.connect(lambda: self.retire_course(True))
+        self.button_offer.clicked.connect(lambda: self.retire_course(False))
+        self.button_close.clicked.connect(self.close)
+        self.courses_list.currentItemChanged.connect(self._update_buttons)
+
+        for button in (self.button_add, self.button_retire, self.button_offer, self.button_close):
+            layout.addWidget(button)
+        self.refresh()
+
+    def refresh(self) -> None:
+        counts: dict[Optional[str], int] = self.repository.course_counts()
+        self.courses_list.clear()
+        for course in self.repository.courses():
+            students: int = counts.get(course.name, 0)
+            item = QListWidgetItem(f"{course.name} ({students} student{'s' if students != 1 else ''})"
+                                   + (", retired" if course.retired else ""))
+            item.setData(Qt.ItemDataRole.UserRole, course)
+            self.courses_list.addItem(item)
+        self._update_buttons()
+
+    def add_course(self) -> None:
+        name, accepted = QInputDialog.getText(self, "Add Course", "Name of the new course:")
+        if not accepted:
+            return
+        try:
+            self.repository.add_course(name)
+        except (sqlite3.Error, ValueError) as e:
+            QMessageBox.warning(self, "Add Course", str(e))
+            return
+        self.changed = True
+        self.refresh()
+
+    def retire_course(self, retired: bool) -> None:
+        item: Optional[QListWidgetItem] = self.courses_list.currentItem()
+        if item is None:
+            return
+        self.repository.retire_course(item.data(Qt.ItemDataRole.UserRole).name, retired)
+        self.changed = True
+        self.refresh()
+
+    def _update_buttons(self) -> None:
+        item: Optional[QListWidgetItem] = self.courses_list.currentItem()
+        course: Optional[Course] = item.data(Qt.ItemDataRole.UserRole) if item is not None else None
+        self.button_retire.setEnabled(course is not None and not course.retired)
+        self.button_offer.setEnabled(course is not None and course.retired)
 
 
 class AboutDialog(QDialog):
@@ -686,8 +2903,189 @@ class AboutDialog(QDialog):
         self.layout().addWidget(self.button_ok)
 
 
+class StatisticsDialog(QDialog):
+    """
+    This class is used to show the enrollment statistics: how many students every course has, their share of the total and the latest changes to students. The headcounts are read from the course_counts summary table, one row per course, so opening or refreshing the dashboard costs the same for ten students as for ten million.
+
+    Attributes:
+    courses_table (QTableWidget): The table with a row per course, largest first.
+    changes_table (QTableWidget): The table with the latest changes, newest first.
+    label_total (QLabel): The total number of students.
+
+    Methods:
+    refresh(self) -> None: This function reads the counts and the latest changes again, while the dashboard is shown.
+    """
+
+    COURSE_HEADERS: tuple[str, ...] = ("Course", "Students", "Share")
+    CHANGE_HEADERS: tuple[str, ...] = ("Change", "ID", "Name", "Course")
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.setWindowTitle("Statistics")
+        self.setMinimumSize(480, 520)
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        self.label_total = QLabel()
+        layout.addWidget(self.label_total)
+
+        self.courses_table = QTableWidget(0, len(self.COURSE_HEADERS))
+        self.courses_table.setHorizontalHeaderLabels(self.COURSE_HEADERS)
+        self.courses_table.verticalHeader().setVisible(False)
+        self.courses_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.courses_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.courses_table)
+
+        layout.addWidget(QLabel("Recent changes"))
+        self.changes_table = QTableWidget(0, len(self.CHANGE_HEADERS))
+        self.changes_table.setHorizontalHeaderLabels(self.CHANGE_HEADERS)
+        self.changes_table.verticalHeader().setVisible(False)
+        self.changes_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.changes_table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.changes_table)
+
+        self.button_ok = QPushButton("Close")
+        self.button_ok.clicked.connect(self.close)
+        layout.addWidget(self.button_ok)
+
+    def showEvent(self, event) -> None:
+        self.refresh()
+        super().showEvent(event)
+
+    def refresh(self) -> None:
+        """
+        This function reads the number of students per course and the latest changes and shows them. It does nothing while the dashboard is hidden, it is read again when it is shown.
+        """
+        if not self.isVisible():
+            return
+        with span("dialog.statistics.refresh"):
+            repository = StudentRepository()
+            counts = sorted(repository.course_counts().items(), key=lambda item: -item[1])
+            changes = repository.recent_changes()
+
+            total: int = sum(students for _, students in counts)
+            self.label_total.setText(f"{total} students in {len(counts)} courses")
+            self.courses_table.setRowCount(len(counts))
+            for row, (course, students) in enumerate(counts):
+                values = (course or "(no course)", str(students), f"{students / total:.1%}")
+                for column, value in enumerate(values):
+                    self.courses_table.setItem(row, column, self._item(value, column > 0))
+
+            self.changes_table.setRowCount(len(changes))
+            for row, change in enumerate(changes):
+                student = change.student
+                values = (str(change.seq), str(change.student_id),
+                          "(deleted)" if student is None else student.name or "",
+                          "" if student is None else student.course or "")
+                for column, value in enumerate(values):
+                    self.changes_table.setItem(row, column, self._item(value, column < 2))
+
+    @staticmethod
+    def _item(text: str, numeric: bool) -> QTableWidgetItem:
+        item = QTableWidgetItem(text)
+        if numeric:
+            item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        return item
+
+
+class PerformanceDialog(QDialog):
+    """
+    This class is used to show how long the instrumented operations took. For every operation it lists how often it ran and the 50th, 95th and 99th percentile of its last durations, refreshed every second while the panel is visible.
+
+    Attributes:
+    REFRESH_MS (int): The time between two refreshes of the table.
+    table (QTableWidget): The table with a row per operation, slowest 95th percentile first.
+    label_cache (QLabel): The hits and misses of the search cache of the main window.
+
+    Methods:
+    refresh(self) -> None: This function reads the percentiles again and fills the table.
+    reset(self) -> None: This function forgets every duration measured so far.
+    """
+
+    REFRESH_MS: int = 1000
+    HEADERS: tuple[str, ...] = ("Operation", "Count", "p50 ms", "p95 ms", "p99 ms")
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.setWindowTitle("Performance")
+        self.setMinimumSize(560, 400)
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        if not instrumentation.enabled:
+            layout.addWidget(QLabel(f"Profiling is off. Start the application with {instrumentation.PROFILE_ENV}=1 "
+                                    f"to measure, and {instrumentation.LOG_ENV}=file to also log every measurement."))
+
+        self.table = QTableWidget(0, len(self.HEADERS))
+        self.table.setHorizontalHeaderLabels(self.HEADERS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.table)
+        self.label_cache = QLabel()
+        layout.addWidget(self.label_cache)
+
+        self.button_reset = QPushButton("Reset")
+        self.button_reset.clicked.connect(self.reset)
+        self.button_ok = QPushButton("Close")
+        self.button_ok.clicked.connect(self.close)
+        layout.addWidget(self.button_reset)
+        layout.addWidget(self.button_ok)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.REFRESH_MS)
+        self.timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event) -> None:
+        self.refresh()
+        self.timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event) -> None:
+        self.timer.stop()
+        super().hideEvent(event)
+
+    def refresh(self) -> None:
+        """
+        This function reads the percentiles of every operation and shows them, slowest 95th percentile first.
+        """
+        report = sorted(instrumentation.recorder.percentiles().items(), key=lambda item: -item[1]["p95"])
+        self.table.setRowCount(len(report))
+        for row, (operation, stats) in enumerate(report):
+            values = (operation, str(stats["count"]), *(f"{stats[name]:.2f}" for name in ("p50", "p95", "p99")))
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if column:
+                    item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                self.table.setItem(row, column, item)
+
+        cache: SearchCache = main_window.search_cache
+        self.label_cache.setText(f"Search cache: {cache.hits} hits, {cache.misses} misses, {cache.invalidated} "
+                                 f"results dropped after writes, {len(cache)} of {cache.MAX_ENTRIES} searches kept")
+
+    def reset(self) -> None:
+        """
+        This function forgets every duration measured so far, for example before repeating a slow action.
+        """
+        instrumentation.recorder.clear()
+        self.refresh()
+
+
 # Standurd setup
-app = QApplication(sys.argv)
-main_window = MainWindow()
-main_window.show()
-sys.exit(app.exec())
+if __name__ == "__main__":
+    app = QApplication(sys.argv)
+    main_window = MainWindow()
+    if "--startup-probe" in sys.argv:
+        probe = StartupProbe(main_window)
+        probe.finished.connect(lambda: (print(probe.report(), flush=True), app.quit()))
+    main_window.show()
+    # Staged startup, the rows stream in after the first paint
+    QTimer.singleShot(0, main_window.load_data)
+    app.aboutToQuit.connect(main_window.executor.shutdown)
+    # Commits whatever the dialogs still have queued
+    app.aboutToQuit.connect(main_window.writer.close)
+    app.aboutToQuit.connect(main_window.change_feed.close)
+    app.aboutToQuit.connect(main_window.search_cache.close)
+    app.aboutToQuit.connect(main_window.student_cache.close)
+    app.aboutToQuit.connect(DatabaseConnection.close_all)
+    sys.exit(app.exec())
@@ -0,0 +1,287 @@
+import sqlite3
+from typing import Iterable, NamedTuple, Optional
+
+from database import DatabaseConnection
+from instrumentation import timed
+from schema import (NAME_SEARCH_LIMIT, course_id, course_ids, delete_students, insert_students, name_search_query,
+                    search_query, set_course)
+
+# Stay below the default limit of 999 bound parameters per statement
+MAX_PARAMS: int = 900
+# From this many rows on, add, delete and set_course go through the schema functions that suspend the per-row
+# triggers. Below it the trigger changes, which make other connections prepare their statements again, cost more.
+BULK_ROWS: int = 1000
+RECENT_CHANGES: int = 20
+
+
+class Student(NamedTuple):
+    """
+    One row of the students table. It is a plain tuple underneath, so it can be used wherever rows are.
+    """
+    id: int
+    name: Optional[str]
+    course: Optional[str]
+    mobile: Optional[int]
+
+
+class Course(NamedTuple):
+    """
+    One row of the courses table. A retired course keeps its students but is no longer offered for new ones.
+    """
+    id: int
+    name: str
+    retired: bool
+
+
+class Change(NamedTuple):
+    """
+    One entry of the changelog, with the student as it is now. The student is None once it was deleted.
+    """
+    seq: int
+    student_id: int
+    student: Optional[Student]
+
+
+class StudentRepository:
+    """
+    Reads and writes students without any user interface.
+
+    All SQL that changes students lives here, the dialogs of the GUI, the command line tool and scripts all go
+    through it. Every method takes any number of students and runs in a single transaction, so a batch is applied
+    completely or not at all.
+
+    Attributes:
+    database (DatabaseConnection): The database the students are kept in.
+
+    Methods:
+    add(self, students) -> list[Student]: Inserts (name, course, mobile) rows and returns them with their ids.
+    get(self, ids) -> list[Student]: Reads the students with the given ids.
+    search(self, name, course, mobile, limit) -> list[Student]: Reads the students whose fields equal the given ones.
+    match_name(self, text, limit) -> list[Student]: Reads the students whose name matches text as it is typed.
+    page(self, after, limit, name, course, mobile) -> list[Student]: Reads the next page of students in id order.
+    update(self, students) -> int: Writes every field of the given students and returns how many were found.
+    get_versioned(self, student_id) -> Optional[tuple[Student, int]]: Reads a student with the version of its row.
+    update_versioned(self, student, version) -> bool: Writes a student only if its row still has the given version.
+    set_course(self, ids, course) -> int: Moves the students with the given ids to course and returns how many were found.
+    delete(self, ids) -> int: Deletes the students with the given ids and returns how many were found.
+    count(self) -> int: Returns the number of students.
+    course_counts(self) -> dict[Optional[str], int]: Returns the number of students in every course.
+    recent_changes(self, limit) -> list[Change]: Returns the newest changelog entries, newest first.
+    courses(self) -> list[Course]: Returns every course, retired ones included, by name.
+    add_course(self, name) -> Course: Adds a course.
+    retire_course(self, name, retired) -> bool: Retires a course, or offers a retired one again.
+    """
+
+    def __init__(self, database: Optional[DatabaseConnection] = None) -> None:
+        self.database: DatabaseConnection = database or DatabaseConnection()
+        # Course name -> id, read again when a name is missing, since courses are added but never removed
+        self._course_ids: dict[str, int] = {}
+
+    @timed("repository.add")
+    def add(self, students: Iterable[tuple[str, str, int]]) -> list[Student]:
+        """
+        This function inserts the (name, course, mobile) rows and returns them as Students with their new ids.
+        """
+        rows: list[tuple] = [tuple(student) for student in students]
+        with self.database.connect() as connection:
+            if len(rows) < BULK_ROWS:
+                return [Student(connection.execute(
+                    "INSERT INTO students (name, course_id, mobile) VALUES (?,?,?)",
+                    (name, self._course_id(connection, course), mobile)).lastrowid, name, course, mobile)
+                    for name, course, mobile in rows]
+
+            # Ids are handed out in order, and once the write lock is taken nobody else can insert until the commit, so
+            # every id above the highest one read here is one of these rows. Inside a StudentWriter batch the
+            # connection already holds the write lock.
+            if not connection.in_transaction:
+                connection.execute("BEGIN IMMEDIATE")
+            first_id: int = connection.execute("SELECT coalesce(max(id), 0) FROM students").fetchone()[0]
+            insert_students(connection, rows)
+            return [Student(*row) for row in connection.execute(
+                "SELECT id, name, course, mobile FROM student_rows WHERE id > ? ORDER BY id", (first_id,))]
+
+    @timed("repository.get")
+    def get(self, ids: Iterable[int]) -> list[Student]:
+        """
+        This function reads the students with the given ids, in id order. Unknown ids are skipped.
+        """
+        ids = list(ids)
+        found: list[Student] = []
+        with self.database.connect() as connection:
+            for start in range(0, len(ids), MAX_PARAMS):
+                chunk = ids[start:start + MAX_PARAMS]
+                found.extend(Student(*row) for row in connection.execute(
+                    f"SELECT id, name, course, mobile FROM student_rows WHERE id IN ({','.join('?' * len(chunk))})",
+                    chunk))
+        return sorted(found)
+
+    @timed("repository.search")
+    def search(self, name: Optional[str] = None, course: Optional[str] = None, mobile: Optional[int] = None,
+               limit: Optional[int] = None) -> list[Student]:
+        """
+        This function reads the students whose fields equal every given one, None means the field is not searched.
+        """
+        sql, params = search_query(name, course, mobile)
+        if limit is not None:
+            sql += " LIMIT ?"
+            params += (limit,)
+        with self.database.connect() as connection:
+            return [Student(*row) for row in connection.execute(sql, params)]
+
+    @timed("repository.match_name")
+    def match_name(self, text: str, limit: int = NAME_SEARCH_LIMIT) -> list[Student]:
+        """
+        This function reads the students with a name word starting with each word of text, best matches first.
+        """
+        query = name_search_query(text, limit)
+        if query is None:
+            return []
+        with self.database.connect() as connection:
+            return [Student(*row) for row in connection.execute(*query)]
+
+    @timed("repository.page")
+    def page(self, after: int = 0, limit: int = NAME_SEARCH_LIMIT, name: Optional[str] = None,
+             course: Optional[str] = None, mobile: Optional[int] = None) -> list[Student]:
+        """
+        This function reads up to limit students with an id above after, in id order, that equal every given field
+        like search. Passing the id of the last student as after reads the next page, which costs the same however
+        deep it is.
+        """
+        sql, params = search_query(name, course, mobile)
+        sql += f" {'AND' if params else 'WHERE'} id > ? ORDER BY id LIMIT ?"
+        with self.database.connect() as connection:
+            return [Student(*row) for row in connection.execute(sql, params + (after, limit))]
+
+    @timed("repository.update")
+    def update(self, students: Iterable[tuple[int, str, str, int]]) -> int:
+        """
+        This function writes the name, course and mobile of every given (id, name, course, mobile) row and returns
+        how many of the ids existed.
+        """
+        with self.database.connect() as connection:
+            return connection.executemany(
+                "UPDATE students SET name=?, course_id=?, mobile=?, version=version+1 WHERE id=?",
+                ((name, self._course_id(connection, course), mobile, student_id)
+                 for student_id, name, course, mobile in students)).rowcount
+
+    @timed("repository.get_versioned")
+    def get_versioned(self, student_id: int) -> Optional[tuple[Student, int]]:
+        """
+        This function reads the student with the given id together with the version of its row, or returns None if
+        there is no such student. Pass the version to update_versioned to write the student back.
+        """
+        with self.database.connect() as connection:
+            row = connection.execute("SELECT id, name, course, mobile, version FROM student_rows WHERE id=?",
+                                     (student_id,)).fetchone()
+        return None if row is None else (Student(*row[:4]), row[4])
+
+    @timed("repository.update_versioned")
+    def update_versioned(self, student: tuple[int, str, str, int], version: int) -> bool:
+        """
+        This function writes the name, course and mobile of the (id, name, course, mobile) row only if the row still
+        has the given version, that is nobody changed or deleted it since it was read. It returns whether it wrote.
+        """
+        student_id, name, course, mobile = student
+        with self.database.connect() as connection:
+            return connection.execute(
+                "UPDATE students SET name=?, course_id=?, mobile=?, version=version+1 WHERE id=? AND version=?",
+                (name, self._course_id(connection, course), mobile, student_id, version)).rowcount == 1
+
+    @timed("repository.set_course")
+    def set_course(self, ids: Iterable[int], course: Optional[str]) -> int:
+        """
+        This function moves the students with the given ids to course and returns how many of them existed.
+        """
+        ids = list(ids)
+        with self.database.connect() as connection:
+            if len(ids) >= BULK_ROWS:
+                return set_course(connection, ids, course)
+            new_course_id: Optional[int] = self._course_id(connection, course)
+            return connection.executemany("UPDATE students SET course_id=?, version=version+1 WHERE id=?",
+                                          ((new_course_id, student_id) for student_id in ids)).rowcount
+
+    @timed("repository.delete")
+    def delete(self, ids: Iterable[int]) -> int:
+        """
+        This function deletes the students with the given ids and returns how many of them existed.
+        """
+        ids = list(ids)
+        with self.database.connect() as connection:
+            if len(ids) >= BULK_ROWS:
+                return delete_students(connection, ids)
+            return connection.executemany("DELETE FROM students WHERE id=?",
+                                          ((student_id,) for student_id in ids)).rowcount
+
+    @timed("repository.count")
+    def count(self) -> int:
+        """
+        This function returns the number of students, added up from the course counts instead of counting the table.
+        """
+        with self.database.connect() as connection:
+            return connection.execute("SELECT coalesce(sum(students), 0) FROM course_counts").fetchone()[0]
+
+    @timed("repository.course_counts")
+    def course_counts(self) -> dict[Optional[str], int]:
+        """
+        This function returns the number of students in every course that has any, None for students without a
+        course. It reads the course_counts summary table, so it costs one row per course whatever the roster size.
+        """
+        with self.database.connect() as connection:
+            return {course: students for course, students in connection.execute(
+                "SELECT courses.name, course_counts.students FROM course_counts "
+                "LEFT JOIN courses ON courses.id = course_counts.course_id "
+                "WHERE course_counts.students > 0 ORDER BY courses.name")}
+
+    @timed("repository.recent_changes")
+    def recent_changes(self, limit: int = RECENT_CHANGES) -> list[Change]:
+        """
+        This function returns the newest limit entries of the changelog, newest first, with the students as they are
+        now.
+        """
+        with self.database.connect() as connection:
+            return [Change(seq, student_id, Student(*row) if row[0] is not None else None)
+                    for seq, student_id, *row in connection.execute(
+                        "SELECT student_changes.seq, student_changes.student_id, "
+                        "students.id, students.name, students.course, students.mobile FROM student_changes "
+                        "LEFT JOIN student_rows AS students ON students.id = student_changes.student_id "
+                        "ORDER BY student_changes.seq DESC LIMIT ?", (limit,))]
+
+    @timed("repository.courses")
+    def courses(self) -> list[Course]:
+        """
+        This function returns every course, retired ones included, ordered by name.
+        """
+        with self.database.connect() as connection:
+            return [Course(course_id, name, bool(retired)) for course_id, name, retired in connection.execute(
+                "SELECT id, name, retired FROM courses ORDER BY name")]
+
+    @timed("repository.add_course")
+    def add_course(self, name: str) -> Course:
+        """
+        This function adds a course and returns it. It raises ValueError if the name is empty or a course with that
+        name exists already, whatever its case.
+        """
+        name = name.strip()
+        if not name:
+            raise ValueError("the course name is empty")
+        with self.database.connect() as connection:
+            existing = connection.execute("SELECT name FROM courses WHERE lower(name) = lower(?)", (name,)).fetchone()
+            if existing is not None:
+                raise ValueError(f"the course {existing[0]!r} exists already")
+            return Course(connection.execute("INSERT INTO courses(name) VALUES (?)", (name,)).lastrowid, name, False)
+
+    @timed("repository.retire_course")
+    def retire_course(self, name: str, retired: bool = True) -> bool:
+        """
+        This function retires a course, so that it is no longer offered for new students, or with retired False
+        offers a retired course again. Its students keep it either way. It returns whether the course exists.
+        """
+        with self.database.connect() as connection:
+            return connection.execute("UPDATE courses SET retired = ? WHERE name = ?",
+                                      (int(retired), name)).rowcount == 1
+
+    def _course_id(self, connection: sqlite3.Connection, course: Optional[str]) -> Optional[int]:
+        # Raises ValueError for a course that does not exist
+        if course is not None and course not in self._course_ids:
+            self._course_ids = course_ids(connection)
+        return course_id(self._course_ids, course)
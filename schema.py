@@ -0,0 +1,618 @@
+import itertools
+import json
+import re
+import sqlite3
+from typing import Any, Iterable, NamedTuple, Optional
+
+# The courses a new database starts with, after that the courses table is the list of courses
+DEFAULT_COURSES: list[str] = ['Math', 'Physics', 'Chemistry', 'Biology', 'History', 'Science']
+
+# Students refer to their course by id, so a row stores a small integer instead of the course name, and filtering by
+# course is an integer lookup in the (course_id, name) index. A course that is no longer offered is retired rather
+# than deleted: its students keep it, it is only no longer offered for new students.
+# version counts the updates of a row. An edit remembers the version it started from and only writes if the row still
+# has it, so two instances editing the same student cannot silently overwrite each other.
+STUDENT_COLUMNS: str = ("id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, course_id INTEGER REFERENCES courses(id), "
+                        "mobile INTEGER, version INTEGER NOT NULL DEFAULT 0")
+TABLES: list[str] = [
+    "CREATE TABLE IF NOT EXISTS courses(id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, "
+    "retired INTEGER NOT NULL DEFAULT 0)",
+    f"CREATE TABLE IF NOT EXISTS students({STUDENT_COLUMNS})",
+]
+# Students with the name of their course, which is what every query reads. Writes go to the students table. A
+# condition on course that no NULL passes, such as course = ? or course >= '', lets sqlite turn the outer join into a
+# lookup of the course by name followed by the (course_id, name) index.
+STUDENT_ROWS_VIEW: str = (
+    "CREATE VIEW IF NOT EXISTS student_rows AS "
+    "SELECT students.id AS id, students.name AS name, courses.name AS course, students.mobile AS mobile, "
+    "students.course_id AS course_id, students.version AS version "
+    "FROM students LEFT JOIN courses ON courses.id = students.course_id"
+)
+
+# Index name -> indexed columns. Together they cover every combination of fields the search dialog can produce:
+# (course, name) serves course alone, course + name and anything with both, mobile and name serve the rest.
+INDEXES: dict[str, tuple[str, ...]] = {
+    "students_name": ("name",),
+    "students_course_name": ("course_id", "name"),
+    "students_mobile": ("mobile",),
+}
+
+SEARCH_FIELDS: tuple[str, ...] = ("name", "course", "mobile")
+
+# Full text index over student names for the filter bar. It is an external content table, so it stores only the index
+# and reads names from students, the triggers keep it in sync with every insert, update and delete. The prefix option
+# adds dedicated indexes for 1 to 3 character prefixes, which are the ones typed most while the user is still typing.
+NAME_SEARCH_TABLE: str = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS students_fts USING fts5("
+    "name, content='students', content_rowid='id', prefix='1 2 3')"
+)
+NAME_SEARCH_TRIGGERS: list[str] = [
+    """CREATE TRIGGER IF NOT EXISTS students_fts_insert AFTER INSERT ON students BEGIN
+        INSERT INTO students_fts(rowid, name) VALUES (new.id, new.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS students_fts_delete AFTER DELETE ON students BEGIN
+        INSERT INTO students_fts(students_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS students_fts_update AFTER UPDATE OF name ON students BEGIN
+        INSERT INTO students_fts(students_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO students_fts(rowid, name) VALUES (new.id, new.name);
+    END""",
+]
+# Every insert, update and delete of a student appends the id to student_changes. Readers that keep rows in memory
+# remember the last seq they have seen and only re-read the ids logged after it. Old entries are pruned on exit.
+CHANGELOG_TABLE: str = (
+    "CREATE TABLE IF NOT EXISTS student_changes(seq INTEGER PRIMARY KEY AUTOINCREMENT, student_id INTEGER NOT NULL)"
+)
+CHANGELOG_TRIGGERS: list[str] = [
+    """CREATE TRIGGER IF NOT EXISTS students_log_insert AFTER INSERT ON students BEGIN
+        INSERT INTO student_changes(student_id) VALUES (new.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS students_log_update AFTER UPDATE ON students BEGIN
+        INSERT INTO student_changes(student_id) VALUES (old.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS students_log_delete AFTER DELETE ON students BEGIN
+        INSERT INTO student_changes(student_id) VALUES (old.id);
+    END""",
+]
+CHANGELOG_KEEP: int = 10000
+# Headcount per course, kept up to date by triggers so that statistics read one row per course instead of counting the
+# students table. Students without a course are counted under 0. Courses that lost every student keep a zero row.
+COURSE_COUNTS_TABLE: str = (
+    "CREATE TABLE IF NOT EXISTS course_counts(course_id INTEGER PRIMARY KEY, students INTEGER NOT NULL)"
+)
+COURSE_COUNTS_TRIGGERS: list[str] = [
+    """CREATE TRIGGER IF NOT EXISTS course_counts_insert AFTER INSERT ON students BEGIN
+        INSERT INTO course_counts(course_id, students) VALUES (ifnull(new.course_id, 0), 1)
+            ON CONFLICT(course_id) DO UPDATE SET students = students + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS course_counts_delete AFTER DELETE ON students BEGIN
+        UPDATE course_counts SET students = students - 1 WHERE course_id = ifnull(old.course_id, 0);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS course_counts_update AFTER UPDATE OF course_id ON students
+        WHEN old.course_id IS NOT new.course_id BEGIN
+        UPDATE course_counts SET students = students - 1 WHERE course_id = ifnull(old.course_id, 0);
+        INSERT INTO course_counts(course_id, students) VALUES (ifnull(new.course_id, 0), 1)
+            ON CONFLICT(course_id) DO UPDATE SET students = students + 1;
+    END""",
+]
+
+NAME_SEARCH_LIMIT: int = 200
+NAME_SEARCH_CANDIDATES: int = 2000
+
+# Table column -> the columns the main table is ordered by when it is sorted by that column, id last so that the order
+# is total. The course is followed by the name, which is the order the (course, name) index keeps.
+COLUMNS: tuple[str, ...] = ("id", "name", "course", "mobile")
+SORT_KEYS: dict[int, tuple[str, ...]] = {
+    0: ("id",),
+    1: ("name", "id"),
+    2: ("course", "name", "id"),
+    3: ("mobile", "id"),
+}
+
+
+def ensure_schema(connection: sqlite3.Connection) -> None:
+    """
+    This function creates the tables and indexes that are missing. Statistics are refreshed with ANALYZE whenever an
+    index had to be created (or were never gathered), so the planner knows how selective each index is. A students
+    table that still stores course names is migrated to course ids first, see migrate_courses.
+    """
+    existing: set[str] = {row[0] for row in connection.execute("SELECT name FROM sqlite_master")}
+    has_stats: bool = "sqlite_stat1" in existing
+
+    for statement in TABLES:
+        connection.execute(statement)
+    if "courses" not in existing:
+        connection.executemany("INSERT OR IGNORE INTO courses(name) VALUES (?)",
+                               ((course,) for course in DEFAULT_COURSES))
+    columns: set[str] = {row[1] for row in connection.execute("PRAGMA table_info(students)")}
+    if "version" not in columns:
+        # Adding a column with a constant default only rewrites the schema, not the rows
+        connection.execute("ALTER TABLE students ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    if "course_id" not in columns:
+        migrate_courses(connection)
+        existing.discard("course_counts")
+    connection.execute(STUDENT_ROWS_VIEW)
+
+    connection.execute(CHANGELOG_TABLE)
+    for statement in CHANGELOG_TRIGGERS:
+        connection.execute(statement)
+
+    connection.execute(NAME_SEARCH_TABLE)
+    for statement in NAME_SEARCH_TRIGGERS:
+        connection.execute(statement)
+    if "students_fts" not in existing:
+        # Index the rows that were there before the full text table existed
+        connection.execute("INSERT INTO students_fts(students_fts) VALUES ('rebuild')")
+
+    connection.execute(COURSE_COUNTS_TABLE)
+    if "course_counts" not in existing:
+        # Count the rows that were there before the triggers, the only time the whole table is counted
+        connection.execute("INSERT INTO course_counts(course_id, students) "
+                           "SELECT ifnull(course_id, 0), count(*) FROM students GROUP BY 1")
+    for statement in COURSE_COUNTS_TRIGGERS:
+        connection.execute(statement)
+
+    if create_indexes(connection) or not has_stats:
+        connection.execute("ANALYZE")
+    connection.commit()
+
+
+def migrate_courses(connection: sqlite3.Connection) -> None:
+    """
+    This function moves a students table that stores the course name in every row to course ids, inside the caller's
+    transaction. Course names that are not in the courses table yet are added to it. The table is copied once into
+    the new layout and renamed, the way sqlite recommends for changing a column, which also drops the indexes and
+    triggers of the old table, and the course counts, which are kept by course name there, so ensure_schema creates
+    them again. Ids, names and versions stay as they were, so the full text index and the changelog stay valid.
+    """
+    if not connection.in_transaction:
+        connection.execute("BEGIN IMMEDIATE")
+    # Students without a course were counted under '' before, they get no course id
+    connection.execute("INSERT OR IGNORE INTO courses(name) "
+                       "SELECT DISTINCT course FROM students WHERE course IS NOT NULL AND course != ''")
+    # Deleted students may have had higher ids than the last one left, ids are never handed out twice
+    sequence: int = connection.execute(
+        "SELECT coalesce((SELECT seq FROM sqlite_sequence WHERE name = 'students'), 0)").fetchone()[0]
+    connection.execute("DROP TABLE IF EXISTS students_migrated")
+    connection.execute(f"CREATE TABLE students_migrated({STUDENT_COLUMNS})")
+    connection.execute("INSERT INTO students_migrated(id, name, course_id, mobile, version) "
+                       "SELECT students.id, students.name, courses.id, students.mobile, students.version "
+                       "FROM students LEFT JOIN courses ON courses.name = students.course ORDER BY students.id")
+    connection.execute("DROP TABLE students")
+    connection.execute("ALTER TABLE students_migrated RENAME TO students")
+    connection.execute("UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = 'students'", (sequence,))
+    connection.execute("DROP TABLE IF EXISTS course_counts")
+
+
+def course_ids(connection: sqlite3.Connection) -> dict[str, int]:
+    """
+    This function returns the id of every course, retired ones included, by name.
+    """
+    return dict(connection.execute("SELECT name, id FROM courses"))
+
+
+def course_id(ids: dict[str, int], course: Optional[str]) -> Optional[int]:
+    """
+    This function returns the id of a course from the mapping of course_ids, None for no course. It raises ValueError
+    for a course that does not exist.
+    """
+    if course is None:
+        return None
+    found: Optional[int] = ids.get(course)
+    if found is None:
+        raise ValueError(f"unknown course {course!r}")
+    return found
+
+
+def create_indexes(connection: sqlite3.Connection) -> bool:
+    """
+    This function creates the INDEXES that are missing and tells whether it created any. Statistics are left to the
+    caller.
+    """
+    existing: set[str] = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    created: bool = False
+    for index, columns in INDEXES.items():
+        if index not in existing:
+            connection.execute(f"CREATE INDEX IF NOT EXISTS {index} ON students({', '.join(columns)})")
+            created = True
+    return created
+
+
+def drop_indexes(connection: sqlite3.Connection) -> None:
+    """
+    This function drops the INDEXES, so a large import does not pay for keeping them sorted row by row. Building an
+    index once over the finished table is several times cheaper. Searches still work in between, only slower.
+    """
+    for index in INDEXES:
+        connection.execute(f"DROP INDEX IF EXISTS {index}")
+
+
+def prune_changes(connection: sqlite3.Connection, keep: int = CHANGELOG_KEEP) -> None:
+    """
+    This function drops all but the newest keep entries of the changelog. Readers that fall further behind than that
+    notice the gap and read everything again.
+    """
+    connection.execute("DELETE FROM student_changes WHERE seq <= (SELECT max(seq) FROM student_changes) - ?", (keep,))
+    connection.commit()
+
+
+def insert_students(connection: sqlite3.Connection, rows: Iterable[tuple]) -> int:
+    """
+    This function inserts many (name, course, mobile) rows inside the caller's transaction and returns how many. It
+    raises ValueError, and inserts nothing, if a row names a course that does not exist.
+
+    The full text, changelog and course count insert triggers are dropped for the duration and their work is done for
+    all new rows with one statement each afterwards. Through the triggers every row pays for two extra statements and the
+    full text index flushes a tiny segment per row, which makes large imports several times slower. The triggers are
+    created again before returning, and since all of this happens in the caller's write transaction no other
+    connection ever sees the table without them. If the caller has no transaction open, one is begun here and taking
+    the write lock comes first: dropping a trigger does not begin a transaction on its own, and the highest id has to
+    be read while nobody else can insert.
+    """
+    if not connection.in_transaction:
+        connection.execute("BEGIN IMMEDIATE")
+    # The insert trigger is the first statement of each list
+    suspended: dict[str, str] = {"students_fts_insert": NAME_SEARCH_TRIGGERS[0],
+                                 "students_log_insert": CHANGELOG_TRIGGERS[0],
+                                 "course_counts_insert": COURSE_COUNTS_TRIGGERS[0]}
+    ids: dict[str, int] = course_ids(connection)
+    rows = [(name, course_id(ids, course), mobile) for name, course, mobile in rows]
+    first_id: int = connection.execute("SELECT coalesce(max(id), 0) FROM students").fetchone()[0]
+    for trigger in suspended:
+        connection.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    try:
+        cursor = connection.executemany("INSERT INTO students (name, course_id, mobile) VALUES (?,?,?)", rows)
+        connection.execute("INSERT INTO students_fts(rowid, name) SELECT id, name FROM students WHERE id > ?",
+                           (first_id,))
+        connection.execute("INSERT INTO student_changes(student_id) SELECT id FROM students WHERE id > ?",
+                           (first_id,))
+        connection.execute("INSERT INTO course_counts(course_id, students) "
+                           "SELECT ifnull(course_id, 0), count(*) FROM students WHERE id > ? GROUP BY 1 "
+                           "ON CONFLICT(course_id) DO UPDATE SET students = students + excluded.students", (first_id,))
+    finally:
+        for statement in suspended.values():
+            connection.execute(statement)
+    return cursor.rowcount
+
+
+def select_ids(connection: sqlite3.Connection, ids: Iterable[int]) -> None:
+    """
+    This function fills the temporary table selected_ids with ids, replacing what was in it. Statements then join
+    against it instead of binding one parameter per id, which has no limit on the number of ids and lets sqlite walk
+    the primary key in order. The ids are passed as one JSON array, which is about three times faster than an
+    executemany with a row per id.
+    """
+    connection.execute("CREATE TEMP TABLE IF NOT EXISTS selected_ids(id INTEGER PRIMARY KEY)")
+    connection.execute("DELETE FROM temp.selected_ids")
+    connection.execute("INSERT OR IGNORE INTO temp.selected_ids(id) SELECT value FROM json_each(?)",
+                       (json.dumps([int(student_id) for student_id in ids]),))
+
+
+def delete_students(connection: sqlite3.Connection, ids: Iterable[int]) -> int:
+    """
+    This function deletes the students with the given ids inside the caller's transaction and returns how many
+    existed.
+
+    Like insert_students, the full text, changelog and course count delete triggers are dropped for the duration and
+    their work is done for all rows with one statement each, which removes the per-row trigger statements that
+    otherwise make up most of the cost of a large delete.
+    """
+    suspended: dict[str, str] = {"students_fts_delete": NAME_SEARCH_TRIGGERS[1],
+                                 "students_log_delete": CHANGELOG_TRIGGERS[2],
+                                 "course_counts_delete": COURSE_COUNTS_TRIGGERS[1]}
+    select_ids(connection, ids)
+    for trigger in suspended:
+        connection.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    try:
+        connection.execute("INSERT INTO students_fts(students_fts, rowid, name) "
+                           "SELECT 'delete', id, name FROM students WHERE id IN temp.selected_ids")
+        connection.execute("INSERT INTO student_changes(student_id) "
+                           "SELECT id FROM students WHERE id IN temp.selected_ids")
+        _uncount_selected(connection)
+        cursor = connection.execute("DELETE FROM students WHERE id IN temp.selected_ids")
+    finally:
+        for statement in suspended.values():
+            connection.execute(statement)
+    return cursor.rowcount
+
+
+def _uncount_selected(connection: sqlite3.Connection) -> None:
+    # Takes the students in temp.selected_ids off the headcount of their course
+    connection.execute("UPDATE course_counts SET students = students - selected.leaving "
+                       "FROM (SELECT ifnull(course_id, 0) AS course_id, count(*) AS leaving FROM students "
+                       "WHERE id IN temp.selected_ids GROUP BY 1) AS selected "
+                       "WHERE course_counts.course_id = selected.course_id")
+
+
+def set_course(connection: sqlite3.Connection, ids: Iterable[int], course: Optional[str]) -> int:
+    """
+    This function moves the students with the given ids to course inside the caller's transaction and returns how
+    many existed. The name does not change, so the full text index is left alone, and the changelog and course count
+    update triggers are suspended like in delete_students. It raises ValueError for a course that does not exist.
+    """
+    new_course_id: Optional[int] = course_id(course_ids(connection), course)
+    suspended: dict[str, str] = {"students_log_update": CHANGELOG_TRIGGERS[1],
+                                 "course_counts_update": COURSE_COUNTS_TRIGGERS[2]}
+    select_ids(connection, ids)
+    for trigger in suspended:
+        connection.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    try:
+        connection.execute("INSERT INTO student_changes(student_id) "
+                           "SELECT id FROM students WHERE id IN temp.selected_ids")
+        _uncount_selected(connection)
+        cursor = connection.execute("UPDATE students SET course_id = ?, version = version + 1 "
+                                    "WHERE id IN temp.selected_ids", (new_course_id,))
+        connection.execute("INSERT INTO course_counts(course_id, students) VALUES (ifnull(?, 0), ?) "
+                           "ON CONFLICT(course_id) DO UPDATE SET students = students + excluded.students",
+                           (new_course_id, cursor.rowcount))
+    finally:
+        for statement in suspended.values():
+            connection.execute(statement)
+    return cursor.rowcount
+
+
+def search_query(name: Optional[str] = None, course: Optional[str] = None,
+                 mobile: Optional[int] = None) -> tuple[str, tuple]:
+    """
+    This function builds the parameterized search query for the given criteria, None means the field is not searched.
+    """
+    conditions: list[str] = []
+    params: list = []
+
+    for field, value in zip(SEARCH_FIELDS, (name, course, mobile)):
+        if value is not None:
+            conditions.append(f"{field}=?")
+            params.append(value)
+
+    sql: str = "SELECT id, name, course, mobile FROM student_rows"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    return sql, tuple(params)
+
+
+def name_search_query(text: str, limit: int = NAME_SEARCH_LIMIT) -> Optional[tuple[str, tuple]]:
+    """
+    This function builds a ranked full text query for the names that have a word starting with each word of text, so
+    a half typed word already matches. It returns None if text holds no words.
+    """
+    tokens: list[str] = re.findall(r"\w+", text)
+    if not tokens:
+        return None
+
+    # Quoting keeps words such as AND, OR or NEAR from being read as operators
+    match: str = " ".join(f'"{token}"*' for token in tokens)
+    # Computing bm25 for every match of a one letter prefix takes far too long while typing, so a bounded set of
+    # candidates is ranked instead: names that start with the typed text first, then the shortest (closest) names.
+    sql: str = ("SELECT student_rows.id, student_rows.name, student_rows.course, student_rows.mobile "
+                "FROM (SELECT rowid FROM students_fts WHERE students_fts MATCH ? LIMIT ?) AS matches "
+                "JOIN student_rows ON student_rows.id = matches.rowid "
+                "ORDER BY instr(lower(student_rows.name), ?) = 1 DESC, length(student_rows.name), student_rows.id "
+                "LIMIT ?")
+    return sql, (match, NAME_SEARCH_CANDIDATES, " ".join(tokens).lower(), limit)
+
+
+_SORT_POSITIONS: dict[int, tuple[int, ...]] = {column: tuple(COLUMNS.index(name) for name in names)
+                                               for column, names in SORT_KEYS.items()}
+
+
+class _Descending:
+    """
+    Wraps a value so that it sorts the other way round in a sort key.
+    """
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any) -> None:
+        self.value = value
+
+    def __eq__(self, other: "_Descending") -> bool:
+        return self.value == other.value
+
+    def __lt__(self, other: "_Descending") -> bool:
+        return other.value < self.value
+
+
+# Key column -> conditions for a NULL value and for any other value, where IS NULL and IS NOT NULL do not fit. The course
+# of a student is NULL exactly when its course_id is, which the (course_id, name) index finds. course >= '' holds for
+# every course name and, unlike IS NOT NULL, lets sqlite read the courses in name order and the students of each from
+# the index, instead of sorting all students.
+_NULL_TESTS: dict[str, tuple[str, str]] = {"course": ("course_id IS NULL", "course >= ''")}
+
+
+def _null_test(key: str, null: bool) -> str:
+    is_null, not_null = _NULL_TESTS.get(key, (f"{key} IS NULL", f"{key} IS NOT NULL"))
+    return is_null if null else not_null
+
+
+def _escape_like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class TableQuery(NamedTuple):
+    """
+    The order and the column filters of the main table, turned into parameterized keyset queries. It is a NamedTuple
+    rather than a dataclass, so importing schema, which every command of cli.py does, does not load dataclasses.
+
+    A page is read with the conditions "after the last row read" instead of an OFFSET, so sqlite seeks to the row in
+    the index that serves the order and reads PAGE_SIZE entries from there, and the page a million rows down costs the
+    same as the first one. sqlite sorts NULL before any value, so an ascending order starts with the NULLs and a
+    descending one ends with them. Row value comparisons such as (name, id) > (?, ?) are never true for a NULL, so
+    "after" is split into one range per key column instead, deepest first, and the ranges are read one after the other
+    with UNION ALL. Each of them is a single index range.
+
+    Rows are read from the student_rows view. The course filter becomes a lookup of the course id followed by the
+    (course_id, name) index, and sorting by course reads the courses in name order and the students of each from that
+    index. The prefix filters use LIKE, which folds case and is
+    therefore not served by an index, so they are checked on the rows the ordering index returns and the first page
+    costs more the rarer the prefix is. Later pages still seek.
+
+    Attributes:
+    column (int): The table column the rows are sorted by, see SORT_KEYS.
+    descending (bool): Whether the rows are sorted in descending order.
+    course (Optional[str]): Only rows of this course, None for every course.
+    name_prefix (str): Only rows whose name starts with this text, case insensitive for ASCII letters.
+    mobile_prefix (str): Only rows whose phone number starts with these digits.
+
+    Methods:
+    select(self, after: Optional[tuple], limit: int, columns: str) -> tuple[str, tuple]: Builds the query for the rows
+        that follow the given row.
+    query(self) -> tuple[str, tuple]: Builds the query for every row, in order.
+    key(self, record: tuple) -> tuple: Returns a key that sorts rows the way the queries do.
+    accepts(self, record: tuple) -> bool: Tells whether a row passes the filters.
+    filtered(self) -> bool: Tells whether any filter is set.
+    uses(self, column: int) -> bool: Tells whether the order or a filter reads a table column.
+    """
+    column: int = 0
+    descending: bool = False
+    course: Optional[str] = None
+    name_prefix: str = ""
+    mobile_prefix: str = ""
+
+    def select(self, after: Optional[tuple] = None, limit: int = -1,
+               columns: str = "id, name, course, mobile") -> tuple[str, tuple]:
+        """
+        This function builds the query for at most limit rows that follow the row after, or that come first if after
+        is None. after has to hold the sort key columns at their COLUMNS positions.
+        """
+        keys: tuple[str, ...] = SORT_KEYS[self.column]
+        filters, filter_params = self._filters()
+        if after is None:
+            ranges: list[tuple[list[str], list, tuple[str, ...]]] = self._first_ranges(keys)
+        else:
+            ranges = self._ranges(keys, [after[COLUMNS.index(key)] for key in keys])
+
+        selects: list[str] = []
+        params: list = []
+        for conditions, range_params, order in ranges:
+            where = filters + conditions
+            sql = f"SELECT {columns} FROM student_rows"
+            if where:
+                sql += " WHERE " + " AND ".join(where)
+            selects.append(sql + " ORDER BY " + self._order(order))
+            params.extend(filter_params + range_params)
+
+        if len(selects) == 1:
+            sql = selects[0]
+        else:
+            sql = f"SELECT {columns} FROM (" + ") UNION ALL SELECT * FROM (".join(selects) + ")"
+        return sql + " LIMIT ?", (*params, limit)
+
+    def query(self) -> tuple[str, tuple]:
+        """
+        This function builds the query for every row that passes the filters, in order, for example to export them.
+        """
+        return self.select()
+
+    def key(self, record: tuple) -> tuple:
+        """
+        This function returns a key that sorts rows the way the queries of this order return them.
+        """
+        key: list = []
+        for position in _SORT_POSITIONS[self.column]:
+            value = record[position]
+            if self.descending:
+                key += (value is None, 0 if value is None else _Descending(value))
+            else:
+                key += (value is not None, 0 if value is None else value)
+        return tuple(key)
+
+    def accepts(self, record: tuple) -> bool:
+        """
+        This function tells whether a row passes the filters, the same way the queries decide it.
+        """
+        _, name, course, mobile = record
+        if self.course is not None and course != self.course:
+            return False
+        if self.name_prefix and (name is None or not name.lower().startswith(self.name_prefix.lower())):
+            return False
+        return not self.mobile_prefix or (mobile is not None and str(mobile).startswith(self.mobile_prefix))
+
+    def filtered(self) -> bool:
+        return self.course is not None or bool(self.name_prefix) or bool(self.mobile_prefix)
+
+    def uses(self, column: int) -> bool:
+        """
+        This function tells whether the order or a filter reads a table column, so that changing it can move a row.
+        """
+        name: str = COLUMNS[column]
+        filtered: dict[str, bool] = {"course": self.course is not None, "name": bool(self.name_prefix),
+                                     "mobile": bool(self.mobile_prefix)}
+        return name in SORT_KEYS[self.column] or filtered.get(name, False)
+
+    def _filters(self) -> tuple[list[str], list]:
+        conditions: list[str] = []
+        params: list = []
+        if self.course is not None:
+            conditions.append("course = ?")
+            params.append(self.course)
+        if self.name_prefix:
+            conditions.append("name LIKE ? ESCAPE '\\'")
+            params.append(_escape_like(self.name_prefix) + "%")
+        if self.mobile_prefix:
+            conditions.append("mobile LIKE ?")
+            params.append(self.mobile_prefix + "%")
+        return conditions, params
+
+    def _ranges(self, keys: tuple[str, ...], values: list) -> list[tuple[list[str], list, tuple[str, ...]]]:
+        """
+        This function splits "after the row with these key values" into index ranges, in the order they are read. The
+        rows that share the first level values come first, then the rows that differ in an earlier key column.
+        """
+        ranges: list[tuple[list[str], list, tuple[str, ...]]] = []
+        for level in range(len(keys) - 1, -1, -1):
+            prefix: list[str] = []
+            prefix_params: list = []
+            for key, value in zip(keys[:level], values[:level]):
+                if value is None:
+                    prefix.append(_null_test(key, True))
+                else:
+                    prefix.append(f"{key} = ?")
+                    prefix_params.append(value)
+
+            key, value, order = keys[level], values[level], keys[level:]
+            if not self.descending:
+                if value is None:
+                    ranges.append((prefix + [_null_test(key, False)], prefix_params, order))
+                else:
+                    ranges.append((prefix + [f"{key} > ?"], prefix_params + [value], order))
+            elif value is not None:
+                ranges.append((prefix + [f"{key} < ?"], prefix_params + [value], order))
+                if key != "id":
+                    ranges.append((prefix + [_null_test(key, True)], prefix_params, keys[level + 1:]))
+        return ranges
+
+    def _first_ranges(self, keys: tuple[str, ...]) -> list[tuple[list[str], list, tuple[str, ...]]]:
+        """
+        This function splits "every row" into the rows without and with a value in the first key column, in the order
+        they are read, so that each part is one index range like the ranges of _ranges. An id is never NULL.
+        """
+        if keys[0] == "id":
+            return [([], [], keys)]
+        ranges = [([_null_test(keys[0], True)], [], keys[1:]), ([_null_test(keys[0], False)], [], keys)]
+        return ranges[::-1] if self.descending else ranges
+
+    def _order(self, keys: tuple[str, ...]) -> str:
+        return ", ".join(f"{key} DESC" if self.descending else key for key in keys)
+
+
+def query_plan(connection: sqlite3.Connection, sql: str, params: tuple = ()) -> list[str]:
+    """
+    This function returns the EXPLAIN QUERY PLAN lines of a query.
+    """
+    return [row[3] for row in connection.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def unindexed_searches(connection: sqlite3.Connection) -> dict[tuple[str, ...], list[str]]:
+    """
+    This function checks the plan of every combination of search fields and returns the ones that scan the whole
+    table, mapped to their plan. An empty result means every supported search is served by an index.
+    """
+    sample: dict[str, object] = {"name": "", "course": "", "mobile": 0}
+    scans: dict[tuple[str, ...], list[str]] = {}
+
+    for size in range(1, len(SEARCH_FIELDS) + 1):
+        for fields in itertools.combinations(SEARCH_FIELDS, size):
+            sql, params = search_query(**{field: sample[field] for field in fields})
+            plan = query_plan(connection, sql, params)
+            if any(line.startswith("SCAN") for line in plan):
+                scans[fields] = plan
+    return scans
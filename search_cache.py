@@ -0,0 +1,209 @@
+"""
+Cache of search dialog results, so searching again for the same name, course or phone number shows the rows without
+running the query.
+
+Results are kept by their normalized criteria, least recently used first out, up to MAX_ENTRIES searches and
+MAX_ROWS rows in all. Before every lookup the cache checks whether anything was committed since the previous one. It
+keeps a connection of its own, so PRAGMA data_version answers that in a few microseconds without touching a table,
+and as long as nothing was committed a repeated search costs a dictionary lookup. Once something was committed, the
+ids logged in student_changes since the last seen seq are read with their current rows, and only the searches those
+students were or now are a result of are dropped: a search whose rows hold one of the ids, or whose criteria the
+current row matches. Every other result is still what its query would return. If the changelog was pruned past the
+last seen seq, went back or too many students changed, everything is dropped, which costs no more than a clear.
+
+A result is only stored if nothing was committed between the lookup that missed and the end of the query, otherwise
+the rows may already be missing a change the cache has gone past.
+
+The cache is not thread safe, only one thread may use it at a time.
+
+Usage:
+    cache = SearchCache()
+    key = search_key("Ada Lovelace", None, None)
+    rows = cache.get(key)
+    if rows is None:
+        position = cache.position
+        rows = database.execute(*search_query(*key)).fetchall()
+        cache.put(key, rows, position)
+"""
+import sqlite3
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from change_feed import ChangeFeed, changelog_position
+from database import DatabaseConnection
+from instrumentation import timed
+
+
+class SearchKey(NamedTuple):
+    """
+    The criteria of a search, None means the field is not searched. They are the parameters of schema.search_query.
+    """
+    name: Optional[str]
+    course: Optional[str]
+    mobile: Optional[int]
+
+    def matches(self, row: tuple) -> bool:
+        """
+        This function tells whether a (id, name, course, mobile) row is a result of the search, comparing like the
+        query does.
+        """
+        return ((self.name is None or self.name == row[1]) and (self.course is None or self.course == row[2]) and
+                (self.mobile is None or self.mobile == row[3]))
+
+
+def search_key(name: Optional[str], course: Optional[str], mobile) -> SearchKey:
+    """
+    This function normalizes search criteria as they were typed: surrounding spaces are dropped, an empty field is not
+    searched and the phone number becomes the number it is stored as. It raises ValueError if the phone number is not
+    a number.
+    """
+    name = name.strip() if name is not None else None
+    if isinstance(mobile, str):
+        mobile = int(mobile) if mobile.strip() else None
+    return SearchKey(name or None, course or None, mobile)
+
+
+class _Entry(NamedTuple):
+    rows: list[tuple]
+    ids: frozenset[int]
+
+
+class SearchCache:
+    """
+    A bounded cache of search results that never returns rows a committed write changed.
+
+    Attributes:
+    MAX_ENTRIES (int): The number of searches kept at most.
+    MAX_ROWS (int): The number of rows kept at most over all searches, a bigger result is not kept at all.
+    MAX_CHANGED_ROWS (int): Above this many changed students everything is dropped instead of looking at each.
+    hits (int): The lookups answered from the cache.
+    misses (int): The lookups that were not.
+    invalidated (int): The results dropped because a write changed them, clears included.
+    position (int): The changelog seq the cached results are known to be up to date with.
+
+    Methods:
+    get(self, key: SearchKey) -> Optional[list[tuple]]: Returns the cached rows of a search, or None.
+    put(self, key: SearchKey, rows: list[tuple], position: int) -> bool: Keeps the rows of a search read at position.
+    clear(self) -> None: Drops every result.
+    close(self) -> None: Closes the cache connection.
+    """
+
+    MAX_ENTRIES: int = 64
+    MAX_ROWS: int = 500_000
+    MAX_CHANGED_ROWS: int = ChangeFeed.MAX_CHANGED_ROWS
+
+    def __init__(self, database: Optional[DatabaseConnection] = None) -> None:
+        self.database: DatabaseConnection = database or DatabaseConnection()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.invalidated: int = 0
+        self.position: int = 0
+        self._entries: OrderedDict[SearchKey, _Entry] = OrderedDict()
+        self._rows: int = 0
+        self._connection: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+        self._last_id: int = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = self.database.open()
+        return self._connection
+
+    @timed("search_cache.get")
+    def get(self, key: SearchKey) -> Optional[list[tuple]]:
+        """
+        This function returns the rows of a search as its query would return them now, or None if they are not
+        cached. The rows are shared with the cache and must not be changed.
+        """
+        self._validate()
+        entry: Optional[_Entry] = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.rows
+
+    def put(self, key: SearchKey, rows: list[tuple], position: int) -> bool:
+        """
+        This function keeps the rows of a search whose query started after a lookup returned position. It returns
+        False and keeps nothing if a write was committed since, or the rows alone are more than MAX_ROWS.
+        """
+        self._validate()
+        if position != self.position or len(rows) > self.MAX_ROWS:
+            return False
+        self._drop(key)
+        rows = list(rows)
+        self._entries[key] = _Entry(rows, frozenset(row[0] for row in rows))
+        self._rows += len(rows)
+        while len(self._entries) > self.MAX_ENTRIES or self._rows > self.MAX_ROWS:
+            self._drop(next(iter(self._entries)))
+        return True
+
+    def clear(self) -> None:
+        """
+        This function drops every cached result, the counters are kept.
+        """
+        self.invalidated += len(self._entries)
+        self._entries.clear()
+        self._rows = 0
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _drop(self, key: SearchKey) -> None:
+        entry: Optional[_Entry] = self._entries.pop(key, None)
+        if entry is not None:
+            self._rows -= len(entry.rows)
+
+    def _validate(self) -> None:
+        # Drops the results that writes committed since the previous look changed, see the module docstring
+        connection = self.connection
+        data_version: int = connection.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return
+
+        connection.execute("BEGIN")
+        try:
+            oldest: Optional[int] = connection.execute("SELECT min(seq) FROM student_changes").fetchone()[0]
+            last_change, last_id = changelog_position(connection)
+            first_look: bool = self._data_version is None
+            went_back: bool = last_change < self.position or last_id < self._last_id
+            pruned: bool = last_change > self.position and (oldest is None or oldest > self.position + 1)
+            changed: dict[int, Optional[tuple]] = {}
+            if not (first_look or went_back or pruned) and last_change > self.position and self._entries:
+                ids: list[int] = [student_id for student_id, in connection.execute(
+                    "SELECT DISTINCT student_id FROM student_changes WHERE seq > ? AND seq <= ? LIMIT ?",
+                    (self.position, last_change, self.MAX_CHANGED_ROWS + 1))]
+                if len(ids) > self.MAX_CHANGED_ROWS:
+                    pruned = True
+                else:
+                    changed = dict.fromkeys(ids)
+                    # Stay below the default limit of 999 bound parameters per statement
+                    for start in range(0, len(ids), 900):
+                        chunk = ids[start:start + 900]
+                        for row in connection.execute(
+                                f"SELECT id, name, course, mobile FROM student_rows "
+                                f"WHERE id IN ({','.join('?' * len(chunk))})", chunk):
+                            changed[row[0]] = row
+        finally:
+            connection.rollback()
+
+        if first_look or went_back or pruned:
+            self.clear()
+        elif changed:
+            current: list[tuple] = [row for row in changed.values() if row is not None]
+            stale: list[SearchKey] = [key for key, entry in self._entries.items()
+                                      if not entry.ids.isdisjoint(changed) or any(map(key.matches, current))]
+            for key in stale:
+                self._drop(key)
+            self.invalidated += len(stale)
+        self._data_version = data_version
+        self.position = last_change
+        self._last_id = last_id
@@ -0,0 +1,192 @@
+"""
+Snapshot of the first rows of the main table, so the window can show students before sqlite answered at all.
+
+The snapshot is a small binary file next to the database, database.db.snapshot, that holds the first SNAPSHOT_ROWS
+students in id order, which is the order the table opens in, with the four columns it shows, together with the
+courses and the changelog position they were read at. At startup the window maps the file with mmap and reads the rows
+straight out of the mapping, a page of rows costs a few hundred struct unpacks and no query. Once the rows are shown,
+the change feed is moved back to the position of the snapshot, so its next poll patches in whatever was committed
+since. A snapshot that is missing, damaged or of another format is ignored and the rows are read from the database.
+
+Only the first rows are kept because the table only shows what it fetched: the rest is read from the database as the
+view scrolls, so a bigger snapshot would make every refresh cost more without showing anything sooner. The window
+writes the snapshot again in the background a few seconds after students changed.
+
+File layout, little endian:
+
+    header   magic, format version, row count, course count, changelog seq, highest id   (HEADER)
+    courses  id, name offset, name length, retired                                         (COURSE, course count times)
+    rows     id, mobile, course index, name offset, name length                            (ROW, row count times)
+    text     the UTF-8 names of the courses and students, the offsets above point into it
+
+Usage:
+    snapshot = read_snapshot(snapshot_path(database))
+    if snapshot is not None:
+        rows = snapshot.records()
+        snapshot.close()
+    write_snapshot(database)
+"""
+import mmap
+import os
+import struct
+from typing import Optional
+
+from change_feed import changelog_position
+from database import DatabaseConnection
+from repository import Course
+
+SNAPSHOT_SUFFIX: str = ".snapshot"
+SNAPSHOT_ROWS: int = 1024  # four pages of the table model, more than a screen
+SNAPSHOT_MAGIC: bytes = b"STUSNAP\0"
+SNAPSHOT_VERSION: int = 1
+
+HEADER = struct.Struct("<8sIIIqq")
+COURSE = struct.Struct("<qII?")
+ROW = struct.Struct("<qqiII")
+NULL_MOBILE: int = -(1 << 63)
+NULL_COURSE: int = -1
+NULL_NAME: int = 0xFFFFFFFF  # as the name length
+
+
+def snapshot_path(database: Optional[DatabaseConnection] = None) -> str:
+    """
+    This function returns where the snapshot of a database is kept, next to the database file.
+    """
+    database = database or DatabaseConnection()
+    return database.database_file + SNAPSHOT_SUFFIX
+
+
+class Snapshot:
+    """
+    A snapshot file mapped into memory. Rows are decoded from the mapping when they are asked for, nothing is read
+    up front but the header.
+
+    Attributes:
+    rows (int): The number of students in the snapshot.
+    last_change (int): The seq of the latest changelog entry when the snapshot was written.
+    last_id (int): The highest student id ever handed out when the snapshot was written.
+    complete (bool): Whether the snapshot holds every student, the table had no more than SNAPSHOT_ROWS.
+
+    Methods:
+    courses(self) -> list[Course]: Returns the courses, ordered by name.
+    records(self, first: int, last: int) -> list[tuple]: Returns the (id, name, course, mobile) rows first to last.
+    close(self) -> None: Unmaps the file.
+    """
+
+    def __init__(self, mapped: mmap.mmap) -> None:
+        """
+        This function reads the header of a mapped snapshot and takes the mapping over. It raises ValueError if the
+        file is not a snapshot of this format.
+        """
+        if len(mapped) < HEADER.size:
+            raise ValueError("the snapshot is cut short")
+        magic, version, self.rows, course_count, self.last_change, self.last_id = HEADER.unpack_from(mapped)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError("not a student snapshot of this version")
+        self._courses_at: int = HEADER.size
+        self._rows_at: int = self._courses_at + course_count * COURSE.size
+        self._text_at: int = self._rows_at + self.rows * ROW.size
+        if self._text_at > len(mapped):
+            raise ValueError("the snapshot is cut short")
+        self.complete: bool = self.rows < SNAPSHOT_ROWS
+        self._map: mmap.mmap = mapped
+        self._view: memoryview = memoryview(mapped)
+        self._course_names: list[Optional[str]] = [course.name for course in self.courses()]
+
+    def courses(self) -> list[Course]:
+        """
+        This function returns the courses of the snapshot, retired ones included, ordered by name like
+        StudentRepository.courses.
+        """
+        courses = COURSE.iter_unpack(self._view[self._courses_at:self._rows_at])
+        return [Course(course_id, self._text(offset, length), retired)
+                for course_id, offset, length, retired in courses]
+
+    def records(self, first: int = 0, last: Optional[int] = None) -> list[tuple]:
+        """
+        This function returns the rows first to last, both included, as (id, name, course, mobile) tuples like the
+        queries of the table model return them. Only the names are copied out of the mapping.
+        """
+        last = self.rows - 1 if last is None else min(last, self.rows - 1)
+        names: list[Optional[str]] = self._course_names
+        return [(student_id, self._text(offset, length), names[course] if course != NULL_COURSE else None,
+                 mobile if mobile != NULL_MOBILE else None)
+                for student_id, mobile, course, offset, length in ROW.iter_unpack(
+                    self._view[self._rows_at + first * ROW.size:self._rows_at + (last + 1) * ROW.size])]
+
+    def close(self) -> None:
+        self._view.release()
+        self._map.close()
+
+    def _text(self, offset: int, length: int) -> Optional[str]:
+        if length == NULL_NAME:
+            return None
+        start: int = self._text_at + offset
+        return str(self._view[start:start + length], "utf-8")
+
+
+def read_snapshot(path: str) -> Optional[Snapshot]:
+    """
+    This function maps the snapshot at path and returns it, or None if there is none or it cannot be used. A snapshot
+    is only a head start, so any problem with it means reading from the database as if it did not exist.
+    """
+    try:
+        with open(path, "rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):  # missing, unreadable or empty
+        return None
+    try:
+        return Snapshot(mapped)
+    except ValueError:  # UnicodeDecodeError is one too
+        pass
+    # Only once the exception is gone, its traceback holds views of the mapping that keep it from closing
+    mapped.close()
+    return None
+
+
+def write_snapshot(database: Optional[DatabaseConnection] = None, rows: int = SNAPSHOT_ROWS) -> str:
+    """
+    This function writes the snapshot of the first rows of the database and returns its path. The rows, the courses
+    and the changelog position are read in one transaction, so the position tells exactly which changes the rows are
+    missing later on. The file is written under a temporary name and renamed over the old one, a window that maps the
+    snapshot at the same time sees either of them whole.
+    """
+    database = database or DatabaseConnection()
+    path: str = snapshot_path(database)
+    with database.connect() as connection:
+        connection.execute("BEGIN")
+        try:
+            last_change, last_id = changelog_position(connection)
+            courses: list[tuple] = connection.execute("SELECT id, name, retired FROM courses ORDER BY name").fetchall()
+            students: list[tuple] = connection.execute(
+                "SELECT id, name, course_id, mobile FROM students ORDER BY id LIMIT ?", (rows,)).fetchall()
+        finally:
+            connection.rollback()
+
+    text = bytearray()
+
+    def add_text(value: Optional[str]) -> tuple[int, int]:
+        if value is None:
+            return 0, NULL_NAME
+        encoded: bytes = value.encode("utf-8")
+        text.extend(encoded)
+        return len(text) - len(encoded), len(encoded)
+
+    course_index: dict[int, int] = {course[0]: index for index, course in enumerate(courses)}
+    parts: list[bytes] = [HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(students), len(courses), last_change,
+                                      last_id)]
+    parts.extend(COURSE.pack(course, *add_text(name), bool(retired)) for course, name, retired in courses)
+    parts.extend(ROW.pack(student_id, NULL_MOBILE if mobile is None else mobile,
+                          NULL_COURSE if course is None else course_index[course], *add_text(name))
+                 for student_id, name, course, mobile in students)
+    parts.append(bytes(text))
+
+    partial_path: str = path + ".part"
+    try:
+        with open(partial_path, "wb") as file:
+            file.write(b"".join(parts))
+        os.replace(partial_path, path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    return path
@@ -0,0 +1,223 @@
+"""
+In-memory copy of every student of a roster that fits in memory, so the main table can be sorted and filtered without
+reading the database.
+
+The rows are read once, in the background, together with the changelog position they were read at. Before every use
+the cache polls a ChangeFeed of its own: PRAGMA data_version tells it in a few microseconds whether anything was
+committed, and only the students logged in student_changes since are read again. If the changes cannot be told apart,
+the changelog was pruned or the roster grew past MAX_ROWS, the rows are dropped and the table reads the database until
+they are loaded again.
+
+For every order and set of column filters the table asked for, a StudentView keeps the matching rows sorted with the
+sort keys of its TableQuery, which order rows exactly like the keyset queries do. A page is then a binary search for
+the last row of the page before and a slice, and a changed student is moved in every view with two more. Views are
+sorted off the GUI thread from a copy of the rows and only kept if nothing changed in the meantime, the last
+MAX_VIEWS of them are kept, so going back to an order that was shown recently costs nothing.
+
+Rosters above MAX_ROWS are never loaded, the table reads them from the database page by page as it always does.
+
+The cache is not thread safe, only one thread may use it at a time. load may run on another thread while the cache
+is not loaded, as long as it is not loaded twice at once.
+
+Usage:
+    cache = StudentCache()
+    if cache.load():
+        cache.refresh()
+        view = cache.view(table_query) or cache.add_view(StudentView.build(table_query, cache.rows.values()))
+        first_page = view.after(None, 256)
+"""
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from change_feed import ChangeFeed, changelog_position
+from database import DatabaseConnection
+from instrumentation import timed
+from repository import StudentRepository
+from schema import TableQuery
+
+
+class StudentView:
+    """
+    The rows of the cache that pass the filters of a TableQuery, in its order, next to their sort keys.
+
+    Attributes:
+    table_query (TableQuery): The order and the filters of the rows.
+    rows (list[tuple]): The (id, name, course, mobile) rows in order.
+    keys (list[tuple]): The sort key of every row, the id makes them unique.
+
+    Methods:
+    build(cls, table_query, rows) -> StudentView: Sorts the rows that pass the filters.
+    after(self, row: Optional[tuple], limit: int) -> list[tuple]: Returns the rows that follow a row.
+    move(self, before: Optional[tuple], after: Optional[tuple]) -> None: Moves a changed row to its new place.
+    """
+
+    __slots__ = ("table_query", "rows", "keys")
+
+    def __init__(self, table_query: TableQuery, rows: list[tuple], keys: list[tuple]) -> None:
+        self.table_query: TableQuery = table_query
+        self.rows: list[tuple] = rows
+        self.keys: list[tuple] = keys
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @classmethod
+    @timed("student_cache.build_view")
+    def build(cls, table_query: TableQuery, rows: Iterable[tuple]) -> "StudentView":
+        """
+        This function sorts the rows that pass the filters of table_query in its order. It only reads the rows it is
+        given, so it can run on another thread with a copy of the rows of the cache.
+        """
+        rows = sorted(filter(table_query.accepts, rows), key=table_query.key)
+        return cls(table_query, rows, list(map(table_query.key, rows)))
+
+    def after(self, row: Optional[tuple], limit: int = -1) -> list[tuple]:
+        """
+        This function returns at most limit rows that follow the row, or that come first if row is None, like
+        TableQuery.select would. row only needs the sort key columns, a negative limit returns every row.
+        """
+        start: int = 0 if row is None else bisect_right(self.keys, self.table_query.key(row))
+        return self.rows[start:] if limit < 0 else self.rows[start:start + limit]
+
+    def move(self, before: Optional[tuple], after: Optional[tuple]) -> None:
+        """
+        This function moves a changed row from where its old version sorted to where the new one does. before is None
+        for an inserted row, after for a deleted one. Rows that do not pass the filters are left out.
+        """
+        key = self.table_query.key
+        if before is not None and self.table_query.accepts(before):
+            position: int = bisect_left(self.keys, key(before))
+            if position < len(self.rows) and self.rows[position][0] == before[0]:
+                del self.rows[position]
+                del self.keys[position]
+        if after is not None and self.table_query.accepts(after):
+            after_key: tuple = key(after)
+            position = bisect_left(self.keys, after_key)
+            self.rows.insert(position, after)
+            self.keys.insert(position, after_key)
+
+
+class StudentCache:
+    """
+    Read-through cache of every student row of a roster of at most MAX_ROWS students, see the module docstring.
+
+    Attributes:
+    MAX_ROWS (int): The largest roster that is kept in memory.
+    MAX_VIEWS (int): The number of sorted and filtered views kept at most.
+    MAX_MOVED_ROWS (int): Above this many changed students the views are dropped instead of moving every row.
+    rows (dict[int, tuple]): The cached rows by student id.
+    loaded (bool): Whether the rows are loaded and kept up to date.
+    too_large (bool): Whether the last load found more than MAX_ROWS students.
+    generation (int): Counts the refreshes that changed rows, a view sorted from older rows is not kept.
+
+    Methods:
+    load(self) -> bool: Reads every row if the roster fits and remembers the changelog position they were read at.
+    refresh(self) -> bool: Brings the rows and the views up to date and tells whether the cache can be used.
+    view(self, table_query: TableQuery) -> Optional[StudentView]: Returns the kept view of an order and filters.
+    add_view(self, view: StudentView, generation: Optional[int]) -> Optional[StudentView]: Keeps a sorted view.
+    unload(self) -> None: Drops the rows and the views.
+    close(self) -> None: Closes the cache connection.
+    """
+
+    MAX_ROWS: int = 200_000
+    MAX_VIEWS: int = 4
+    MAX_MOVED_ROWS: int = 1000
+
+    def __init__(self, database: Optional[DatabaseConnection] = None) -> None:
+        self.database: DatabaseConnection = database or DatabaseConnection()
+        self.rows: dict[int, tuple] = {}
+        self.loaded: bool = False
+        self.too_large: bool = False
+        self.generation: int = 0
+        self._feed: ChangeFeed = ChangeFeed(self.database)
+        self._views: OrderedDict[TableQuery, StudentView] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @timed("student_cache.load")
+    def load(self) -> bool:
+        """
+        This function reads every row if there are at most MAX_ROWS students, counted from the course counts, and
+        returns whether it did. The rows and the changelog position are read in one transaction, so the first refresh
+        catches up with exactly the changes committed since.
+        """
+        self.unload()
+        self.too_large = StudentRepository(self.database).count() > self.MAX_ROWS
+        if self.too_large:
+            return False
+
+        connection = self._feed.connection
+        connection.execute("BEGIN")
+        try:
+            position: tuple[int, int] = changelog_position(connection)
+            rows: dict[int, tuple] = {row[0]: row for row in
+                                      connection.execute("SELECT id, name, course, mobile FROM student_rows")}
+        finally:
+            connection.rollback()
+        self._feed.seek(*position)
+        self.rows = rows
+        self.generation += 1
+        self.loaded = True
+        return True
+
+    @timed("student_cache.refresh")
+    def refresh(self) -> bool:
+        """
+        This function brings the rows and the views up to date with the database and returns whether the cache can be
+        used. It returns False if it is not loaded, or if it had to drop the rows because the changes could not be
+        told apart or the roster grew past MAX_ROWS.
+        """
+        if not self.loaded:
+            return False
+        changes = self._feed.poll()
+        if changes is None or len(self.rows) + sum(change.inserted for change in changes) > self.MAX_ROWS:
+            self.too_large = changes is not None
+            self.unload()
+            return False
+        if not changes:
+            return True
+
+        self.generation += 1
+        if len(changes) > self.MAX_MOVED_ROWS:
+            self._views.clear()
+        for change in changes:
+            before: Optional[tuple] = self.rows.pop(change.student_id, None)
+            if change.row is not None:
+                self.rows[change.student_id] = change.row
+            for view in self._views.values():
+                view.move(before, change.row)
+        return True
+
+    def view(self, table_query: TableQuery) -> Optional[StudentView]:
+        """
+        This function returns the kept view of an order and filters, or None if it was not sorted yet. Call refresh
+        first, the view is only as recent as the rows.
+        """
+        view: Optional[StudentView] = self._views.get(table_query)
+        if view is not None:
+            self._views.move_to_end(table_query)
+        return view
+
+    def add_view(self, view: StudentView, generation: Optional[int] = None) -> Optional[StudentView]:
+        """
+        This function keeps a view sorted from the rows of the given generation, the current one if None, and returns
+        it. A view sorted from rows that changed since is not kept and None is returned.
+        """
+        if not self.loaded or (generation is not None and generation != self.generation):
+            return None
+        self._views[view.table_query] = view
+        self._views.move_to_end(view.table_query)
+        while len(self._views) > self.MAX_VIEWS:
+            self._views.popitem(last=False)
+        return view
+
+    def unload(self) -> None:
+        self.loaded = False
+        self.rows = {}
+        self._views.clear()
+
+    def close(self) -> None:
+        self.unload()
+        self._feed.close()
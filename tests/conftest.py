@@ -0,0 +1,32 @@
+"""
+Shared setup of the tests: the modules of the application live in the repository root, next to main.py, and Qt runs
+without a display.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    """
+    The one QApplication of the test session, Qt allows no second one.
+    """
+    from PyQt6.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def database(tmp_path):
+    """
+    A DatabaseConnection to an empty database with the current schema and the default courses, in a temporary
+    directory. Its pool is closed again after the test.
+    """
+    from database import DatabaseConnection
+
+    yield DatabaseConnection(str(tmp_path / "database.db"))
+    DatabaseConnection.close_all()
@@ -0,0 +1,148 @@
+"""
+The HTTP/JSON service answers every request through StudentApi.handle, which is called directly here on a temporary
+database, one event loop per request like separate clients. One test goes through a listening server as well, to
+check how _serve parses a request and that a malformed one is answered and the connection closed.
+"""
+import asyncio
+import json
+from concurrent.futures import Future
+from http import HTTPStatus
+from typing import Any
+
+import pytest
+
+from api import StudentApi
+from repository import StudentRepository
+
+ROWS: int = 25
+
+
+@pytest.fixture
+def api(database) -> StudentApi:
+    StudentRepository(database).add((f"Student {i}", "Math" if i % 2 else "Physics", 5550000000 + i)
+                                    for i in range(1, ROWS + 1))
+    api = StudentApi(database, read_workers=2)
+    yield api
+    api.close()
+
+
+def call(api: StudentApi, method: str, target: str, body: Any = None) -> tuple[HTTPStatus, Any]:
+    return asyncio.run(api.handle(method, target, json.dumps(body).encode() if body is not None else b""))
+
+
+def test_list_pages(api: StudentApi) -> None:
+    ids: list[int] = []
+    after: int = 0
+    while True:
+        status, page = call(api, "GET", f"/students?after={after}&limit=10")
+        assert status == HTTPStatus.OK
+        ids.extend(student["id"] for student in page["students"])
+        if page["next"] is None:
+            break
+        assert page["next"] == page["students"][-1]["id"]
+        after = page["next"]
+    assert ids == list(range(1, ROWS + 1))
+
+    status, page = call(api, "GET", "/students?course=Math&limit=100")
+    assert [student["id"] for student in page["students"]] == list(range(1, ROWS + 1, 2))
+    assert page["next"] is None
+    assert call(api, "GET", "/students?limit=ten")[0] == HTTPStatus.BAD_REQUEST
+
+
+def test_post_one_and_many(api: StudentApi) -> None:
+    status, student = call(api, "POST", "/students", {"name": " Jane Doe ", "course": "Math",
+                                                      "mobile": "555 123 4567"})
+    assert status == HTTPStatus.CREATED
+    assert student == {"id": ROWS + 1, "name": "Jane Doe", "course": "Math", "mobile": 5551234567}
+
+    status, students = call(api, "POST", "/students", [{"name": "A", "course": None, "mobile": 5550000001},
+                                                       {"name": "B", "course": "Physics", "mobile": 5550000002}])
+    assert status == HTTPStatus.CREATED
+    assert [student["id"] for student in students] == [ROWS + 2, ROWS + 3]
+    assert call(api, "GET", f"/students/{ROWS + 3}") == (HTTPStatus.OK, students[1])
+    assert call(api, "POST", "/students", [])[0] == HTTPStatus.BAD_REQUEST
+    assert call(api, "POST", "/students", {"name": "No Phone", "course": "Math"})[0] == HTTPStatus.BAD_REQUEST
+
+
+def test_patch_keeps_unset_fields(api: StudentApi) -> None:
+    status, student = call(api, "PATCH", "/students/3", {"course": "Physics"})
+    assert status == HTTPStatus.OK
+    assert student == {"id": 3, "name": "Student 3", "course": "Physics", "mobile": 5550000003}
+    assert call(api, "GET", "/students/3") == (HTTPStatus.OK, student)
+
+    assert call(api, "PATCH", "/students/3", {"name": "Renamed", "mobile": None})[0] == HTTPStatus.BAD_REQUEST
+    assert call(api, "GET", "/students/3")[1]["name"] == "Student 3"
+    assert call(api, "PATCH", "/students/3", {"age": 20})[0] == HTTPStatus.BAD_REQUEST
+
+
+def test_unknown_course(api: StudentApi) -> None:
+    status, error = call(api, "POST", "/students", {"name": "Jane Doe", "course": "Astrology", "mobile": 5551234567})
+    assert status == HTTPStatus.BAD_REQUEST
+    assert "Astrology" in error["error"]
+    assert call(api, "PATCH", "/students/1", {"course": "Astrology"})[0] == HTTPStatus.BAD_REQUEST
+    assert call(api, "GET", "/students/1")[1]["course"] == "Math"
+
+
+@pytest.mark.parametrize("method, target, status", [
+    ("GET", f"/students/{ROWS + 1}", HTTPStatus.NOT_FOUND),
+    ("PATCH", f"/students/{ROWS + 1}", HTTPStatus.NOT_FOUND),
+    ("DELETE", f"/students/{ROWS + 1}", HTTPStatus.NOT_FOUND),
+    ("GET", "/students/abc", HTTPStatus.NOT_FOUND),
+    ("GET", "/teachers", HTTPStatus.NOT_FOUND),
+    ("PUT", "/students", HTTPStatus.METHOD_NOT_ALLOWED),
+    ("PUT", "/students/1", HTTPStatus.METHOD_NOT_ALLOWED),
+    ("POST", "/students/search", HTTPStatus.METHOD_NOT_ALLOWED),
+])
+def test_errors(api: StudentApi, method: str, target: str, status: HTTPStatus) -> None:
+    answer, error = call(api, method, target, {"name": "Jane Doe"})
+    assert answer == status
+    assert error["error"]
+
+
+def test_delete(api: StudentApi) -> None:
+    assert call(api, "DELETE", "/students/5") == (HTTPStatus.OK, {"deleted": 5})
+    assert call(api, "GET", "/students/5")[0] == HTTPStatus.NOT_FOUND
+
+
+def test_conflict(api: StudentApi, monkeypatch) -> None:
+    # Somebody else changes the student between every read and write of the update
+    def changed_meanwhile(student, version) -> Future:
+        future: Future = Future()
+        future.set_result(False)
+        return future
+
+    monkeypatch.setattr(api.writer, "update_versioned", changed_meanwhile)
+    status, error = call(api, "PATCH", "/students/1", {"name": "Renamed"})
+    assert status == HTTPStatus.CONFLICT
+    assert "keeps changing" in error["error"]
+
+
+def test_server_round_trip(api: StudentApi) -> None:
+    async def exchange() -> list[tuple[bytes, bytes]]:
+        server = await api.start(port=0)
+        port: int = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        answers: list[tuple[bytes, bytes]] = []
+        try:
+            for request in (b"GET /students/2 HTTP/1.1\r\nHost: localhost\r\n\r\n",
+                            b"POST /students HTTP/1.1\r\nContent-Length: -5\r\n\r\n"):
+                writer.write(request)
+                head: bytes = await reader.readuntil(b"\r\n\r\n")
+                length: int = int(next(line.split(b":")[1] for line in head.split(b"\r\n")
+                                       if line.lower().startswith(b"content-length")))
+                answers.append((head, await reader.readexactly(length)))
+            # The malformed request closes the connection
+            assert await reader.read() == b""
+        finally:
+            writer.close()
+            server.close()
+            await server.wait_closed()
+        return answers
+
+    (head, body), (bad_head, bad_body) = asyncio.run(exchange())
+    assert head.startswith(b"HTTP/1.1 200 OK\r\n")
+    assert b"Connection: keep-alive" in head
+    assert json.loads(body) == {"id": 2, "name": "Student 2", "course": "Physics", "mobile": 5550000002}
+    assert bad_head.startswith(b"HTTP/1.1 400 Bad Request\r\n")
+    assert b"Connection: close" in bad_head
+    assert json.loads(bad_body) == {"error": "negative Content-Length"}
@@ -0,0 +1,88 @@
+"""
+A backup has to bring back exactly the students it was taken of, only the newest backups are kept, and a backup that
+is damaged must be refused before the live database is touched.
+"""
+import gzip
+import os
+import sqlite3
+
+import pytest
+
+from backup import BACKUP_PREFIX, BACKUP_SUFFIX, BackupError, backup_database, list_backups, restore_database
+from repository import StudentRepository
+
+ROWS: int = 500
+
+
+def students(database) -> list[tuple]:
+    with database.connect() as connection:
+        return connection.execute("SELECT id, name, course, mobile, version FROM student_rows ORDER BY id").fetchall()
+
+
+@pytest.fixture
+def repository(database) -> StudentRepository:
+    repository = StudentRepository(database)
+    repository.add((f"Student {i}", "Math" if i % 3 else None, 5550000000 + i) for i in range(ROWS))
+    return repository
+
+
+def test_restore_gives_back_the_backed_up_rows(repository: StudentRepository, tmp_path) -> None:
+    original: list[tuple] = students(repository.database)
+    backup = backup_database(repository.database, str(tmp_path / "backups"), keep=3)
+    assert backup.path == list_backups(str(tmp_path / "backups"))[0]
+    assert backup.pages > 0 and backup.size > 0
+
+    repository.update_versioned((1, "Renamed", "Physics", 5551234567), 0)
+    repository.delete(range(10, 20))
+    repository.add([("Added Later", "History", 5559999999)])
+    assert students(repository.database) != original
+
+    restored = restore_database(backup.path, repository.database)
+    assert restored.students == ROWS
+    assert students(repository.database) == original
+    assert repository.count() == ROWS
+    assert not os.path.exists(repository.database.database_file + ".restore")
+
+
+def test_rotation_keeps_the_newest(repository: StudentRepository, tmp_path) -> None:
+    directory = tmp_path / "backups"
+    directory.mkdir()
+    old: list[str] = [str(directory / f"{BACKUP_PREFIX}2020010{day}-120000{BACKUP_SUFFIX}") for day in range(1, 5)]
+    for path in old:
+        with open(path, "wb") as file:
+            file.write(b"old backup")
+    (directory / "notes.txt").write_text("not a backup")
+
+    backup = backup_database(repository.database, str(directory), keep=2)
+    assert list_backups(str(directory)) == [backup.path, old[-1]]
+    assert sorted(backup.removed) == old[:-1]
+    assert (directory / "notes.txt").exists()
+
+
+@pytest.mark.parametrize("damage", ["not-a-database", "failed-check"])
+def test_damaged_backup_is_refused(repository: StudentRepository, tmp_path, damage: str) -> None:
+    original: list[tuple] = students(repository.database)
+    path: str = str(tmp_path / f"{BACKUP_PREFIX}20200101-120000{BACKUP_SUFFIX}")
+    if damage == "not-a-database":
+        content: bytes = b"these are not the students you are looking for\n" * 200
+    else:
+        backup = backup_database(repository.database, str(tmp_path / "backups"))
+        damaged: str = str(tmp_path / "damaged.db")
+        with gzip.open(backup.path, "rb") as file, open(damaged, "wb") as copy:
+            copy.write(file.read())
+        # The name index claims to be on mobile, the classic way to make integrity_check find rows missing from it
+        connection = sqlite3.connect(damaged)
+        connection.execute("PRAGMA writable_schema=ON")
+        connection.execute("UPDATE sqlite_master SET sql = 'CREATE INDEX students_name ON students(mobile)' "
+                           "WHERE name = 'students_name'")
+        connection.commit()
+        connection.close()
+        with open(damaged, "rb") as file:
+            content = file.read()
+    with gzip.open(path, "wb") as file:
+        file.write(content)
+
+    with pytest.raises(BackupError if damage == "failed-check" else sqlite3.DatabaseError):
+        restore_database(path, repository.database)
+    assert students(repository.database) == original
+    assert not os.path.exists(repository.database.database_file + ".restore")
@@ -0,0 +1,87 @@
+"""
+The connection pool hands out at most max_size connections and refuses to hand out any once it is closed, also to a
+caller that was already waiting. Closing every pool at exit must not hang on a connection that stays borrowed.
+"""
+import queue
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import database as database_module
+from database import ConnectionPool, DatabaseConnection
+
+TIMEOUT: float = 10.0
+
+
+@pytest.fixture
+def pool(tmp_path) -> ConnectionPool:
+    pool = ConnectionPool(str(tmp_path / "pool.db"), max_size=2)
+    yield pool
+    pool.close()
+
+
+def test_connections_are_reused(pool: ConnectionPool) -> None:
+    first = pool.acquire()
+    pool.release(first)
+    assert pool.acquire() is first
+    second = pool.acquire()
+    assert second is not first
+    with pytest.raises(queue.Empty):
+        pool.acquire(timeout=0.05)
+    pool.release(second)
+    assert pool.acquire(timeout=0.05) is second
+
+
+def test_acquire_after_close_raises(pool: ConnectionPool) -> None:
+    borrowed = pool.acquire()
+    pool.close()
+    with pytest.raises(RuntimeError, match="closed"):
+        pool.acquire()
+    # A connection released after the close is closed rather than pooled
+    pool.release(borrowed)
+    with pytest.raises(sqlite3.ProgrammingError, match="closed"):
+        borrowed.execute("SELECT 1")
+    with pytest.raises(RuntimeError, match="closed"):
+        pool.acquire(timeout=0.05)
+
+
+def test_close_wakes_waiting_callers(pool: ConnectionPool) -> None:
+    borrowed = [pool.acquire(), pool.acquire()]
+    errors: list[BaseException] = []
+
+    def wait_for_connection() -> None:
+        try:
+            pool.acquire()
+        except BaseException as e:
+            errors.append(e)
+
+    waiters = [threading.Thread(target=wait_for_connection) for _ in range(3)]
+    for waiter in waiters:
+        waiter.start()
+    time.sleep(0.05)
+    pool.close()
+    for waiter in waiters:
+        waiter.join(TIMEOUT)
+    assert not any(waiter.is_alive() for waiter in waiters)
+    assert [type(error) for error in errors] == [RuntimeError] * 3
+    for connection in borrowed:
+        pool.release(connection)
+
+
+def test_close_all_does_not_wait_for_borrowed_connections(database: DatabaseConnection, monkeypatch) -> None:
+    monkeypatch.setattr(database_module, "CLOSE_TIMEOUT", 0.05)
+    pool: ConnectionPool = database.pool
+    borrowed = [pool.acquire() for _ in range(pool.max_size)]
+
+    started: float = time.perf_counter()
+    DatabaseConnection.close_all()
+    assert time.perf_counter() - started < TIMEOUT
+    with pytest.raises(RuntimeError):
+        pool.acquire()
+    for connection in borrowed:
+        pool.release(connection)
+    # A new pool is opened for the next use of the file
+    with database.connect() as connection:
+        assert connection.execute("SELECT count(*) FROM students").fetchone() == (0,)
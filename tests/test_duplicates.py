@@ -0,0 +1,128 @@
+"""
+Duplicate detection has to catch the typos people make when they enter a student twice, one wrong digit, two
+neighbouring digits swapped or a country code in front of the number, without joining a family that shares one phone
+number. find_duplicates and find_matches find the same students, one by blocking the whole table and the other with
+indexed lookups, so both are checked on the same small roster.
+"""
+import pytest
+
+import duplicates
+from duplicates import find_duplicates, find_matches, match_reason, normalize_name, normalize_phone, phone_variants, \
+    similar_names
+from repository import StudentRepository
+
+ROSTER: list[tuple[str, str, int]] = [
+    ("Ada Lovelace", "Math", 5551234567),
+    ("ada lovelace", "Math", 5551234568),  # one wrong digit
+    ("Alan Turing", "Physics", 5559876543),
+    ("Turing, Alan M.", "Physics", 5559875643),  # neighbouring digits swapped
+    ("Grace Hopper", "Science", 5550001111),
+    ("Grace Hopper", "Science", 15550001111),  # country code
+    ("John Smith", "History", 5552223333),
+    ("Mary Smith", "History", 5552223333),  # family sharing a phone
+]
+
+
+@pytest.fixture
+def repository(database) -> StudentRepository:
+    repository = StudentRepository(database)
+    repository.add(ROSTER)
+    return repository
+
+
+def test_normalize_name() -> None:
+    assert normalize_name("Doe, Jane A.") == normalize_name("jane doe") == "doe jane"
+    assert normalize_name("José O'Brien") == "jose obrien"
+    assert normalize_name("J. K.") == "j k"
+    assert normalize_name(None) == normalize_name("") == ""
+
+
+def test_normalize_phone() -> None:
+    assert normalize_phone("+1 (555) 123-4567") == normalize_phone(5551234567) == "5551234567"
+    assert normalize_phone(None) == normalize_phone("none") == ""
+
+
+def test_similar_names() -> None:
+    assert similar_names("jones katherine", "catherine jones")
+    assert similar_names("jane", "doe jane")
+    assert not similar_names("john smith", "mary smith")
+    assert not similar_names("doe jane", "")
+
+
+@pytest.mark.parametrize("second, reason", [
+    (("ada lovelace", "5551234567"), "same name and phone"),
+    (("ada lovelace", "5551234568"), "same name, phone differs in one digit"),
+    (("ada lovelace", "5551234576"), "same name, phone digits swapped"),
+    (("ada lovelaces", "5551234567"), "same phone, similar name"),
+    (("ada lovelace", "5551234500"), None),
+    (("ada lovelace", "5551243567"), "same name, phone digits swapped"),
+    (("byron lord", "5551234567"), None),
+    (("ada lovelace", ""), None),
+], ids=["same", "one-digit", "swapped", "similar-name", "two-digits", "swapped-middle", "other-name", "no-phone"])
+def test_match_reason(second: tuple[str, str], reason: str) -> None:
+    assert match_reason("ada lovelace", "5551234567", *second) == reason
+    assert match_reason(*second, "ada lovelace", "5551234567") == reason
+
+
+def test_match_reason_without_phones() -> None:
+    assert match_reason("ada lovelace", "", "ada lovelace", "") == "same name, no phone"
+    assert match_reason("ada lovelace", "", "alan turing", "") is None
+
+
+def test_phone_variants() -> None:
+    variants: list[str] = phone_variants("123")
+    assert variants[0] == "123"
+    # Nine other digits in each of the three places and the two swaps
+    assert len(variants) == len(set(variants)) == 1 + 3 * 9 + 2
+    assert {"923", "103", "124", "213", "132"} <= set(variants)
+    assert "321" not in variants
+    assert all(match_reason("name", "1234567890", "name", variant) for variant in phone_variants("1234567890")[1:])
+
+
+def test_find_duplicates(repository: StudentRepository) -> None:
+    result = find_duplicates(repository.database)
+    assert result.students == len(ROSTER)
+    groups: list[list[tuple[int, str]]] = [[(duplicate.student.id, duplicate.reason) for duplicate in group]
+                                           for group in result.groups]
+    assert groups == [
+        [(1, ""), (2, "same name, phone differs in one digit")],
+        [(3, ""), (4, "same name, phone digits swapped")],
+        [(5, ""), (6, "same name and phone")],
+    ]
+
+
+def test_find_duplicates_since_id(repository: StudentRepository) -> None:
+    repository.add([("Alan Turing", "Physics", 5559876543)])
+    groups = find_duplicates(repository.database, since_id=len(ROSTER)).groups
+    assert [[duplicate.student.id for duplicate in group] for group in groups] == [[3, 4, 9]]
+
+
+def test_large_phone_blocks_are_skipped(repository: StudentRepository, monkeypatch) -> None:
+    # A shared number joins similar names only, unless more than MAX_BLOCK names share it
+    repository.add([("Katherine Jones", "Math", 5554445555), ("Catherine Jones", "Math", 5554445555),
+                    ("Unrelated Person", "Math", 5554445555)])
+    groups = find_duplicates(repository.database).groups
+    assert [duplicate.student.id for duplicate in groups[-1]] == [9, 10]
+
+    monkeypatch.setattr(duplicates, "MAX_BLOCK", 2)
+    result = find_duplicates(repository.database)
+    assert result.skipped_blocks == 1
+    assert len(result.groups) == len(groups) - 1
+
+
+@pytest.mark.parametrize("name, mobile, expected", [
+    ("Ada Lovelace", "555-123-4569", [1, 2]),
+    ("Lovelace, Ada", "+1 555 123 4567", [1, 2]),
+    ("Alan Turing", 5559876534, [3]),
+    ("Grace Hopper", "44 555 000 1111", [5, 6]),
+    ("Peter Smith", 5552223333, []),
+    ("Nobody Here", None, []),
+], ids=["one-digit", "country-code", "swapped", "other-country-code", "family", "no-phone"])
+def test_find_matches(repository: StudentRepository, name: str, mobile, expected: list[int]) -> None:
+    assert [duplicate.student.id for duplicate in find_matches(name, mobile, repository.database)] == expected
+
+
+def test_find_matches_without_phone(database) -> None:
+    StudentRepository(database).add([("Ada Lovelace", "Math", None), ("Ada Lovelace", "Math", 5551234567)])
+    assert [(duplicate.student.id, duplicate.reason) for duplicate in find_matches("ada lovelace", None, database)] \
+        == [(1, "same name, no phone")]
@@ -0,0 +1,67 @@
+"""
+What is exported has to come back unchanged: CSV and JSON Lines through an import into an empty database, the
+columnar format through read_columnar, which also has to keep missing values missing.
+"""
+import pytest
+
+from database import DatabaseConnection
+from exporter import export_students, read_columnar
+from importer import import_students
+from repository import StudentRepository
+
+ROWS: int = 2500  # more than one fetchmany of FETCH_SIZE rows
+
+
+@pytest.fixture
+def repository(database) -> StudentRepository:
+    repository = StudentRepository(database)
+    repository.add((f"Étudiant {i}, \"junior\"" if i % 7 == 0 else f"Student {i}", "Math" if i % 2 else "Physics",
+                    5550000000 + i) for i in range(ROWS))
+    return repository
+
+
+def rows(database) -> list[tuple]:
+    with database.connect() as connection:
+        return connection.execute("SELECT id, name, course, mobile FROM student_rows ORDER BY id").fetchall()
+
+
+@pytest.mark.parametrize("extension", [".csv", ".jsonl"])
+def test_round_trip_through_import(repository: StudentRepository, tmp_path, extension: str) -> None:
+    path: str = str(tmp_path / f"students{extension}")
+    result = export_students(path, database=repository.database)
+    assert result.exported == ROWS
+    assert result.size > 0
+
+    copy = DatabaseConnection(str(tmp_path / "copy.db"))
+    imported = import_students(path, copy)
+    assert (imported.imported, imported.rejected) == (ROWS, 0)
+    assert rows(copy) == rows(repository.database)
+
+
+def test_columnar_round_trip(repository: StudentRepository, tmp_path) -> None:
+    repository.add([(None, None, None), ("", "Math", 0), ("Mobile Only", None, 5559999999)])
+    path: str = str(tmp_path / "students.stcol")
+    result = export_students(path, database=repository.database)
+    assert result.exported == ROWS + 3
+    assert list(read_columnar(path)) == rows(repository.database)
+    assert list(read_columnar(path))[-3:] == [(ROWS + 1, None, None, None), (ROWS + 2, "", "Math", 0),
+                                               (ROWS + 3, "Mobile Only", None, 5559999999)]
+    with pytest.raises(ValueError, match="not a columnar student file"):
+        list(read_columnar(__file__))
+
+
+def test_export_of_a_query(repository: StudentRepository, tmp_path) -> None:
+    path: str = str(tmp_path / "math.stcol")
+    sql: str = "SELECT id, name, course, mobile FROM student_rows WHERE course = ? ORDER BY id DESC"
+    assert export_students(path, sql, ("Math",), repository.database).exported == ROWS // 2
+    exported: list[tuple] = list(read_columnar(path))
+    assert [row[0] for row in exported] == list(range(ROWS, 0, -2))
+    assert {row[2] for row in exported} == {"Math"}
+
+
+def test_failed_export_leaves_no_file(repository: StudentRepository, tmp_path) -> None:
+    path = tmp_path / "students.csv"
+    with pytest.raises(Exception):
+        export_students(str(path), "SELECT id, name, course, mobile FROM no_such_table", (), repository.database)
+    assert not path.exists()
+    assert not (tmp_path / "students.csv.part").exists()
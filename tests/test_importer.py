@@ -0,0 +1,133 @@
+"""
+An import keeps every valid row and reports every rejected one with its line and reason, in the result and in the
+rejects file. Large imports into a smaller table drop the search indexes after the first batch and build them again
+at the end, also when a later batch fails.
+"""
+import csv
+import json
+import sqlite3
+
+import pytest
+
+import importer
+from importer import RowError, import_students, parse_phone, validate_row
+from repository import StudentRepository
+from schema import INDEXES
+
+
+def indexes(database) -> set[str]:
+    with database.connect() as connection:
+        return {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+def write_csv(path, rows: list[tuple]) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(("name", "course", "mobile"))
+        writer.writerows(rows)
+
+
+def test_validate_row() -> None:
+    courses = importer.course_keys(["Math", "Physics"])
+    assert validate_row({"name": " Jane Doe ", "course": "math", "mobile": "+1 (555) 123-4567"}, courses) == \
+        ("Jane Doe", "Math", 15551234567)
+    assert validate_row({"name": "Jane Doe", "course": "Physics", "phone": 5551234567}, courses) == \
+        ("Jane Doe", "Physics", 5551234567)
+    for raw, reason in [({"name": " ", "course": "Math", "mobile": "5551234567"}, "name is empty"),
+                        ({"name": "x" * 101, "course": "Math", "mobile": "5551234567"}, "longer than 100"),
+                        ({"name": "Jane Doe", "course": "Astrology", "mobile": "5551234567"}, "unknown course"),
+                        ({"name": "Jane Doe", "course": "Math", "mobile": "555-CALL-NOW"}, "invalid phone")]:
+        with pytest.raises(RowError, match=reason):
+            validate_row(raw, courses)
+    assert parse_phone("555.123.4567") == 5551234567
+    with pytest.raises(RowError):
+        parse_phone("123456")
+
+
+def test_rejected_rows_are_reported(database, tmp_path) -> None:
+    path = tmp_path / "students.jsonl"
+    lines: list[str] = [
+        json.dumps({"name": "Jane Doe", "course": "Math", "mobile": "555 123 4567"}),
+        json.dumps({"name": "", "course": "Math", "mobile": "5551234568"}),
+        "",
+        json.dumps({"name": "John Roe", "course": "Astrology", "mobile": "5551234569"}),
+        "{not json",
+        json.dumps(["Ann Poe", "Math", "5551234570"]),
+        json.dumps({"name": "Ann Poe", "course": "physics", "phone": "5551234570"}),
+        json.dumps({"name": "Bad Phone", "course": "Math", "mobile": "12"}),
+    ]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    rejects = tmp_path / "rejected.csv"
+
+    result = import_students(str(path), database, rejects_path=str(rejects))
+    assert (result.imported, result.rejected) == (2, 5)
+    assert [line for line, _ in result.errors] == [2, 4, 5, 6, 8]
+    reasons: list[str] = [reason for _, reason in result.errors]
+    assert reasons[0] == "name is empty"
+    assert "Astrology" in reasons[1]
+    assert reasons[2].startswith("invalid JSON")
+    assert reasons[3] == "line is not a JSON object"
+    assert "invalid phone number" in reasons[4]
+    with open(rejects, newline="", encoding="utf-8") as file:
+        assert list(csv.reader(file)) == [["line", "reason"]] + [[str(line), reason] for line, reason in result.errors]
+    assert [student[1:] for student in StudentRepository(database).get(range(1, 10))] == \
+        [("Jane Doe", "Math", 5551234567), ("Ann Poe", "Physics", 5551234570)]
+
+
+def test_errors_are_capped(database, tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(importer, "MAX_REPORTED_ERRORS", 3)
+    path = tmp_path / "students.csv"
+    write_csv(path, [("", "Math", "5551234567")] * 10 + [("Jane Doe", "Math", "5551234567")])
+    result = import_students(str(path), database)
+    assert (result.imported, result.rejected) == (1, 10)
+    assert [line for line, _ in result.errors] == [2, 3, 4]
+
+
+@pytest.fixture
+def large_file(tmp_path, monkeypatch):
+    # Small enough to run quickly, large enough that the first batch is read before the end of the file
+    monkeypatch.setattr(importer, "BULK_IMPORT_ROWS", 1000)
+    path = tmp_path / "students.csv"
+    write_csv(path, [(f"Student {i}", "Math" if i % 2 else "Physics", 5550000000 + i) for i in range(5000)])
+    return path
+
+
+def test_indexes_are_dropped_and_rebuilt(database, large_file, monkeypatch) -> None:
+    dropped: list[int] = []
+    drop_indexes = importer.drop_indexes
+    monkeypatch.setattr(importer, "drop_indexes", lambda connection: (dropped.append(1), drop_indexes(connection)))
+
+    result = import_students(str(large_file), database, batch_size=500)
+    assert result.imported == 5000
+    assert dropped == [1]
+    assert set(INDEXES) <= indexes(database)
+    with database.connect() as connection:
+        assert connection.execute("SELECT count(*) FROM sqlite_stat1").fetchone()[0] > 0
+        assert connection.execute("SELECT id FROM students WHERE mobile = 5550004321").fetchone() == (4322,)
+
+
+def test_indexes_are_kept_for_a_larger_table(database, large_file, monkeypatch) -> None:
+    StudentRepository(database).add([(f"Existing {i}", "Math", 5560000000 + i) for i in range(6000)])
+    dropped: list[int] = []
+    monkeypatch.setattr(importer, "drop_indexes", dropped.append)
+
+    assert import_students(str(large_file), database, batch_size=500).imported == 5000
+    assert dropped == []
+
+
+def test_indexes_are_rebuilt_after_a_failed_batch(database, large_file, monkeypatch) -> None:
+    insert_students = importer.insert_students
+    calls: list[int] = []
+
+    def failing_second_batch(connection: sqlite3.Connection, rows) -> int:
+        calls.append(1)
+        if len(calls) == 2:
+            raise sqlite3.OperationalError("disk full")
+        return insert_students(connection, rows)
+
+    monkeypatch.setattr(importer, "insert_students", failing_second_batch)
+    with pytest.raises(sqlite3.OperationalError, match="disk full"):
+        import_students(str(large_file), database, batch_size=500)
+    assert set(INDEXES) <= indexes(database)
+    # The first batch was committed before the failure and stays
+    assert StudentRepository(database).count() == 500
@@ -0,0 +1,122 @@
+"""
+From BULK_ROWS students on, add, delete and set_course suspend the per-row triggers and do their work with one
+statement each. Either way the students have to end up the same, and so do what the triggers keep: the full text
+index, the changelog and the course counts. Every write runs once just below and once at BULK_ROWS.
+"""
+import sqlite3
+
+import pytest
+
+from repository import BULK_ROWS, Student, StudentRepository
+
+TRIGGERS: set[str] = {f"{kind}_{event}" for kind in ("students_fts", "students_log", "course_counts")
+                      for event in ("insert", "update", "delete")}
+
+
+def last_change(connection: sqlite3.Connection) -> int:
+    return connection.execute("SELECT coalesce(max(seq), 0) FROM student_changes").fetchone()[0]
+
+
+def check_derived(repository: StudentRepository, since: int) -> set[int]:
+    """
+    This function checks that the course counts and the full text index agree with the students table and that the
+    triggers are all in place, and returns the ids logged in the changelog after since.
+    """
+    with repository.database.connect() as connection:
+        counted = dict(connection.execute("SELECT course, count(*) FROM student_rows GROUP BY course"))
+        assert repository.course_counts() == counted
+        assert repository.count() == sum(counted.values())
+        indexed: set[int] = {row[0] for row in connection.execute(
+            "SELECT rowid FROM students_fts WHERE students_fts MATCH 'student'")}
+        assert indexed == {student_id for student_id, name in connection.execute("SELECT id, name FROM students")
+                           if "student" in name.lower().split()}
+        triggers: set[str] = {row[0] for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'students'")}
+        assert TRIGGERS <= triggers
+        return {row[0] for row in connection.execute("SELECT student_id FROM student_changes WHERE seq > ?", (since,))}
+
+
+@pytest.fixture(params=[BULK_ROWS - 1, BULK_ROWS], ids=["per-row", "bulk"])
+def size(request) -> int:
+    return request.param
+
+
+def rows(size: int) -> list[tuple]:
+    return [(f"Student {i}", "Math" if i % 3 else None if i % 2 else "Physics", 5550000000 + i) for i in range(size)]
+
+
+def test_add_and_get(database, size: int) -> None:
+    repository = StudentRepository(database)
+    repository.add([("First", "History", 5551234567)])
+    with database.connect() as connection:
+        since: int = last_change(connection)
+
+    added: list[Student] = repository.add(rows(size))
+    assert [student.id for student in added] == list(range(2, size + 2))
+    assert [student[1:] for student in added] == rows(size)
+    assert repository.get(reversed([student.id for student in added])) == added
+    assert repository.get([1, size + 5]) == [Student(1, "First", "History", 5551234567)]
+    assert check_derived(repository, since) == {student.id for student in added}
+    assert [student.id for student in repository.match_name(f"student {size - 1}")] == [size + 1]
+
+    with pytest.raises(ValueError, match="Astrology"):
+        repository.add(rows(size - 1) + [("Unknown", "Astrology", 5550000000)])
+    assert repository.count() == size + 1
+    check_derived(repository, since)
+
+
+def test_update_versioned(database, size: int) -> None:
+    repository = StudentRepository(database)
+    repository.add(rows(size))
+    student, version = repository.get_versioned(size // 2)
+
+    renamed = student._replace(name="Renamed Student", course="History")
+    assert repository.update_versioned(renamed, version)
+    assert repository.get_versioned(student.id) == (renamed, version + 1)
+    # The second edit still holds the old version, somebody else wrote in between
+    assert not repository.update_versioned(student._replace(mobile=5559999999), version)
+    assert repository.get([student.id]) == [renamed]
+    assert not repository.update_versioned((size + 10, "Nobody", "Math", 5550000000), 0)
+    assert repository.get_versioned(size + 10) is None
+    check_derived(repository, 0)
+    assert [found.id for found in repository.match_name("renamed")] == [student.id]
+
+
+def test_set_course(database, size: int) -> None:
+    repository = StudentRepository(database)
+    repository.add(rows(size) + [("Extra", "Math", 5550000000)])
+    with database.connect() as connection:
+        since: int = last_change(connection)
+        versions = dict(connection.execute("SELECT id, version FROM students"))
+
+    ids: list[int] = list(range(1, size + 1)) + [size + 100]
+    assert repository.set_course(ids, "Biology") == size
+    assert {student.course for student in repository.get(ids)} == {"Biology"}
+    assert repository.get([size + 1])[0].course == "Math"
+    assert check_derived(repository, since) == set(range(1, size + 1))
+    assert repository.course_counts() == {"Biology": size, "Math": 1}
+    with database.connect() as connection:
+        assert all(version == versions[student_id] + 1 for student_id, version in
+                   connection.execute("SELECT id, version FROM students WHERE id <= ?", (size,)))
+
+    assert repository.set_course(ids, None) == size
+    assert repository.course_counts() == {None: size, "Math": 1}
+    with pytest.raises(ValueError, match="Astrology"):
+        repository.set_course(ids, "Astrology")
+    check_derived(repository, since)
+
+
+def test_delete(database, size: int) -> None:
+    repository = StudentRepository(database)
+    repository.add(rows(size + 10))
+    with database.connect() as connection:
+        since: int = last_change(connection)
+
+    ids: list[int] = list(range(6, size + 6)) + [size + 100]
+    assert repository.delete(ids) == size
+    assert repository.get(range(1, size + 11)) == [Student(i + 1, *row) for i, row in enumerate(rows(size + 10))
+                                                   if not 6 <= i + 1 < size + 6]
+    assert check_derived(repository, since) == set(range(6, size + 6))
+    assert repository.count() == 10
+    assert repository.match_name("student 7") == []
+    assert repository.delete(ids) == 0
@@ -0,0 +1,77 @@
+"""
+A database from before course ids stores the course name in every student row. ensure_schema has to move it to
+course ids without losing a student, a name or an id, count the courses again and from then on refuse a student
+whose course does not exist.
+"""
+import sqlite3
+
+import pytest
+
+from database import DatabaseConnection
+from repository import StudentRepository
+from schema import DEFAULT_COURSES, INDEXES, ensure_schema
+
+# The students table as the first version of the application created it
+BASELINE_TABLE: str = ("CREATE TABLE students(id INTEGER PRIMARY KEY AUTOINCREMENT ,name TEXT, course TEXT, "
+                       "mobile INTEGER)")
+STUDENTS: list[tuple] = [
+    (1, "Ada Lovelace", "Math", 5551234567),
+    (2, "Alan Turing", "Physics", 5559876543),
+    (4, "Grace Hopper", "Astronomy", 5550001111),  # a course that was never in the courses table
+    (5, "No Course", None, 5550002222),
+    (6, "Empty Course", "", 5550003333),
+    (9, None, "Math", None),
+]
+
+
+@pytest.fixture(params=["baseline", "versioned"])
+def old_database(request, tmp_path) -> str:
+    path: str = str(tmp_path / "database.db")
+    connection = sqlite3.connect(path)
+    connection.execute(BASELINE_TABLE)
+    if request.param == "versioned":
+        # The layout just before course ids: versions, and course counts kept by course name
+        connection.execute("ALTER TABLE students ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        connection.execute("CREATE TABLE course_counts(course TEXT PRIMARY KEY, students INTEGER NOT NULL) "
+                           "WITHOUT ROWID")
+        connection.execute("INSERT INTO course_counts VALUES ('Math', 1)")
+    connection.executemany("INSERT INTO students(id, name, course, mobile) VALUES (?, ?, ?, ?)",
+                           STUDENTS + [(12, "Deleted Later", "Math", 5550009999)])
+    connection.execute("DELETE FROM students WHERE id = 12")
+    connection.commit()
+    connection.close()
+    yield path
+    DatabaseConnection.close_all()
+
+
+def test_migrate_courses(old_database: str) -> None:
+    database = DatabaseConnection(old_database)
+    with database.connect() as connection:
+        columns: list[str] = [row[1] for row in connection.execute("PRAGMA table_info(students)")]
+        assert columns == ["id", "name", "course_id", "mobile", "version"]
+        courses: list[str] = [row[0] for row in connection.execute("SELECT name FROM courses ORDER BY id")]
+        assert courses == DEFAULT_COURSES + ["Astronomy"]
+        # Students without a course, whether stored as NULL or as '', end up with none
+        assert connection.execute("SELECT id, name, course, mobile FROM student_rows ORDER BY id").fetchall() == \
+            [(1, "Ada Lovelace", "Math", 5551234567), (2, "Alan Turing", "Physics", 5559876543),
+             (4, "Grace Hopper", "Astronomy", 5550001111), (5, "No Course", None, 5550002222),
+             (6, "Empty Course", None, 5550003333), (9, None, "Math", None)]
+        assert set(INDEXES) <= {row[0] for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert connection.execute("SELECT count(*) FROM students_fts WHERE students_fts MATCH 'course'").fetchone() \
+            == (2,)
+
+    repository = StudentRepository(database)
+    assert repository.course_counts() == {None: 2, "Astronomy": 1, "Math": 2, "Physics": 1}
+    # The id of the deleted student is not handed out again
+    assert [student.id for student in repository.add([("New Student", "Astronomy", 5550004444)])] == [13]
+    assert repository.course_counts()["Astronomy"] == 2
+
+    with database.connect() as connection:
+        with pytest.raises(sqlite3.IntegrityError, match="FOREIGN KEY"):
+            connection.execute("INSERT INTO students(name, course_id, mobile) VALUES ('Nobody', 999, 5550005555)")
+        connection.rollback()
+        # Running it again on the migrated database changes nothing
+        ensure_schema(connection)
+        assert connection.execute("SELECT count(*) FROM students").fetchone() == (7,)
+    assert repository.course_counts() == {None: 2, "Astronomy": 2, "Math": 2, "Physics": 1}
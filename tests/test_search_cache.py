@@ -0,0 +1,141 @@
+"""
+The search cache must never answer with rows a committed write changed: a write to a student that is, or becomes, a
+result of a cached search drops that search, a write to any other student leaves it alone, and rows read while a write
+was committed are not kept.
+"""
+import pytest
+
+from repository import StudentRepository
+from schema import prune_changes, search_query
+from search_cache import SearchCache, SearchKey, search_key
+
+ADA: SearchKey = search_key("Ada Lovelace", None, None)
+MATH: SearchKey = search_key(None, "Math", None)
+PHONE: SearchKey = search_key(None, None, "5559876543")
+
+
+@pytest.fixture
+def repository(database) -> StudentRepository:
+    repository = StudentRepository(database)
+    repository.add([("Ada Lovelace", "Math", 5551234567), ("Alan Turing", "Physics", 5559876543),
+                    ("Grace Hopper", "Math", 5550001111), ("Edsger Dijkstra", "History", 5550002222)])
+    return repository
+
+
+@pytest.fixture
+def cache(repository: StudentRepository) -> SearchCache:
+    cache = SearchCache(repository.database)
+    yield cache
+    cache.close()
+
+
+def search(cache: SearchCache, key: SearchKey) -> list[tuple]:
+    """
+    This function searches the way the search dialog does: from the cache, or from the database into the cache.
+    """
+    rows = cache.get(key)
+    if rows is None:
+        position: int = cache.position
+        with cache.database.connect() as connection:
+            rows = connection.execute(*search_query(*key)).fetchall()
+        assert cache.put(key, rows, position)
+    return rows
+
+
+def fill(cache: SearchCache) -> None:
+    for key in (ADA, MATH, PHONE):
+        search(cache, key)
+    assert len(cache) == 3
+
+
+def test_search_key() -> None:
+    assert search_key("  Ada Lovelace ", "", " 5551234567 ") == SearchKey("Ada Lovelace", None, 5551234567)
+    assert search_key(" ", None, "") == SearchKey(None, None, None)
+    with pytest.raises(ValueError):
+        search_key(None, None, "555-CALL")
+
+
+def test_repeated_search_is_a_hit(cache: SearchCache) -> None:
+    fill(cache)
+    assert [row[1] for row in cache.get(MATH)] == ["Ada Lovelace", "Grace Hopper"]
+    assert cache.get(search_key(None, "Biology", None)) is None
+    assert (cache.hits, cache.misses) == (1, 4)
+
+
+def test_write_to_a_result_drops_it(repository: StudentRepository, cache: SearchCache) -> None:
+    fill(cache)
+    # Grace Hopper leaves Math, only the search she was a result of goes
+    repository.set_course([3], "Physics")
+    assert cache.get(MATH) is None
+    assert cache.get(ADA) is not None
+    assert cache.get(PHONE) is not None
+    assert [row[1] for row in search(cache, MATH)] == ["Ada Lovelace"]
+
+    # Alan Turing was no result of the Math search, the row he has now is
+    repository.set_course([2], "Math")
+    assert cache.get(MATH) is None
+    assert cache.get(PHONE) is None
+    assert cache.get(ADA) is not None
+    assert cache.invalidated == 3
+
+
+def test_new_and_deleted_students_drop_their_searches(repository: StudentRepository, cache: SearchCache) -> None:
+    fill(cache)
+    repository.add([("Ada Lovelace", "Biology", 5553334444)])
+    assert cache.get(ADA) is None
+    assert cache.get(MATH) is not None
+
+    repository.delete([2])
+    assert cache.get(PHONE) is None
+    assert cache.get(MATH) is not None
+    assert search(cache, PHONE) == []
+
+
+def test_unrelated_write_keeps_the_results(repository: StudentRepository, cache: SearchCache) -> None:
+    fill(cache)
+    student, version = repository.get_versioned(4)
+    assert repository.update_versioned(student._replace(name="Edsger W. Dijkstra"), version)
+    repository.add([("Barbara Liskov", "Science", 5556667777)])
+    for key in (ADA, MATH, PHONE):
+        assert cache.get(key) is not None
+    assert cache.invalidated == 0
+
+
+def test_put_with_a_stale_position_is_refused(repository: StudentRepository, cache: SearchCache) -> None:
+    assert cache.get(MATH) is None
+    position: int = cache.position
+    with repository.database.connect() as connection:
+        rows: list[tuple] = connection.execute(*search_query(*MATH)).fetchall()
+    # A write committed after the query may already be missing from its rows
+    repository.set_course([1], "History")
+    assert not cache.put(MATH, rows, position)
+    assert cache.get(MATH) is None
+    assert cache.position > position
+    assert [row[1] for row in search(cache, MATH)] == ["Grace Hopper"]
+
+
+def test_everything_is_dropped_when_the_changes_are_unknown(repository: StudentRepository,
+                                                            cache: SearchCache) -> None:
+    fill(cache)
+    cache.MAX_CHANGED_ROWS = 1
+    repository.set_course([3, 4], "Science")
+    assert cache.get(ADA) is None
+    assert len(cache) == 0
+
+    fill(cache)
+    repository.delete([4])
+    with repository.database.connect() as connection:
+        prune_changes(connection, keep=0)
+    assert cache.get(ADA) is None
+    assert len(cache) == 0
+
+
+def test_size_is_bounded(cache: SearchCache) -> None:
+    cache.MAX_ENTRIES = 2
+    for key in (ADA, MATH, PHONE):
+        search(cache, key)
+    # The least recently used search went first
+    assert len(cache) == 2
+    assert cache.get(ADA) is None
+    cache.MAX_ROWS = 1
+    assert not cache.put(MATH, [(1, "Ada Lovelace", "Math", 5551234567)] * 2, cache.position)
@@ -0,0 +1,42 @@
+"""
+Every search the search dialog can produce has to be served by an index, a full scan of students would make a search
+on a large roster take seconds. The plans are checked on a fresh database and on one that was analyzed, since the
+statistics of ANALYZE can change which index sqlite picks.
+"""
+import itertools
+import sqlite3
+
+import pytest
+
+from schema import DEFAULT_COURSES, SEARCH_FIELDS, ensure_schema, insert_students, query_plan, search_query, \
+    unindexed_searches
+
+ROWS: int = 5000
+SAMPLE: dict[str, object] = {"name": "Student 1", "course": "Math", "mobile": 5550000001}
+COMBINATIONS: list[tuple[str, ...]] = [fields for size in range(1, len(SEARCH_FIELDS) + 1)
+                                       for fields in itertools.combinations(SEARCH_FIELDS, size)]
+
+
+@pytest.fixture(params=[False, True], ids=["fresh", "analyzed"])
+def connection(request) -> sqlite3.Connection:
+    connection = sqlite3.connect(":memory:")
+    ensure_schema(connection)
+    insert_students(connection, ((f"Student {i}", DEFAULT_COURSES[i % len(DEFAULT_COURSES)], 5550000000 + i)
+                                 for i in range(ROWS)))
+    connection.commit()
+    if request.param:
+        connection.execute("ANALYZE")
+    yield connection
+    connection.close()
+
+
+@pytest.mark.parametrize("fields", COMBINATIONS, ids=["+".join(fields) for fields in COMBINATIONS])
+def test_search_uses_an_index(connection: sqlite3.Connection, fields: tuple[str, ...]) -> None:
+    sql, params = search_query(**{field: SAMPLE[field] for field in fields})
+    plan: list[str] = query_plan(connection, sql, params)
+    assert not [line for line in plan if line.startswith("SCAN students")], plan
+    assert any("USING" in line and "INDEX" in line and "students" in line for line in plan), plan
+
+
+def test_no_unindexed_searches(connection: sqlite3.Connection) -> None:
+    assert unindexed_searches(connection) == {}
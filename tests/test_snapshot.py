@@ -0,0 +1,67 @@
+"""
+A snapshot has to give back the first rows of the table as the queries of the table model return them, missing
+names, courses and phone numbers included, and a snapshot that cannot be used must read as no snapshot at all.
+"""
+import pytest
+
+from change_feed import changelog_position
+from repository import StudentRepository
+from snapshot import HEADER, SNAPSHOT_ROWS, read_snapshot, snapshot_path, write_snapshot
+
+
+def table_rows(database, limit: int) -> list[tuple]:
+    with database.connect() as connection:
+        return connection.execute("SELECT id, name, course, mobile FROM student_rows ORDER BY id LIMIT ?",
+                                  (limit,)).fetchall()
+
+
+@pytest.fixture
+def repository(database) -> StudentRepository:
+    repository = StudentRepository(database)
+    repository.add([(None, None, None), ("Zoë Ångström", "Math", 5551234567), ("", "Physics", 0),
+                    ("No Phone", None, None), (None, "History", -5)])
+    return repository
+
+
+def test_round_trip(repository: StudentRepository) -> None:
+    path: str = write_snapshot(repository.database)
+    assert path == snapshot_path(repository.database)
+
+    snapshot = read_snapshot(path)
+    try:
+        assert snapshot.rows == 5
+        assert snapshot.complete
+        assert snapshot.records() == table_rows(repository.database, 5)
+        assert snapshot.records(0, 0) == [(1, None, None, None)]
+        assert snapshot.records(3, 100) == [(4, "No Phone", None, None), (5, None, "History", -5)]
+        assert snapshot.courses() == repository.courses()
+        with repository.database.connect() as connection:
+            assert (snapshot.last_change, snapshot.last_id) == changelog_position(connection)
+    finally:
+        snapshot.close()
+
+
+def test_only_the_first_rows_are_kept(repository: StudentRepository) -> None:
+    repository.add((f"Student {i}", "Math", 5550000000 + i) for i in range(SNAPSHOT_ROWS))
+    snapshot = read_snapshot(write_snapshot(repository.database))
+    try:
+        assert snapshot.rows == SNAPSHOT_ROWS
+        assert not snapshot.complete
+        assert snapshot.records() == table_rows(repository.database, SNAPSHOT_ROWS)
+    finally:
+        snapshot.close()
+
+
+@pytest.mark.parametrize("damage", ["missing", "empty", "other-file", "cut-short"])
+def test_unusable_snapshot_is_ignored(repository: StudentRepository, tmp_path, damage: str) -> None:
+    path: str = write_snapshot(repository.database)
+    with open(path, "rb") as file:
+        content: bytes = file.read()
+    replaced: dict[str, bytes] = {"empty": b"", "other-file": b"SQLite format 3\0" + content[16:],
+                                  "cut-short": content[:HEADER.size + 10]}
+    if damage == "missing":
+        path = str(tmp_path / "nowhere.snapshot")
+    else:
+        with open(path, "wb") as file:
+            file.write(replaced[damage])
+    assert read_snapshot(path) is None
@@ -0,0 +1,110 @@
+"""
+The window has to show the first page of students soon after it starts, however large the table. Reading the whole
+table before the first paint, a count(*) or an unbounded query for instance, would go unnoticed on the small database
+shipped with the app and take seconds on a real roster.
+
+The main window is built under the offscreen platform on a generated roster, started the way main.py starts it, and
+every statement its connections run until the first page arrived is recorded. Each of them is then run again on its
+own with a sqlite progress handler counting the virtual machine instructions it takes, none may come anywhere near
+what reading every row costs.
+"""
+import os
+import sqlite3
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "benchmarks"))
+
+from database import ConnectionPool, DatabaseConnection  # noqa: E402
+from roster import create_database  # noqa: E402
+from snapshot import SNAPSHOT_ROWS, write_snapshot  # noqa: E402
+
+ROWS: int = 50_000
+BUDGET: float = 2.0  # seconds from building the window to the first page, generous like bench_startup.py
+STEPS: int = 100  # instructions between two calls of the progress handler
+
+
+def instructions(connection: sqlite3.Connection, sql: str) -> int:
+    """
+    This function runs a query to the end and returns about how many sqlite instructions it took.
+    """
+    calls: list[int] = [0]
+
+    def count() -> int:
+        calls[0] += 1
+        return 0
+
+    connection.set_progress_handler(count, STEPS)
+    try:
+        connection.execute(sql).fetchall()
+    finally:
+        connection.set_progress_handler(None, 0)
+    return calls[0] * STEPS
+
+
+@pytest.fixture(scope="module")
+def roster(tmp_path_factory) -> str:
+    path: str = str(tmp_path_factory.mktemp("startup") / "database.db")
+    create_database(path, ROWS)
+    return path
+
+
+@pytest.mark.parametrize("snapshot", [False, True], ids=["database", "snapshot"])
+def test_first_page_without_reading_the_table(qapp, roster: str, snapshot: bool, monkeypatch) -> None:
+    import main
+
+    if snapshot:
+        write_snapshot(DatabaseConnection(roster))
+    DatabaseConnection.close_all()
+    monkeypatch.setenv("STUDENTS_DATABASE", roster)
+    statements: list[str] = []
+    open_connection = ConnectionPool.open
+
+    def traced_open(pool: ConnectionPool) -> sqlite3.Connection:
+        connection = open_connection(pool)
+        connection.set_trace_callback(statements.append)
+        return connection
+
+    monkeypatch.setattr(ConnectionPool, "open", traced_open)
+
+    started: float = time.perf_counter()
+    window = main.MainWindow()
+    monkeypatch.setattr(main, "main_window", window, raising=False)
+    fetched: list[float] = []
+    window.student_model.page_fetched.connect(lambda rows: fetched.append(time.perf_counter() - started))
+    try:
+        window.show()
+        main.QTimer.singleShot(0, window.load_data)
+        while not fetched and time.perf_counter() - started < 10 * BUDGET:
+            qapp.processEvents()
+            time.sleep(0.001)
+
+        assert fetched, "the first page never arrived"
+        assert fetched[0] < BUDGET
+        # A page of the database, or the first rows of the snapshot
+        assert window.student_model.rowCount() in (window.student_model.PAGE_SIZE, SNAPSHOT_ROWS)
+        assert window.student_model.canFetchMore()
+    finally:
+        window.close()
+        window.executor.shutdown()
+        window.writer.close()
+        window.change_feed.close()
+        window.search_cache.close()
+        window.student_cache.close()
+        DatabaseConnection.close_all()
+        if snapshot:
+            os.remove(roster + ".snapshot")
+
+    connection = sqlite3.connect(roster)
+    try:
+        full_read: int = instructions(connection, "SELECT id, name, course, mobile FROM student_rows")
+        queries: list[str] = [sql for sql in dict.fromkeys(statements)
+                              if sql.lstrip().upper().startswith(("SELECT", "WITH"))]
+        costs: dict[str, int] = {sql: instructions(connection, sql) for sql in queries}
+    finally:
+        connection.close()
+    assert queries
+    expensive = {sql: cost for sql, cost in costs.items() if cost > full_read // 10}
+    assert not expensive, f"reading all {ROWS} rows takes {full_read} instructions: {expensive}"
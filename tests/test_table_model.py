@@ -0,0 +1,144 @@
+"""
+The table model patches rows that other connections changed instead of reading everything again, see
+StudentTableModel.apply_changes. After any mix of remote inserts, edits and deletes the patched model has to show
+exactly what reading the table again would show.
+
+Another connection writes random changes to a generated roster, the ChangeFeed reports them and the model applies
+them. The model keeps only two pages in memory, so most changed rows are on pages that are not cached, which is where
+patching has to read pages back. After every round the rows of the model are compared with the rows of its query.
+The same runs again with a StudentCache, which serves the pages from memory. The page offsets the model finds its
+rows with are checked against plain sums on their own.
+"""
+import bisect
+import os
+import random
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "benchmarks"))
+
+from change_feed import ChangeFeed  # noqa: E402
+from database import DatabaseConnection  # noqa: E402
+from roster import create_database  # noqa: E402
+from schema import DEFAULT_COURSES  # noqa: E402
+
+ROWS: int = 5000
+ROUNDS: int = 150
+
+
+def model_rows(model) -> list[tuple]:
+    while model.canFetchMore():
+        model.fetchMore()
+    return [model.record(row) for row in range(model.rowCount())]
+
+
+def write_randomly(rng: random.Random, connection: sqlite3.Connection) -> None:
+    """
+    This function commits one to three random changes: a course change, which moves a student in or out of a course
+    filter, a rename, an insert or a delete.
+    """
+    last_id: int = connection.execute("SELECT max(id) FROM students").fetchone()[0]
+    for _ in range(rng.randint(1, 3)):
+        student_id = rng.randint(1, last_id)
+        course_id = rng.randint(1, len(DEFAULT_COURSES))
+        kind = rng.randrange(4)
+        if kind == 0:
+            connection.execute("UPDATE students SET course_id = ? WHERE id = ?", (course_id, student_id))
+        elif kind == 1:
+            connection.execute("UPDATE students SET name = ? WHERE id = ?", (f"Renamed {rng.randrange(1000)}",
+                                                                              student_id))
+        elif kind == 2:
+            connection.execute("INSERT INTO students(name, course_id, mobile) VALUES (?, ?, ?)",
+                               (f"New {rng.randrange(1000)}", course_id, 5550000000 + rng.randrange(10 ** 6)))
+        else:
+            connection.execute("DELETE FROM students WHERE id = ?", (student_id,))
+    connection.commit()
+
+
+@pytest.mark.parametrize("filters, descending, column", [
+    ({"course": "Math"}, False, 0),
+    ({"course": "Math"}, True, 0),
+    ({"course": "Physics", "mobile_prefix": "5550"}, False, 0),
+    ({}, False, 0),
+    ({"name_prefix": "a"}, True, 1),
+], ids=["course", "course-descending", "course-and-phone", "unfiltered", "name-descending"])
+@pytest.mark.parametrize("cached", [False, True], ids=["database", "student-cache"])
+def test_patched_rows_match_the_database(qapp, tmp_path, filters: dict, descending: bool, column: int,
+                                         cached: bool) -> None:
+    import main
+
+    path: str = str(tmp_path / "database.db")
+    create_database(path, ROWS)
+    database = DatabaseConnection(path)
+    # With the student cache the pages are sliced from its sorted views, which have to follow every change too
+    cache = main.StudentCache(database) if cached else None
+    model = main.StudentTableModel(database=database, cache=cache)
+    model.MAX_CACHED_PAGES = 2
+    model.load_cache()
+    assert cache is None or cache.loaded
+    model.sort(column, main.Qt.SortOrder.DescendingOrder if descending else main.Qt.SortOrder.AscendingOrder)
+    model.set_filters(**filters)
+    feed = ChangeFeed(database)
+    feed.skip()
+    writer = sqlite3.connect(path)
+    rng = random.Random(17)
+    try:
+        for round_number in range(ROUNDS):
+            write_randomly(rng, writer)
+            changes = feed.poll()
+            if changes is None:
+                model.reload()
+            else:
+                model.apply_changes(changes)
+            with database.connect() as connection:
+                expected = connection.execute(*model.query()).fetchall()
+            assert model_rows(model) == expected, f"round {round_number}"
+        assert cache is None or cache.view(model.table_query) is not None
+    finally:
+        writer.close()
+        feed.close()
+        if cache is not None:
+            cache.close()
+        DatabaseConnection.close_all()
+
+
+def test_page_offsets() -> None:
+    from main import PageOffsets
+
+    rng = random.Random(5)
+    offsets = PageOffsets()
+    counts: list[int] = []
+    assert len(offsets) == 0
+    for _ in range(2000):
+        kind = rng.randrange(4)
+        if kind == 0 or not counts:
+            counts.append(rng.choice([0, rng.randint(1, 300)]))
+            offsets.append(counts[-1])
+        elif kind == 1:
+            page = rng.randrange(len(counts))
+            delta = rng.randint(-counts[page], 5)
+            counts[page] += delta
+            offsets.add(page, delta)
+        elif kind == 2 and rng.random() < 0.05:
+            counts = [rng.choice([0, rng.randint(1, 300)]) for _ in range(rng.randint(1, 40))]
+            offsets.reset(counts)
+        starts: list[int] = [sum(counts[:page]) for page in range(len(counts))]
+        assert len(offsets) == len(counts)
+        page = rng.randrange(len(counts))
+        assert offsets.start(page) == starts[page]
+        row = rng.randrange(sum(counts) + 1)
+        # The last page that starts at or before the row, so empty pages never hide the page after them
+        assert offsets.find(row) == bisect.bisect_right(starts, row) - 1
+
+
+def test_missing_values_show_as_empty_cells(qapp) -> None:
+    import main
+
+    with pytest.raises(TypeError, match="abstract"):
+        main.StudentModel()
+    model = main.StudentListModel()
+    model.set_rows([(1, None, None, None), (2, "Ada Lovelace", "Math", 5551234567)])
+    assert [model.data(model.index(0, column)) for column in range(4)] == ["1", "", "", ""]
+    assert [model.data(model.index(1, column)) for column in range(4)] == ["2", "Ada Lovelace", "Math", "5551234567"]
@@ -0,0 +1,104 @@
+"""
+The StudentWriter commits the writes that arrive close together in one transaction and resolves every Future once
+its batch is committed. A failing write fails alone, close commits what is still queued, and should the thread stop,
+nobody is left waiting on a Future.
+"""
+import threading
+from concurrent.futures import Future, wait
+
+import pytest
+
+from repository import StudentRepository
+from writer import StudentWriter
+
+TIMEOUT: float = 10.0
+
+
+@pytest.fixture
+def batches() -> list[int]:
+    return []
+
+
+@pytest.fixture
+def writer(database, batches: list[int]) -> StudentWriter:
+    writer = StudentWriter(database, "normal", on_batch_done=batches.append)
+    # Long enough that the writes of a test always make it into the first batch
+    writer.MAX_DELAY_MS = 500
+    yield writer
+    writer.close()
+
+
+def test_writes_share_one_transaction(writer: StudentWriter, batches: list[int]) -> None:
+    added: Future = writer.add([("Ada Lovelace", "Math", 5551234567), ("Alan Turing", "Physics", 5559876543)])
+    more: Future = writer.add([("Grace Hopper", "Science", 5550001111)])
+    moved: Future = writer.set_course([1, 2], "History")
+    deleted: Future = writer.delete([3])
+    writer.flush()
+
+    assert [student.id for student in added.result(TIMEOUT)] == [1, 2]
+    assert [student.id for student in more.result(TIMEOUT)] == [3]
+    assert moved.result(TIMEOUT) == 2
+    assert deleted.result(TIMEOUT) == 1
+    # The flush is not a write, it only ended the batch early
+    assert batches == [4]
+    assert [(student.id, student.course) for student in StudentRepository(writer.database).get([1, 2, 3])] == \
+        [(1, "History"), (2, "History")]
+
+
+def test_failing_write_fails_alone(writer: StudentWriter, batches: list[int]) -> None:
+    first: Future = writer.add([("Ada Lovelace", "Math", 5551234567)])
+    unknown: Future = writer.add([("Alan Turing", "Astrology", 5559876543)])
+    last: Future = writer.add([("Grace Hopper", "Science", 5550001111)])
+    missing: Future = writer.update_versioned((99, "Nobody", "Math", 5550000000), 0)
+    writer.flush()
+
+    assert [student.name for student in first.result(TIMEOUT)] == ["Ada Lovelace"]
+    with pytest.raises(ValueError, match="Astrology"):
+        unknown.result(TIMEOUT)
+    assert [student.name for student in last.result(TIMEOUT)] == ["Grace Hopper"]
+    assert missing.result(TIMEOUT) is False
+    assert batches == [4]
+    assert StudentRepository(writer.database).count() == 2
+
+
+def test_close_drains_the_queue(writer: StudentWriter) -> None:
+    futures: list[Future] = [writer.add([(f"Student {i}", "Math", 5550000000 + i)]) for i in range(50)]
+    writer.close()
+
+    assert all(future.done() for future in futures)
+    assert [future.result()[0].id for future in futures] == list(range(1, 51))
+    assert StudentRepository(writer.database).count() == 50
+    with pytest.raises(RuntimeError):
+        writer.add([("Too Late", "Math", 5550000000)])
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_thread_failure_fails_pending_writes(database) -> None:
+    started, release = threading.Event(), threading.Event()
+
+    def stop_after_first_batch(count: int) -> None:
+        # Holds the thread after its first batch until more writes are queued, then stops it
+        started.set()
+        release.wait(TIMEOUT)
+        raise MemoryError("writer thread failed")
+
+    writer = StudentWriter(database, "normal", on_batch_done=stop_after_first_batch)
+    try:
+        first: Future = writer.add([("Ada Lovelace", "Math", 5551234567)])
+        assert started.wait(TIMEOUT)
+        pending: list[Future] = [writer.add([(f"Student {i}", "Math", 5550000000 + i)]) for i in range(3)]
+        pending.append(writer.delete([1]))
+        release.set()
+
+        done, not_done = wait(pending, TIMEOUT)
+        assert not not_done
+        for future in pending:
+            with pytest.raises(MemoryError, match="writer thread failed"):
+                future.result()
+        # The batch before the failure was committed and stays so
+        assert [student.id for student in first.result(TIMEOUT)] == [1]
+        assert StudentRepository(database).count() == 1
+        with pytest.raises(RuntimeError):
+            writer.add([("Too Late", "Math", 5550000000)])
+    finally:
+        writer.close()
@@ -0,0 +1,274 @@
+"""
+Write-behind queue for student changes, so that rapid data entry does not pay a commit per write.
+
+Writes are handed to a StudentWriter, which returns a Future at once and applies them on a single background thread.
+The writes that queue up within MAX_DELAY_MS of each other, up to MAX_BATCH of them, are applied in one transaction,
+so the commit, and with durability "full" its fsync, is paid once per batch instead of once per write. Every write runs
+in its own savepoint: one that fails is rolled back alone and its Future gets the exception, the others still commit.
+Futures are only resolved once their batch is committed.
+
+The durability setting picks PRAGMA synchronous for the writer connection. It is read from the STUDENTS_DURABILITY
+environment variable, then from the [database] section of config.ini:
+
+    [database]
+    durability = full
+
+- full: every commit is flushed to disk before the write is reported done, it survives a power cut
+- normal (default): committed writes survive the application crashing, the latest ones may be lost on a power cut
+- off: sqlite never waits for the disk, a power cut can corrupt the database, for throwaway data only
+"""
+import configparser
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, Optional
+
+from database import CONFIG_FILE, DatabaseConnection
+from instrumentation import span
+from repository import Student, StudentRepository
+
+DURABILITY_ENV: str = "STUDENTS_DURABILITY"
+# Durability setting -> PRAGMA synchronous of the writer connection
+DURABILITY_LEVELS: dict[str, str] = {"full": "FULL", "normal": "NORMAL", "off": "OFF"}
+DEFAULT_DURABILITY: str = "normal"
+
+
+def durability() -> str:
+    """
+    This function returns the durability setting from the environment or the config file, normal by default.
+    """
+    setting: Optional[str] = os.environ.get(DURABILITY_ENV)
+    if not setting:
+        config = configparser.ConfigParser()
+        if config.read(CONFIG_FILE) and config.has_option("database", "durability"):
+            setting = config.get("database", "durability")
+    setting = (setting or DEFAULT_DURABILITY).strip().lower()
+    if setting not in DURABILITY_LEVELS:
+        raise ValueError(f"unknown durability {setting!r}, use one of {', '.join(DURABILITY_LEVELS)}")
+    return setting
+
+
+class _Batch:
+    """
+    Stands in for a DatabaseConnection while a batch is applied: a StudentRepository on top of it runs every write
+    on the batch connection inside a savepoint of its own instead of in a transaction of its own.
+    """
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.connection: sqlite3.Connection = connection
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        self.connection.execute("SAVEPOINT write")
+        try:
+            yield self.connection
+        except BaseException:
+            self.connection.execute("ROLLBACK TO write")
+            self.connection.execute("RELEASE write")
+            raise
+        self.connection.execute("RELEASE write")
+
+
+class StudentWriter:
+    """
+    Applies student writes on one background thread and commits the writes that arrive close together as one batch.
+
+    The methods mirror the writing methods of StudentRepository but return a Future of their result instead of
+    waiting for it. Writes are applied in the order they were queued. The writer keeps a connection of its own, so a
+    ChangeFeed sees its commits like those of any other connection. A write that raises fails alone, whatever it
+    raised. Should the writer thread stop all the same, every write still waiting gets the exception that stopped it,
+    so nobody waits on a Future forever, and writes queued later raise RuntimeError.
+
+    Attributes:
+    MAX_DELAY_MS (int): How long the first write of a batch waits for more writes to join it.
+    MAX_BATCH (int): The most writes committed in one transaction.
+    durability (str): full, normal or off, see the module docstring.
+    on_batch_done (Optional[Callable[[int], None]]): Called on the writer thread with the number of writes after every
+        batch, committed or not, once their Futures are resolved.
+
+    Methods:
+    add(self, students) -> Future[list[Student]]: Queues inserting (name, course, mobile) rows.
+    update(self, students) -> Future[int]: Queues writing every field of (id, name, course, mobile) rows.
+    update_versioned(self, student, version) -> Future[bool]: Queues writing a student if its row has the version.
+    set_course(self, ids, course) -> Future[int]: Queues moving students to a course.
+    delete(self, ids) -> Future[int]: Queues deleting students.
+    flush(self) -> None: Commits what is queued right away and waits for it.
+    close(self) -> None: Flushes and stops the writer thread.
+    """
+
+    MAX_DELAY_MS: int = 10
+    MAX_BATCH: int = 2000
+
+    def __init__(self, database: Optional[DatabaseConnection] = None, durability_setting: Optional[str] = None,
+                 on_batch_done: Optional[Callable[[int], None]] = None) -> None:
+        self.database: DatabaseConnection = database or DatabaseConnection()
+        self.durability: str = durability_setting or durability()
+        if self.durability not in DURABILITY_LEVELS:
+            raise ValueError(f"unknown durability {self.durability!r}, use one of {', '.join(DURABILITY_LEVELS)}")
+        self.on_batch_done: Optional[Callable[[int], None]] = on_batch_done
+        # (future, repository method name, arguments), a None method only marks a flush, None alone stops the thread
+        self._queue: queue.Queue = queue.Queue()
+        self._stopped: bool = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="student-writer", daemon=True)
+        self._thread.start()
+
+    def add(self, students: Iterable[tuple[str, str, int]]) -> "Future[list[Student]]":
+        return self._submit("add", list(students))
+
+    def update(self, students: Iterable[tuple[int, str, str, int]]) -> "Future[int]":
+        return self._submit("update", list(students))
+
+    def update_versioned(self, student: tuple[int, str, str, int], version: Optional[int]) -> "Future[bool]":
+        return self._submit("update_versioned", tuple(student), version)
+
+    def set_course(self, ids: Iterable[int], course: Optional[str]) -> "Future[int]":
+        return self._submit("set_course", list(ids), course)
+
+    def delete(self, ids: Iterable[int]) -> "Future[int]":
+        return self._submit("delete", list(ids))
+
+    def flush(self) -> None:
+        """
+        This function commits every write queued so far without waiting for MAX_DELAY_MS and returns once it is done.
+        """
+        self._submit(None).result()
+
+    def close(self) -> None:
+        """
+        This function commits every write queued so far and stops the writer thread. Call it before exiting.
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _submit(self, method: Optional[str], *args) -> Future:
+        future: Future = Future()
+        # Checked under the lock, so nothing is queued after the thread failed what was left in the queue
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError("the student writer is closed")
+            self._queue.put((future, method, args))
+        return future
+
+    def _run(self) -> None:
+        batch: list[tuple] = []
+        error: BaseException = RuntimeError("the student writer is closed")
+        try:
+            connection = self.database.open()
+            try:
+                connection.execute(f"PRAGMA synchronous={DURABILITY_LEVELS[self.durability]}")
+                repository = StudentRepository(_Batch(connection))
+                stopping: bool = False
+                while not stopping:
+                    first = self._queue.get()
+                    if first is None:
+                        break
+                    batch = [first]
+                    deadline: float = time.monotonic() + self.MAX_DELAY_MS / 1000
+                    # A flush does not wait for more writes
+                    while len(batch) < self.MAX_BATCH and batch[-1][1] is not None:
+                        try:
+                            item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                        except queue.Empty:
+                            break
+                        if item is None:
+                            stopping = True
+                            break
+                        batch.append(item)
+                    self._apply(connection, repository, batch)
+                    batch = []
+            finally:
+                connection.close()
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._fail_pending(batch, error)
+
+    def _fail_pending(self, batch: list[tuple], error: BaseException) -> None:
+        """
+        This function gives every write that is still waiting, in the batch the thread stopped in or in the queue, the
+        exception that stopped the thread. Once it ran no more writes are accepted.
+        """
+        with self._lock:
+            self._stopped = True
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                batch.append(item)
+        for future, _, _ in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def _apply(self, connection: sqlite3.Connection, repository: StudentRepository, batch: list[tuple]) -> None:
+        """
+        This function applies a batch of writes in one transaction and resolves their Futures once it is committed.
+        """
+        outcomes: list[tuple[Future, object, Optional[BaseException]]] = []
+        writes: int = sum(1 for _, method, _ in batch if method is not None)
+        try:
+            with span("writer.batch"):
+                # Taking the write lock up front waits for other writers through busy_timeout instead of failing later
+                connection.execute("BEGIN IMMEDIATE")
+                start: int = 0
+                while start < len(batch):
+                    end: int = start + 1
+                    if batch[start][1] == "add":
+                        while end < len(batch) and batch[end][1] == "add":
+                            end += 1
+                        outcomes.extend(self._add(repository, batch[start:end]))
+                    else:
+                        outcomes.append(self._write(repository, *batch[start]))
+                    start = end
+                connection.commit()
+        except Exception as e:
+            if connection.in_transaction:
+                connection.rollback()
+            outcomes = [(future, None, e) for future, _, _ in batch]
+
+        for future, result, error in outcomes:
+            if future.done():
+                continue  # cancelled by its caller while it was queued
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+        if writes and self.on_batch_done is not None:
+            self.on_batch_done(writes)
+
+    def _add(self, repository: StudentRepository, adds: list[tuple]) -> list[tuple]:
+        """
+        This function applies neighbouring add writes as one insert, which is what makes rapid data entry cheap: one
+        savepoint instead of one per write, and from BULK_ROWS rows on the bulk path of StudentRepository.add. If the
+        insert fails, the writes are applied one by one so that only the faulty ones fail.
+        """
+        if len(adds) == 1:
+            return [self._write(repository, *adds[0])]
+        try:
+            added: list[Student] = repository.add([row for _, _, (rows,) in adds for row in rows])
+        except Exception:
+            return [self._write(repository, *write) for write in adds]
+        outcomes: list[tuple] = []
+        start: int = 0
+        for future, _, (rows,) in adds:
+            outcomes.append((future, added[start:start + len(rows)], None))
+            start += len(rows)
+        return outcomes
+
+    @staticmethod
+    def _write(repository: StudentRepository, future: Future, method: Optional[str], args: tuple) -> tuple:
+        # Applies one write, a flush marker only needs to be resolved
+        if method is None:
+            return future, None, None
+        try:
+            return future, getattr(repository, method)(*args), None
+        except Exception as e:
+            return future, None, e